@@ -0,0 +1 @@
+# Stand-in for the mysql package, only put on sys.path by the benchmarks
@@ -0,0 +1,371 @@
+# Stand-in for mysql.connector used by the benchmarks. It serves synthetic tables from memory with a fixed
+# latency per round trip and counts connections and statements, so the app's hot paths can be timed without a
+# MySQL server. Only the statements main.py sends while browsing tables and running SELECTs are understood.
+
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from . import errors
+from .errors import Error, InterfaceError, DatabaseError, OperationalError, ProgrammingError, PoolError
+
+__version__ = "0.0-fake"
+
+
+class FieldType:
+    # Same codes as mysql.connector.FieldType
+    DECIMAL = 0x00
+    TINY = 0x01
+    SHORT = 0x02
+    LONG = 0x03
+    FLOAT = 0x04
+    DOUBLE = 0x05
+    NULL = 0x06
+    TIMESTAMP = 0x07
+    LONGLONG = 0x08
+    INT24 = 0x09
+    DATE = 0x0A
+    TIME = 0x0B
+    DATETIME = 0x0C
+    YEAR = 0x0D
+    NEWDATE = 0x0E
+    VARCHAR = 0x0F
+    BIT = 0x10
+    JSON = 0xF5
+    NEWDECIMAL = 0xF6
+    ENUM = 0xF7
+    SET = 0xF8
+    TINY_BLOB = 0xF9
+    MEDIUM_BLOB = 0xFA
+    LONG_BLOB = 0xFB
+    BLOB = 0xFC
+    VAR_STRING = 0xFD
+    STRING = 0xFE
+    GEOMETRY = 0xFF
+
+
+# Every synthetic table has the same columns: name, column type, field type, nullable, key, extra
+table_columns = [
+    ("id", "int", FieldType.LONG, "NO", "PRI", "auto_increment"),
+    ("name", "varchar(64)", FieldType.VAR_STRING, "NO", "", ""),
+    ("amount", "decimal(10,2)", FieldType.NEWDECIMAL, "NO", "", ""),
+    ("created", "datetime", FieldType.DATETIME, "NO", "MUL", ""),
+    ("note", "text", FieldType.BLOB, "YES", "", ""),
+]
+table_indexes = [("PRIMARY", 0, "id"), ("idx_created", 1, "created")]
+created_base = datetime(2024, 1, 1)
+
+
+def table_row(row_id):
+    return (row_id, f"customer {row_id % 9973}", Decimal(row_id % 100000).scaleb(-2),
+            created_base + timedelta(seconds=row_id * 37), None if row_id % 10 == 0 else f"note {row_id}")
+
+
+class TableRows:
+    # Rows of a SELECT, built as they are fetched like a server streaming them, so the fake doesn't add its own
+    # copy of a large result to the memory being measured
+    def __init__(self, ids):
+        self.ids = ids
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [table_row(row_id) for row_id in self.ids[index]]
+        return table_row(self.ids[index])
+
+
+class FakeServer:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.configure()
+
+    def configure(self, tables=None, latency=0.0, database="bench"):
+        # tables maps name -> row count, latency is seconds added to every connect and round trip
+        self.tables = dict(tables) if tables is not None else {"rows_1k": 1000, "rows_100k": 100000,
+                                                               "rows_1m": 1000000}
+        self.latency = latency
+        self.database = database
+        self.reset_stats()
+
+    def reset_stats(self):
+        with self.lock:
+            self.connects = 0
+            self.open_connections = 0
+            self.peak_connections = 0
+            self.statements = 0
+            self.rows_sent = 0
+
+    def stats(self):
+        with self.lock:
+            return {"connects": self.connects, "open_connections": self.open_connections,
+                    "peak_connections": self.peak_connections, "statements": self.statements,
+                    "rows_sent": self.rows_sent}
+
+    def round_trip(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def opened(self):
+        self.round_trip()
+        with self.lock:
+            self.connects += 1
+            self.open_connections += 1
+            self.peak_connections = max(self.peak_connections, self.open_connections)
+            return self.connects
+
+    def closed(self):
+        with self.lock:
+            self.open_connections -= 1
+
+    def run(self, statement):
+        # Returns (description, rows, rowcount) for a statement with its parameters already filled in
+        self.round_trip()
+        description, rows, rowcount = self.answer(" ".join(statement.split()))
+        with self.lock:
+            self.statements += 1
+            self.rows_sent += len(rows)
+        return description, rows, rowcount
+
+    def answer(self, statement):
+        upper = statement.upper()
+        if upper.startswith(("SET ", "USE ", "BEGIN", "START TRANSACTION", "COMMIT", "ROLLBACK", "KILL ")):
+            return None, [], 0
+        if upper == "SHOW TABLES":
+            return text_description(f"Tables_in_{self.database}"), [(name,) for name in self.tables], -1
+        if upper == "SHOW DATABASES":
+            return text_description("Database"), [(self.database,)], -1
+        if upper in ("SELECT VERSION()", "SELECT @@VERSION"):
+            return text_description("VERSION()"), [("8.0.36-fake",)], -1
+        if "INFORMATION_SCHEMA." in upper:
+            return self.information_schema(statement)
+        match = select_pattern.match(statement)
+        if match:
+            return self.select(match)
+        raise ProgrammingError(msg=f"The benchmark connector can't run: {statement[:200]}", errno=1064)
+
+    def information_schema(self, statement):
+        match = re.match(r"SELECT (.+?) FROM information_schema\.(\w+) WHERE (.*?)(?: ORDER BY .*)?$", statement,
+                         re.IGNORECASE)
+        if not match:
+            raise ProgrammingError(msg=f"The benchmark connector can't run: {statement[:200]}", errno=1064)
+        fields = [field.strip().upper() for field in match.group(1).split(",")]
+        view = match.group(2).upper()
+        condition = match.group(3)
+        names = set(self.tables)
+        in_list = re.search(r"TABLE_NAME IN \((.*?)\)", condition, re.IGNORECASE)
+        if in_list:
+            names &= {literal.strip("'") for literal in re.findall(r"'(?:[^'\\]|\\.)*'", in_list.group(1))}
+        schema = re.search(r"TABLE_SCHEMA = '([^']*)'", condition, re.IGNORECASE)
+        if schema and schema.group(1) != self.database:
+            names = set()
+
+        records = []
+        for name in sorted(names):
+            if view == "TABLES":
+                records.append({"TABLE_NAME": name, "TABLE_TYPE": "BASE TABLE", "ENGINE": "InnoDB",
+                                "TABLE_ROWS": self.tables[name], "UPDATE_TIME": None})
+            elif view == "COLUMNS":
+                for position, (column, column_type, _, nullable, key, extra) in enumerate(table_columns, 1):
+                    records.append({"TABLE_NAME": name, "COLUMN_NAME": column, "COLUMN_TYPE": column_type,
+                                    "DATA_TYPE": column_type.split("(")[0], "IS_NULLABLE": nullable,
+                                    "COLUMN_KEY": key, "COLUMN_DEFAULT": None, "EXTRA": extra,
+                                    "ORDINAL_POSITION": position})
+            elif view == "KEY_COLUMN_USAGE":
+                records.append({"TABLE_NAME": name, "CONSTRAINT_NAME": "PRIMARY", "COLUMN_NAME": "id",
+                                "REFERENCED_TABLE_NAME": None, "REFERENCED_COLUMN_NAME": None,
+                                "ORDINAL_POSITION": 1})
+            elif view == "STATISTICS":
+                for index_name, non_unique, column in table_indexes:
+                    records.append({"TABLE_NAME": name, "INDEX_NAME": index_name, "NON_UNIQUE": non_unique,
+                                    "COLUMN_NAME": column, "SEQ_IN_INDEX": 1})
+            # Views, triggers and routines: the synthetic schema has none
+        return (text_description(*fields), [tuple(record.get(field) for field in fields) for record in records],
+                len(records))
+
+    def select(self, match):
+        name = match.group("table").strip("`")
+        if name not in self.tables:
+            raise ProgrammingError(msg=f"Table '{self.database}.{name}' doesn't exist", errno=1146)
+        count = self.tables[name]
+        first, last = 1, count  # Ids are 1..count
+
+        where = match.group("where")
+        wanted = None
+        if where:
+            where = where.replace("`", "").replace("(", " ").replace(")", " ")
+            where = " ".join(where.split())
+            seek = re.fullmatch(r"id (>=?) (-?\d+)", where)
+            keys = re.fullmatch(r"id IN ([\d ,]+)", where, re.IGNORECASE)
+            if seek:
+                first = max(first, int(seek.group(2)) + (seek.group(1) == ">"))
+            elif keys:
+                wanted = sorted({int(key) for key in keys.group(1).replace(",", " ").split()
+                                 if 1 <= int(key) <= count})
+            else:
+                raise ProgrammingError(msg=f"The benchmark connector can't filter on: {match.group('where')}",
+                                       errno=1064)
+
+        order = match.group("order")
+        if order and order.replace("`", "").strip().lower() not in ("id", "id asc"):
+            raise ProgrammingError(msg=f"The benchmark connector can only order by id, not: {order}", errno=1064)
+
+        offset = int(match.group("offset") or 0)
+        limit = match.group("limit")
+        if wanted is None:
+            first += offset
+            if limit is not None:
+                last = min(last, first + int(limit) - 1)
+            ids = range(first, last + 1)
+        else:
+            ids = wanted[offset:offset + int(limit)] if limit is not None else wanted[offset:]
+
+        if match.group("count"):
+            return text_description("COUNT(*)"), [(len(ids),)], 1
+        description = [(column, field_type, None, None, None, None, nullable == "YES", 0)
+                       for column, _, field_type, nullable, _, _ in table_columns]
+        return description, TableRows(ids), len(ids)
+
+
+select_pattern = re.compile(
+    r"SELECT (?:\*|(?P<count>COUNT\(\*\))) FROM (?P<table>`[^`]+`|\w+)"
+    r"(?: WHERE (?P<where>.+?))?(?: ORDER BY (?P<order>.+?))?"
+    r"(?: LIMIT (?P<limit>\d+)(?: OFFSET (?P<offset>\d+))?)?;?$", re.IGNORECASE)
+
+
+def text_description(*names):
+    return [(name, FieldType.VAR_STRING, None, None, None, None, True, 0) for name in names]
+
+
+def sql_literal(value):
+    if value is None:
+        return "NULL"
+    if isinstance(value, bool):
+        return str(int(value))
+    if isinstance(value, (int, float, Decimal)):
+        return str(value)
+    return "'" + str(value).replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+
+server = FakeServer()  # Shared by every connection, the benchmarks configure it and read its stats
+
+
+class CursorBase:
+    def __init__(self, connection):
+        self.connection = connection
+        self.description = None
+        self.rowcount = -1
+        self.lastrowid = None
+        self.rows = []
+        self.position = 0
+
+    def execute(self, operation, params=None, multi=False):
+        if self.connection.closed:
+            raise OperationalError(msg="MySQL Connection not available", errno=2055)
+        if params:
+            parts = operation.split("%s")
+            if len(parts) != len(params) + 1:
+                raise ProgrammingError(msg="Not all parameters were used in the SQL statement")
+            operation = parts[0] + "".join(sql_literal(value) + part for value, part in zip(params, parts[1:]))
+        self.description, self.rows, self.rowcount = server.run(operation)
+        self.position = 0
+
+    def executemany(self, operation, seq_params):
+        total = 0
+        for params in seq_params:
+            self.execute(operation, params)
+            total += max(self.rowcount, 0)
+        self.rowcount = total
+
+    def fetchone(self):
+        if self.position >= len(self.rows):
+            return None
+        self.position += 1
+        return self.rows[self.position - 1]
+
+    def fetchmany(self, size=1):
+        rows = self.rows[self.position:self.position + size]
+        self.position += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self.rows[self.position:]
+        self.position = len(self.rows)
+        return rows
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def close(self):
+        self.rows = []
+        return True
+
+
+class FakeConnection:
+    def __init__(self, **config):
+        self.config = config
+        self.closed = False
+        self.in_transaction = False
+        self.unread_result = False
+        self.autocommit = False
+        self.connection_id = server.opened()
+
+    def cursor(self, buffered=None, dictionary=None, raw=None, prepared=None):
+        if self.closed:
+            raise OperationalError(msg="MySQL Connection not available", errno=2055)
+        return CursorBase(self)
+
+    def start_transaction(self, **kwargs):
+        server.round_trip()
+        self.in_transaction = True
+
+    def commit(self):
+        server.round_trip()
+        self.in_transaction = False
+
+    def rollback(self):
+        server.round_trip()
+        self.in_transaction = False
+
+    def consume_results(self):
+        self.unread_result = False
+
+    def cmd_reset_connection(self):
+        server.round_trip()
+        self.in_transaction = False
+        return True
+
+    def cmd_init_db(self, database):
+        server.round_trip()
+
+    def cmd_change_user(self, username="", password="", database="", charset=None):
+        server.round_trip()
+        self.in_transaction = False
+
+    def ping(self, reconnect=False, attempts=1, delay=0):
+        if self.closed:
+            raise InterfaceError(msg="Connection is closed", errno=2013)
+        server.round_trip()
+
+    def is_connected(self):
+        return not self.closed
+
+    def get_server_info(self):
+        return "8.0.36-fake"
+
+    def get_server_version(self):
+        return (8, 0, 36)
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            server.closed()
+
+    disconnect = close
+
+
+def connect(**config):
+    return FakeConnection(**config)
@@ -0,0 +1,50 @@
+# Same exception hierarchy as mysql.connector.errors, for the parts main.py catches
+
+
+class Error(Exception):
+    def __init__(self, msg=None, errno=None, values=None, sqlstate=None):
+        super().__init__(msg)
+        self.msg = msg
+        self.errno = errno
+        self.sqlstate = sqlstate
+
+    def __str__(self):
+        if self.errno is not None:
+            return f"{self.errno}: {self.msg}"
+        return str(self.msg)
+
+
+class Warning(Exception):
+    pass
+
+
+class InterfaceError(Error):
+    pass
+
+
+class PoolError(Error):
+    pass
+
+
+class DatabaseError(Error):
+    pass
+
+
+class OperationalError(DatabaseError):
+    pass
+
+
+class ProgrammingError(DatabaseError):
+    pass
+
+
+class IntegrityError(DatabaseError):
+    pass
+
+
+class DataError(DatabaseError):
+    pass
+
+
+class NotSupportedError(DatabaseError):
+    pass
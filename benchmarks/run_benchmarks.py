@@ -0,0 +1,308 @@
+# Headless benchmarks for the table, query result, console and refresh paths of main.py.
+#
+# Every scenario runs in its own process under the offscreen Qt platform against the stand-in connector in
+# fake_connector/, which serves synthetic tables of 1k, 100k and 1M rows with a fixed latency per round trip.
+# For each run it reports the time until the first rows are painted, the total load time, the peak RSS of the
+# process and how many connections and statements reached the "server".
+#
+#   python benchmarks/run_benchmarks.py
+#   python benchmarks/run_benchmarks.py --sizes 1k 100k --scenarios table_widget refresh --latency-ms 5
+#   python benchmarks/run_benchmarks.py --json results.json
+#   python benchmarks/run_benchmarks.py --baseline results.json  # exits with 1 on a regression
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None  # Not available on Windows, peak RSS is left out there
+
+benchmarks_dir = os.path.dirname(os.path.abspath(__file__))
+repo_dir = os.path.dirname(benchmarks_dir)
+
+table_sizes = {"1k": 1000, "100k": 100000, "1m": 1000000}
+scenarios = ["table_widget", "query_window", "console", "refresh"]
+compared_metrics = ["first_paint_ms", "total_ms", "peak_rss_mb"]
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024  # Bytes on macOS, KiB on Linux
+
+
+# Scenario side, runs in the child process
+
+def wait_until(app, condition, timeout):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise TimeoutError("Timed out waiting for the scenario to finish")
+        app.processEvents()
+        time.sleep(0.0005)  # Let worker threads run
+
+
+def paint(view):
+    # Synchronous repaint, the offscreen platform otherwise only paints when the event loop gets to it
+    view.viewport().repaint()
+
+
+def scroll_to_end(app, model, view, timeout):
+    # Pulls every page through fetchMore like a user dragging the scrollbar to the bottom
+    while model.canFetchMore() or model.loading:
+        if model.canFetchMore():
+            model.fetchMore()
+        wait_until(app, lambda: not model.loading, timeout)
+    view.scrollToBottom()
+    paint(view)
+
+
+def run_table_widget(main, app, tablename, timeout):
+    pool = main.ConnectionPool("localhost", "bench", "", "bench")
+    executor = main.QueryExecutor(pool)
+    started = time.perf_counter()
+    widget = main.TableWidget(tablename, pool, executor=executor)
+    widget.show()
+    wait_until(app, lambda: widget.model.rowCount() > 0, timeout)
+    paint(widget.table_view)
+    first_paint = time.perf_counter() - started
+    scroll_to_end(app, widget.model, widget.table_view, timeout)
+    return first_paint, time.perf_counter() - started, widget.model.rowCount()
+
+
+def run_query_window(main, app, tablename, timeout):
+    # The rows are fetched up front the way a query task hands them over, only set_data and painting are timed
+    pool = main.ConnectionPool("localhost", "bench", "", "bench")
+    result = main.QueryTask(0, pool, f"SELECT * FROM {main.quote_identifier(tablename)}").execute()
+
+    started = time.perf_counter()
+    window = main.QueryWindow()
+    window.set_data(result.rows, result.headers)
+    window.show()
+    paint(window.table_view)
+    first_paint = time.perf_counter() - started
+    window.table_view.scrollToBottom()
+    paint(window.table_view)
+    return first_paint, time.perf_counter() - started, window.model.rowCount()
+
+
+def open_database_window(main, app, timeout):
+    window = main.DatabaseWindow(("localhost", "bench", "", "bench"))
+    window.show()
+    wait_until(app, lambda: not window.console_pending and not window.executor.running, timeout)
+    return window
+
+
+def run_console(main, app, tablename, timeout):
+    import mysql.connector
+    window = open_database_window(main, app, timeout)
+    document = window.console.document()
+    header = "\t".join(column[0] for column in mysql.connector.table_columns)
+    painted = []
+
+    def contents_changed(position, removed, added):
+        # The result's header and first rows rendered, the new prompt and status line don't count. The rows can
+        # show up while the rest of the result is still being read
+        if not painted and added:
+            cursor = main.QTextCursor(document)
+            cursor.setPosition(position)
+            cursor.setPosition(position + added, main.QTextCursor.KeepAnchor)
+            if header in cursor.selectedText():
+                paint(window.console)
+                painted.append(time.perf_counter())
+
+    cursor = window.console.textCursor()
+    cursor.movePosition(cursor.End)
+    window.console.setTextCursor(cursor)
+    window.console.insertPlainText(f"SELECT * FROM {tablename}")
+
+    started = time.perf_counter()
+    document.contentsChange.connect(contents_changed)
+    window.execute_sql_command()
+    wait_until(app, lambda: painted and not window.console_pending and not window.console_tasks, timeout)
+    paint(window.console)
+    total = time.perf_counter() - started
+    rows = len(window.last_truncated_result.rows) if window.last_truncated_result is not None else None
+    return painted[0] - started, total, rows
+
+
+def run_refresh(main, app, tablename, timeout):
+    window = open_database_window(main, app, timeout)
+    items = window.hierarchy_widget.findItems(tablename, main.Qt.MatchExactly)
+    window.open_table_tab(items[0])
+    tab = window.table_tab_widget.currentWidget()
+    wait_until(app, lambda: tab.model.rowCount() > 0 and not window.executor.running, timeout)
+    # Scroll a few pages in so the refresh has to throw away more than the first page
+    for _ in range(3):
+        if tab.model.canFetchMore():
+            tab.model.fetchMore()
+            wait_until(app, lambda: not tab.model.loading, timeout)
+
+    loads = []
+    tab.model.loaded.connect(lambda: loads.append(time.perf_counter()))
+    started = time.perf_counter()
+    window.refresh()
+    wait_until(app, lambda: loads, timeout)
+    paint(tab.table_view)
+    first_paint = time.perf_counter() - started
+    wait_until(app, lambda: not window.executor.running, timeout)
+    return first_paint, time.perf_counter() - started, tab.model.rowCount()
+
+
+def run_scenario(scenario, size, latency_ms, timeout):
+    # Child process: the stand-in connector has to be importable as mysql.connector before main is imported
+    os.environ["QT_QPA_PLATFORM"] = "offscreen"
+    os.environ["HOME"] = tempfile.mkdtemp(prefix="sql_editor_bench_")  # Query history goes to a scratch dir
+    sys.path.insert(0, os.path.join(benchmarks_dir, "fake_connector"))
+    sys.path.insert(1, repo_dir)
+
+    import mysql.connector
+    if not hasattr(mysql.connector, "server"):
+        raise RuntimeError(f"Imported the real mysql.connector from {mysql.connector.__file__}")
+    mysql.connector.server.configure(tables={f"rows_{name}": rows for name, rows in table_sizes.items()},
+                                     latency=latency_ms / 1000, database="bench")
+
+    import main
+    from PyQt5.QtWidgets import QApplication
+    app = QApplication([sys.argv[0]])
+
+    baseline_rss = peak_rss_mb()
+    run = globals()[f"run_{scenario}"]
+    mysql.connector.server.reset_stats()
+    first_paint, total, rows = run(main, app, f"rows_{size}", timeout)
+    server_stats = mysql.connector.server.stats()
+    return {
+        "scenario": scenario,
+        "size": size,
+        "latency_ms": latency_ms,
+        "rows": rows,
+        "first_paint_ms": round(first_paint * 1000, 2),
+        "total_ms": round(total * 1000, 2),
+        "peak_rss_mb": None if baseline_rss is None else round(peak_rss_mb(), 1),
+        "startup_rss_mb": None if baseline_rss is None else round(baseline_rss, 1),
+        "connections_opened": server_stats["connects"],
+        "peak_connections": server_stats["peak_connections"],
+        "statements": server_stats["statements"],
+        "rows_sent": server_stats["rows_sent"],
+    }
+
+
+# Runner side
+
+def run_child(scenario, size, latency_ms, timeout):
+    command = [sys.executable, os.path.abspath(__file__), "--child", scenario, size, "--latency-ms", str(latency_ms),
+               "--timeout", str(timeout)]
+    try:
+        completed = subprocess.run(command, capture_output=True, text=True, timeout=timeout + 60)
+    except subprocess.TimeoutExpired:
+        return {"scenario": scenario, "size": size, "error": "timed out"}
+    # main.py prints a banner on import, the result is the last line
+    lines = completed.stdout.strip().splitlines()
+    if completed.returncode != 0 or not lines:
+        error = (completed.stderr.strip().splitlines() or ["no output"])[-1]
+        return {"scenario": scenario, "size": size, "error": error}
+    return json.loads(lines[-1])
+
+
+def format_value(value):
+    if value is None:
+        return "-"
+    if isinstance(value, float):
+        return f"{value:,.1f}"
+    if isinstance(value, int):
+        return f"{value:,}"
+    return str(value)
+
+
+def print_table(results):
+    columns = [("scenario", "Scenario"), ("size", "Size"), ("rows", "Rows"), ("first_paint_ms", "First paint ms"),
+               ("total_ms", "Total ms"), ("peak_rss_mb", "Peak RSS MB"), ("connections_opened", "Connects"),
+               ("peak_connections", "Peak conns"), ("statements", "Statements")]
+    table = [[title for _, title in columns]]
+    for result in results:
+        if "error" in result:
+            table.append([result["scenario"], result["size"], f"error: {result['error']}"])
+        else:
+            table.append([format_value(result.get(key)) for key, _ in columns])
+    widths = [max(len(row[i]) for row in table if len(row) == len(columns)) for i in range(len(columns))]
+    for row in table:
+        if len(row) != len(columns):
+            print("  ".join(row))
+        else:
+            print("  ".join(cell.ljust(width) if i < 2 else cell.rjust(width)
+                            for i, (cell, width) in enumerate(zip(row, widths))))
+
+
+def compare(results, baseline, tolerance):
+    # Returns a line per metric that got worse than the baseline by more than the tolerance
+    previous = {(result["scenario"], result["size"]): result for result in baseline if "error" not in result}
+    regressions = []
+    for result in results:
+        before = previous.get((result["scenario"], result["size"]))
+        if before is None:
+            continue
+        if "error" in result:
+            regressions.append(f"{result['scenario']} {result['size']}: {result['error']}")
+            continue
+        for metric in compared_metrics + ["connections_opened", "statements"]:
+            old, new = before.get(metric), result.get(metric)
+            if old is None or new is None:
+                continue
+            # Counts must not grow at all, timings and memory get some slack for noise
+            allowed = old if metric not in compared_metrics else old * (1 + tolerance)
+            if new > allowed:
+                regressions.append(f"{result['scenario']} {result['size']}: {metric} {format_value(old)} -> "
+                                   f"{format_value(new)}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless benchmarks for the SQL editor's hot paths")
+    parser.add_argument("--sizes", nargs="+", choices=list(table_sizes), default=list(table_sizes))
+    parser.add_argument("--scenarios", nargs="+", choices=scenarios, default=scenarios)
+    parser.add_argument("--latency-ms", type=float, default=1.0, help="Added to every connect and round trip")
+    parser.add_argument("--timeout", type=float, default=600, help="Seconds a single run may take")
+    parser.add_argument("--json", help="Write the results to this file")
+    parser.add_argument("--baseline", help="Results file from an earlier run to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Slack for timings and memory against the baseline, 0.25 is 25%%")
+    parser.add_argument("--child", nargs=2, metavar=("SCENARIO", "SIZE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        result = run_scenario(args.child[0], args.child[1], args.latency_ms, args.timeout)
+        print(json.dumps(result), flush=True)
+        return 0
+
+    results = []
+    for scenario in args.scenarios:
+        for size in args.sizes:
+            print(f"Running {scenario} on {size} rows...", file=sys.stderr, flush=True)
+            results.append(run_child(scenario, size, args.latency_ms, args.timeout))
+    print_table(results)
+
+    if args.json:
+        with open(args.json, "w") as results_file:
+            json.dump(results, results_file, indent=2)
+
+    failed = any("error" in result for result in results)
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.tolerance)
+        if regressions:
+            print("\nRegressions against the baseline:")
+            for line in regressions:
+                print(f"  {line}")
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,19 +1,3566 @@
 
 print("SQL GUI Made by Nathaniel Bates 10/3/2024, Version 1.0.0")
 
+import bisect
+import csv
+import datetime
+import itertools
+import json
+import operator
+import os
+import re
+import sqlite3
 import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from decimal import Decimal, localcontext
+import numpy as np
 import pandas as pd
-from PyQt5.QtGui import QTextCursor, QKeyEvent, QFont
+from PyQt5.QtGui import QTextCursor, QKeyEvent, QFont, QBrush
 from PyQt5.QtWidgets import QApplication, QMainWindow, QVBoxLayout, QWidget, QPushButton, QInputDialog, \
     QMessageBox, QLabel, QLineEdit, QHBoxLayout, QComboBox, QTabWidget, QDialogButtonBox, QTextEdit, QAction, QDialog, \
     QListWidget, QTableWidget, QGridLayout, QSizePolicy, QTableWidgetItem, \
-    QSplitter, qApp, QTableView, QFileDialog, QListWidgetItem, QCheckBox, QScrollArea
-from PyQt5.QtCore import Qt, QObject, QEvent, QCoreApplication
+    QSplitter, qApp, QTableView, QFileDialog, QListWidgetItem, QCheckBox, QScrollArea, QHeaderView, QProgressDialog, \
+    QTreeWidget, QTreeWidgetItem, QDockWidget
+from PyQt5.QtCore import Qt, QObject, QEvent, QCoreApplication, QAbstractTableModel, QModelIndex, pyqtSignal, \
+    QRunnable, QThreadPool, QTimer
 
 import mysql.connector
 
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None  # Parquet export is only offered when pyarrow is installed
+
 removed_dbs = ["mysql", "information_schema", "performance_schema", "sys"]
 defaulthostname = "localhost"
+console_prompt = "MySQL > "
+ddl_keywords = {"CREATE", "ALTER", "DROP", "RENAME", "TRUNCATE"}
+read_only_keywords = {"SELECT", "SHOW", "DESCRIBE", "DESC", "EXPLAIN", "HELP", "USE", "SET"}
+
+# Statements that leave state behind in the session (default database, variables, temporary tables, locks). A
+# pooled connection that ran one is reset before it is handed out again. Quoted text and comments are matched
+# first so an email address in a string isn't taken for a user variable
+session_keywords = {"USE", "SET", "CALL", "PREPARE", "EXECUTE", "LOCK", "HANDLER"}
+session_pattern = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"|`[^`]*`|/\*.*?\*/|(?:--\s|#)[^\n]*"
+                             r"|(?<![\w@$'\"`])(@)(?!@)|\b(TEMPORARY)\b|\b(GET_LOCK)\s*\(", re.IGNORECASE | re.DOTALL)
+
+# Above this many changed rows a tab is reloaded instead of patched row by row
+row_refresh_limit = 500
+
+# Connection pool settings
+pool_max_size = 5
+pool_idle_timeout = 300  # Seconds before an idle connection is closed
+pool_health_check_interval = 30  # Connections idle for longer than this are pinged before reuse
+pool_acquire_timeout = 30
+
+# Console output: rows of a result shown inline, lines rendered per event loop turn and blocks kept before the
+# oldest output is dropped
+console_max_rows = 200
+console_render_chunk = 50
+console_max_blocks = 5000
+
+# Rows fetched per round trip when a table tab is scrolled
+default_page_size = 1000
+
+# Sorting a table tab on a column without an index asks first when the table has at least this many rows
+unindexed_sort_confirm_rows = 100000
+
+# Memory the rows of all open table tabs may use, as estimated from their rows. Least recently viewed tabs drop
+# their rows beyond this and read them again when shown
+tab_memory_budget = 256 * 1024 * 1024
+
+# Seconds a statement may run before it is stopped, 0 disables the limit
+default_statement_timeout = 0
+
+# Seconds the GUI thread waits for a statement already running in the open transaction before reporting it busy
+transaction_busy_timeout = 2
+
+# Upload Table: rows per multi-row INSERT and rows per committed transaction
+bulk_batch_rows = 1000
+bulk_commit_rows = 50000
+# Server warnings kept to explain rows LOAD DATA skipped
+bulk_warning_messages = 5
+
+# Create table from file: the sample read to infer column types is capped by rows and by cells, so wide files
+# read proportionally fewer rows
+inference_sample_rows = 100000
+inference_sample_cells = 2000000
+
+# Memory the opt-in query result cache may use, as estimated from the cached rows
+result_cache_max_bytes = 64 * 1024 * 1024
+
+# Local file every statement run from the console or query dialog is recorded in
+history_path = os.path.join(os.path.expanduser("~"), ".sql_editor", "history.sqlite3")
+
+# Performance panel: database calls and UI actions kept for inspection
+call_log_size = 5000
+action_log_size = 200
+
+# Rows per chunk when a result is stored column by column, results are fetched from the server a chunk at a time
+columnar_chunk_rows = 65536
+
+# Client side filters offered by the filter bar, the comparisons run on whole columns at once
+filter_operators = OrderedDict([("=", operator.eq), ("!=", operator.ne), ("<", operator.lt), ("<=", operator.le),
+                                (">", operator.gt), (">=", operator.ge), ("contains", None), ("is null", None),
+                                ("is not null", None)])
+
+# Text values up to this many bytes are sorted as a fixed width byte array, longer ones as Python objects
+sort_key_bytes = 256
+
+# Text search works on fixed width arrays of about search_block_bytes at a time, grouping values of similar
+# length. Values longer than search_value_bytes are searched one by one
+search_block_bytes = 16 * 1024 * 1024
+search_value_bytes = 4096
+
+# Rows fetched per round trip while exporting, only one batch is held in memory at a time
+export_fetch_rows = 5000
+
+# Tables copied at once when a database rename has to fall back to copying
+rename_copy_workers = 4
+
+# Database helpers
+class CallRecorder:
+    # Ring buffer of every database round trip, with totals per UI action so slow actions can be broken down
+    def __init__(self, size=call_log_size, action_size=action_log_size):
+        self.calls = deque(maxlen=size)
+        self.actions = deque(maxlen=action_size)
+        self.lock = threading.Lock()
+        self.local = threading.local()  # UI action the calls on this thread count towards
+
+    def start_action(self, label):
+        # Calls on the GUI thread count towards the action until control goes back to the event loop, tasks it
+        # submits keep counting towards it on their worker threads. Nested actions count towards the outermost
+        # one, e.g. the hierarchy sync inside a refresh
+        if getattr(self.local, "action", None) is not None:
+            return self.local.action
+        action = {"action": label, "started": time.time(), "connects": 0, "queries": 0, "fetches": 0,
+                  "commits": 0, "rows": 0, "bytes": 0, "db_ms": 0.0, "last_call": time.time()}
+        with self.lock:
+            self.actions.append(action)
+        self.local.action = action
+        QTimer.singleShot(0, self.end_action)
+        return action
+
+    def end_action(self):
+        self.local.action = None
+
+    def current_action(self):
+        return getattr(self.local, "action", None)
+
+    @contextmanager
+    def resume(self, action):
+        # Worker threads carry on counting towards the action that submitted their task
+        previous = getattr(self.local, "action", None)
+        self.local.action = action
+        try:
+            yield
+        finally:
+            self.local.action = previous
+
+    def record(self, kind, elapsed, rows=0, size=0, statement=None):
+        action = getattr(self.local, "action", None)
+        call = {"time": time.time(), "kind": kind, "ms": elapsed * 1000, "rows": rows, "bytes": size,
+                "action": action["action"] if action else None, "site": call_site(),
+                "statement": " ".join(statement.split())[:200] if statement else None}
+        with self.lock:
+            self.calls.append(call)
+            if action is not None:
+                counter = {"connect": "connects", "execute": "queries", "fetch": "fetches",
+                           "commit": "commits", "rollback": "commits"}[kind]
+                action[counter] += 1
+                action["rows"] += rows
+                action["bytes"] += size
+                action["db_ms"] += elapsed * 1000
+                action["last_call"] = call["time"]
+
+    def snapshot(self):
+        with self.lock:
+            return [dict(call) for call in self.calls], [dict(action) for action in self.actions]
+
+    def clear(self):
+        with self.lock:
+            self.calls.clear()
+            self.actions.clear()
+
+call_recorder = CallRecorder()  # Shared by every pool and window
+
+# QueryTask running on the current thread. Connections borrowed while it runs are registered with it, so Cancel and
+# the statement timeout reach whatever it is running, including the statements of work callables
+task_context = threading.local()
+
+def running_task():
+    return getattr(task_context, "task", None)
+
+def call_site():
+    # First frame of this module outside the instrumentation and pooling plumbing, e.g. "TablePager.fetch_page:612"
+    frame = sys._getframe(2)
+    while frame is not None:
+        owner = frame.f_locals.get("self")
+        if frame.f_code.co_filename == __file__ and not isinstance(
+                owner, (CallRecorder, InstrumentedConnection, InstrumentedCursor, ConnectionPool, TransactionSession)):
+            name = frame.f_code.co_name
+            if owner is not None:
+                name = f"{type(owner).__name__}.{name}"
+            return f"{name}:{frame.f_lineno}"
+        frame = frame.f_back
+    return None
+
+def estimate_bytes(rows):
+    # Approximate payload of fetched rows, from a sample so large fetches aren't walked twice
+    if not rows:
+        return 0
+    sample = rows[:50]
+    sampled = sum(len(value) if isinstance(value, (str, bytes, bytearray)) else 8
+                  for row in sample for value in (row if isinstance(row, (tuple, list)) else [row]))
+    return sampled * len(rows) // len(sample)
+
+class InstrumentedCursor:
+    # Times execute and fetch calls, everything else goes straight to the real cursor
+    def __init__(self, cursor, recorder, connection=None):
+        self.cursor = cursor
+        self.recorder = recorder
+        self.connection = connection
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        if self.connection is not None and not self.connection.session_changed:
+            self.connection.session_changed = changes_session(operation)
+        task = running_task()
+        started = time.monotonic()
+        if task is not None:
+            task.statement_started = started  # The statement timeout counts from here
+        try:
+            return self.cursor.execute(operation, params, *args, **kwargs)
+        finally:
+            if task is not None:
+                task.statement_started = None
+            self.recorder.record("execute", time.monotonic() - started, max(self.cursor.rowcount, 0),
+                                 len(operation), operation)
+
+    def execute_unmarked(self, operation, params=None):
+        # For the app's own session settings, which the caller puts back itself, so the connection isn't reset on
+        # release just for those
+        changed = self.connection.session_changed if self.connection is not None else False
+        try:
+            return self.execute(operation, params)
+        finally:
+            if self.connection is not None:
+                self.connection.session_changed = changed
+
+    def executemany(self, operation, seq_params):
+        seq_params = list(seq_params)
+        task = running_task()
+        started = time.monotonic()
+        if task is not None:
+            task.statement_started = started
+        try:
+            return self.cursor.executemany(operation, seq_params)
+        finally:
+            if task is not None:
+                task.statement_started = None
+            self.recorder.record("execute", time.monotonic() - started, max(self.cursor.rowcount, 0),
+                                 estimate_bytes(seq_params), operation)
+
+    def fetch(self, method, *args):
+        started = time.monotonic()
+        rows = method(*args)
+        if isinstance(rows, list):
+            self.recorder.record("fetch", time.monotonic() - started, len(rows), estimate_bytes(rows))
+        else:
+            self.recorder.record("fetch", time.monotonic() - started, 0 if rows is None else 1,
+                                 estimate_bytes([rows] if rows is not None else []))
+        return rows
+
+    def fetchone(self):
+        return self.fetch(self.cursor.fetchone)
+
+    def fetchmany(self, size=1):
+        return self.fetch(self.cursor.fetchmany, size)
+
+    def fetchall(self):
+        return self.fetch(self.cursor.fetchall)
+
+class InstrumentedConnection:
+    # Wraps a mysql.connector connection so every cursor and commit it hands out is recorded
+    def __init__(self, connection, recorder):
+        self.connection = connection
+        self.recorder = recorder
+        self.session_changed = False  # Ran a statement that changes session state, see session_keywords
+
+    def __getattr__(self, name):
+        return getattr(self.connection, name)
+
+    def cursor(self, *args, **kwargs):
+        return InstrumentedCursor(self.connection.cursor(*args, **kwargs), self.recorder, self)
+
+    def commit(self):
+        started = time.monotonic()
+        try:
+            return self.connection.commit()
+        finally:
+            self.recorder.record("commit", time.monotonic() - started)
+
+    def rollback(self):
+        started = time.monotonic()
+        try:
+            return self.connection.rollback()
+        finally:
+            self.recorder.record("rollback", time.monotonic() - started)
+
+def connect(**config):
+    # Every connection the app opens goes through here so it can be timed and its calls recorded
+    started = time.monotonic()
+    connection = mysql.connector.connect(**config)
+    call_recorder.record("connect", time.monotonic() - started)
+    return InstrumentedConnection(connection, call_recorder)
+
+class ConnectionPool:
+    def __init__(self, host, user, password, database=None, max_size=pool_max_size,
+                 idle_timeout=pool_idle_timeout, health_check_interval=pool_health_check_interval):
+        self.config = {"host": host, "user": user, "password": password}
+        if database:
+            self.config["database"] = database
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+
+        self.idle = []  # (connection, last_used) pairs, most recently used last
+        self.in_use = 0
+        self.closed = False
+        self.condition = threading.Condition()
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.failed_health_checks = 0
+
+    @classmethod
+    def from_info(cls, info, **kwargs):
+        return cls(info[0], info[1], info[2], info[3], **kwargs)
+
+    def create_connection(self):
+        return connect(**self.config)
+
+    def is_healthy(self, connection, last_used):
+        if time.monotonic() - last_used < self.health_check_interval:
+            return True  # Used recently enough to skip the round trip
+        try:
+            connection.ping(reconnect=False)
+            return True
+        except mysql.connector.Error:
+            return False
+
+    def take_expired(self):
+        # Must be called with the condition held, returns connections for the caller to close
+        now = time.monotonic()
+        expired = [connection for connection, last_used in self.idle if now - last_used > self.idle_timeout]
+        if expired:
+            self.idle = [(connection, last_used) for connection, last_used in self.idle
+                         if now - last_used <= self.idle_timeout]
+            self.evictions += len(expired)
+        return expired
+
+    def close_quietly(self, connections):
+        for connection in connections:
+            try:
+                connection.close()
+            except mysql.connector.Error:
+                pass
+
+    def acquire(self, timeout=pool_acquire_timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            candidate = None
+            with self.condition:
+                if self.closed:
+                    raise mysql.connector.errors.PoolError("Connection pool is closed")
+                expired = self.take_expired()
+                if self.idle:
+                    candidate, last_used = self.idle.pop()
+                    self.in_use += 1
+                elif self.in_use < self.max_size:
+                    self.in_use += 1
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise mysql.connector.errors.PoolError(
+                            f"No free connection after {timeout}s (max size {self.max_size})")
+                    self.condition.wait(remaining)
+                    continue
+            self.close_quietly(expired)
+
+            # Network work happens outside the lock
+            if candidate is not None:
+                if self.is_healthy(candidate, last_used):
+                    with self.condition:
+                        self.hits += 1
+                    return candidate
+                with self.condition:
+                    self.failed_health_checks += 1
+                self.discard(candidate)
+                continue
+
+            try:
+                connection = self.create_connection()
+            except Exception:
+                with self.condition:
+                    self.in_use -= 1
+                    self.condition.notify()
+                raise
+            with self.condition:
+                self.misses += 1
+            return connection
+
+    def release(self, connection):
+        try:
+            # Leave the connection clean for the next borrower
+            if connection.unread_result:
+                connection.consume_results()
+            if connection.in_transaction:
+                connection.rollback()
+            if getattr(connection, "session_changed", False) and not self.reset_session(connection):
+                self.discard(connection)
+                return
+        except mysql.connector.Error:
+            self.discard(connection)
+            return
+
+        with self.condition:
+            self.in_use -= 1
+            if self.closed:
+                stale = [connection]
+            else:
+                self.idle.append((connection, time.monotonic()))
+                stale = self.take_expired()
+            self.condition.notify()
+        self.close_quietly(stale)
+
+    def reset_session(self, connection):
+        # Clears what a USE, SET, temporary table or lock left behind so the next borrower gets the session a
+        # new connection would. False when the server can't reset, the connection is then closed instead
+        if "database" not in self.config:
+            # A reset keeps the current database and USE can't go back to none, changing user again clears both
+            connection.cmd_change_user(self.config["user"], self.config["password"], "")
+        elif connection.cmd_reset_connection():
+            connection.cmd_init_db(self.config["database"])  # The reset keeps the current database
+        else:
+            return False
+        connection.session_changed = False
+        return True
+
+    def discard(self, connection):
+        with self.condition:
+            self.in_use -= 1
+            self.condition.notify()
+        self.close_quietly([connection])
+
+    @contextmanager
+    def connection(self):
+        connection = self.acquire()
+        task = running_task()
+        if task is not None:
+            task.track(connection)
+        try:
+            yield connection
+        except (mysql.connector.errors.OperationalError, mysql.connector.errors.InterfaceError):
+            # The connection itself is likely broken, don't hand it out again
+            if task is not None:
+                task.untrack(connection)
+            self.discard(connection)
+            connection = None
+            raise
+        finally:
+            if connection is not None:
+                if task is not None:
+                    task.untrack(connection)  # Before the next borrower can get it, so no KILL reaches them
+                self.release(connection)
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            idle = [connection for connection, _ in self.idle]
+            self.idle = []
+            self.condition.notify_all()
+        self.close_quietly(idle)
+
+    def stats(self):
+        with self.condition:
+            requests = self.hits + self.misses
+            return {
+                "max_size": self.max_size,
+                "in_use": self.in_use,
+                "idle": len(self.idle),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / requests if requests else 0.0,
+                "evictions": self.evictions,
+                "failed_health_checks": self.failed_health_checks,
+            }
+
+    def stats_text(self):
+        stats = self.stats()
+        return (f"Connections in use: {stats['in_use']} / {stats['max_size']}\n"
+                f"Idle connections: {stats['idle']}\n"
+                f"Pool hits: {stats['hits']}\n"
+                f"Pool misses (new connections): {stats['misses']}\n"
+                f"Hit rate: {stats['hit_rate']:.0%}\n"
+                f"Idle evictions: {stats['evictions']}\n"
+                f"Failed health checks: {stats['failed_health_checks']}")
+
+    def commit(self, connection, statement=None):
+        # Same signature as TransactionSession.commit, so either can be handed to code that writes
+        connection.commit()
+
+class TransactionSession(QObject):
+    # Stands in for the pool wherever statements should join an open transaction: while one is open they all
+    # go over the one held connection and their commits wait for COMMIT, otherwise it hands out pooled
+    # connections and commits straight away
+    changed = pyqtSignal()  # Transaction opened, closed or pending changes counted, may come from any thread
+
+    def __init__(self, pool, parent=None):
+        super().__init__(parent)
+        self.pool = pool
+        self.transaction_connection = None
+        self.lock = threading.RLock()  # One statement at a time on the transaction's connection
+        self.pending = 0  # Changing statements since BEGIN
+        self.started = None
+        self.result_cache = None  # ResultCache told about every write that goes through the session
+
+    def in_transaction(self):
+        return self.transaction_connection is not None
+
+    def begin(self):
+        with self.lock:
+            if self.transaction_connection is not None:
+                return
+            connection = self.pool.acquire()
+            try:
+                connection.start_transaction()
+            except mysql.connector.Error:
+                self.pool.release(connection)
+                raise
+            self.transaction_connection = connection
+            self.pending = 0
+            self.started = time.monotonic()
+        self.changed.emit()
+
+    def end(self, commit):
+        # Returns the number of changes committed or rolled back
+        with self.lock:
+            connection = self.transaction_connection
+            if connection is None:
+                return 0
+            pending = self.pending
+            try:
+                if commit:
+                    connection.commit()
+                else:
+                    connection.rollback()
+            except mysql.connector.Error:
+                if connection.is_connected():
+                    raise  # Still open, COMMIT can be retried or the changes rolled back
+                self.transaction_connection = None
+                self.pool.discard(connection)
+                self.changed.emit()
+                raise
+            self.transaction_connection = None
+            self.pending = 0
+            self.pool.release(connection)
+        if not commit and self.result_cache is not None:
+            self.result_cache.invalidate()  # Results read inside the transaction may show rolled back rows
+        self.changed.emit()
+        return pending
+
+    def commit_transaction(self):
+        return self.end(True)
+
+    def rollback_transaction(self):
+        return self.end(False)
+
+    @contextmanager
+    def connection(self):
+        # Dialogs run their statements on the GUI thread, waiting out a long statement in the transaction would
+        # freeze the window, so they give up after a moment with an error to show instead
+        timeout = transaction_busy_timeout if threading.current_thread() is threading.main_thread() else -1
+        if not self.lock.acquire(timeout=timeout):
+            raise mysql.connector.errors.PoolError(
+                "The open transaction is busy running another statement, try again when it has finished")
+        try:
+            connection = self.transaction_connection
+            if connection is not None:
+                task = running_task()
+                if task is not None:
+                    task.track(connection)
+                try:
+                    yield connection
+                except (mysql.connector.errors.OperationalError, mysql.connector.errors.InterfaceError):
+                    # The server dropped the connection and the transaction went with it
+                    self.transaction_connection = None
+                    self.pool.discard(connection)
+                    self.changed.emit()
+                    raise
+                finally:
+                    if task is not None:
+                        task.untrack(connection)
+                return
+        finally:
+            self.lock.release()
+        with self.pool.connection() as connection:
+            yield connection
+
+    def commit(self, connection, statement=None):
+        if self.result_cache is not None and statement:
+            self.result_cache.invalidate_statement(statement)
+        if connection is not self.transaction_connection:
+            connection.commit()
+            return
+        keyword = statement_keyword(statement) if statement else None
+        if keyword in ddl_keywords:
+            self.pending = 0  # DDL commits the open transaction implicitly
+        elif keyword not in read_only_keywords:
+            self.pending += 1
+        self.changed.emit()
+
+    def create_connection(self):
+        return self.pool.create_connection()
+
+def quote_identifier(name):
+    return "`" + str(name).replace("`", "``") + "`"
+
+def like_pattern(text):
+    # Matches text anywhere, with LIKE's wildcards in it taken literally. Backslash is the escape character in
+    # MySQL and in the history's ESCAPE clause
+    return "%" + text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+def strip_leading_comments(statement):
+    text = statement.lstrip()
+    while True:
+        if text.startswith("--") or text.startswith("#"):
+            newline = text.find("\n")
+            text = text[newline + 1:].lstrip() if newline != -1 else ""
+        elif text.startswith("/*"):
+            end = text.find("*/")
+            text = text[end + 2:].lstrip() if end != -1 else ""
+        else:
+            return text
+
+cte_token_pattern = re.compile(r"`[^`]*`|'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"|[\w$]+|\S", re.DOTALL)
+
+def statement_body(statement):
+    # The statement from its first keyword on. For WITH that is the statement after the common table
+    # expressions, which can be an UPDATE or DELETE as well as a SELECT
+    text = strip_leading_comments(statement).lstrip("( \t\r\n")
+    if not re.match(r"WITH\b", text, re.IGNORECASE):
+        return text
+    depth = 0
+    previous = None  # Last word at the top level
+    definition = False  # Inside the brackets after AS
+    after_definition = False
+    for match in cte_token_pattern.finditer(text, 4):
+        token = match.group()
+        if token == "(":
+            if depth == 0:
+                definition = previous == "AS"
+            depth += 1
+        elif token == ")":
+            depth -= 1
+            after_definition = depth == 0 and definition
+        elif depth == 0:
+            if after_definition and token != ",":
+                return text[match.start():]
+            after_definition = False
+            previous = token.upper()
+    return text
+
+def statement_keyword(statement):
+    # First keyword of a statement, skipping leading comments, brackets and common table expressions
+    text = statement_body(statement).lstrip("( \t\r\n")
+    word = ""
+    for char in text:
+        if not (char.isalnum() or char == "_"):
+            break
+        word += char
+    return word.upper()
+
+def changes_session(statement):
+    # True when a statement leaves state behind in the session, see session_keywords
+    return (statement_keyword(statement) in session_keywords or
+            any(match.lastindex for match in session_pattern.finditer(statement)))
+
+table_name_pattern = r"((?:`[^`]+`|[\w$]+)(?:\s*\.\s*(?:`[^`]+`|[\w$]+))?)"
+
+def normalize_table_name(name, database=None):
+    # Strip quoting and drop names qualified with a different database
+    parts = [part.strip().strip("`") for part in name.split(".")]
+    if len(parts) == 2:
+        if database is not None and parts[0] != database:
+            return None
+        return parts[1]
+    return parts[0]
+
+def ddl_tables(statement, database=None):
+    # Tables whose definition a DDL statement changes, None when the whole schema may have changed
+    keyword = statement_keyword(statement)
+    text = " ".join(strip_leading_comments(statement).split())
+    if keyword not in ddl_keywords:
+        return set()
+    if re.search(r"^\S+\s+(?:DATABASE|SCHEMA)\b", text, re.IGNORECASE):
+        return None
+
+    names = []
+    if keyword == "RENAME":
+        for old_name, new_name in re.findall(table_name_pattern + r"\s+TO\s+" + table_name_pattern, text, re.IGNORECASE):
+            names += [old_name, new_name]
+    else:
+        index = re.search(r"\bINDEX\s+\S+\s+ON\s+" + table_name_pattern, text, re.IGNORECASE)
+        target = re.search(r"^\w+\s+(?:TEMPORARY\s+|OR\s+REPLACE\s+|ALGORITHM\s*=\s*\w+\s+|DEFINER\s*=\s*\S+\s+|"
+                           r"SQL\s+SECURITY\s+\w+\s+)*(TABLE|VIEW)?\s*(?:IF\s+(?:NOT\s+)?EXISTS\s+)?(.*)$",
+                           text, re.IGNORECASE)
+        if index:
+            names.append(index.group(1))
+        elif target and (target.group(1) or keyword == "TRUNCATE"):
+            rest = target.group(2)
+            if keyword == "DROP":
+                names += re.findall(table_name_pattern, rest.split(" RESTRICT")[0].split(" CASCADE")[0])
+            else:
+                first = re.match(table_name_pattern, rest)
+                if first:
+                    names.append(first.group(1))
+                if keyword == "ALTER":
+                    # ALTER TABLE t RENAME TO u changes both names, unlike renaming a column or an index
+                    names += re.findall(r"\bRENAME\s+(?!(?:COLUMN|INDEX|KEY)\b)(?:(?:TO|AS)\s+)?" + table_name_pattern,
+                                        rest, re.IGNORECASE)
+        else:
+            return set()  # Routines, triggers, users and so on leave table metadata alone
+
+    tables = set()
+    for name in names:
+        table = normalize_table_name(name, database)
+        if table:
+            tables.add(table)
+    return tables
+
+def select_tables(statement, database=None):
+    # Tables a SELECT reads, None when it reads another database's tables or none could be found
+    text = " ".join(strip_leading_comments(statement).split())
+    names = re.findall(r"\b(?:FROM|JOIN)\s+" + table_name_pattern, text, re.IGNORECASE)
+    # Comma joins, e.g. FROM a x, b y
+    for match in re.finditer(r"\bFROM\s+(.*?)(?=\b(?:WHERE|GROUP|HAVING|ORDER|LIMIT|UNION|JOIN|FOR)\b|\)|$)", text,
+                             re.IGNORECASE):
+        names += re.findall(r",\s*" + table_name_pattern, match.group(1))
+    if not names:
+        return None
+    tables = set()
+    for name in names:
+        table = normalize_table_name(name, database)
+        if table is None:
+            return None
+        tables.add(table)
+    return tables
+
+# Functions and clauses whose results change without any table changing, queries using them are never cached
+volatile_pattern = re.compile(r"\b(?:NOW|SYSDATE|CURDATE|CURTIME|CURRENT_DATE|CURRENT_TIME|CURRENT_TIMESTAMP|"
+                              r"LOCALTIME|LOCALTIMESTAMP|UTC_DATE|UTC_TIME|UTC_TIMESTAMP|UNIX_TIMESTAMP|RAND|UUID|"
+                              r"UUID_SHORT|CONNECTION_ID|CURRENT_USER|USER|LAST_INSERT_ID|FOUND_ROWS|ROW_COUNT|SLEEP|"
+                              r"GET_LOCK|DATABASE)\s*\(|\bFOR\s+(?:UPDATE|SHARE)\b|\bLOCK\s+IN\s+SHARE\b|\bINTO\b|@",
+                              re.IGNORECASE)
+
+def estimate_size(rows):
+    # Rough bytes held by a result, from a sample of its rows
+    if isinstance(rows, ColumnarRows):
+        return rows.nbytes
+    if not rows:
+        return sys.getsizeof(rows)
+    sample = rows[:100]
+    sampled = sum(sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row) for row in sample)
+    return sys.getsizeof(rows) + sampled * len(rows) // len(sample)
+
+def copy_rows(rows):
+    return rows.copy() if isinstance(rows, ColumnarRows) else list(rows)
+
+class ResultCache:
+    # Opt-in LRU cache of read-only query results, bounded by an estimate of their size in memory. Entries are
+    # dropped when the app writes to a table they read, and can also be checked against UPDATE_TIME on each hit
+    # for changes made by other clients. Only queries on base tables are cached, a view's rows change with tables
+    # its name doesn't give away
+    def __init__(self, database, schema, max_bytes=result_cache_max_bytes):
+        self.database = database
+        self.schema = schema  # SchemaCache for table types, foreign keys and triggers
+        self.max_bytes = max_bytes
+        self.enabled = False
+        self.check_update_time = False
+        self.entries = OrderedDict()  # Key -> (result, size, tables, update times, stored at)
+        self.size = 0
+        self.generation = 0  # Bumped on every invalidation, so a result read before a write is never stored after it
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def key(self, statement, params=None):
+        return " ".join(strip_leading_comments(statement).rstrip().rstrip(";").split()), repr(params)
+
+    def lookup(self, statement, params=None, connection=None):
+        # Returns (cached result or None, ticket for store), the ticket is None when the query can't be cached
+        if not self.enabled or statement_keyword(statement) != "SELECT" or volatile_pattern.search(statement):
+            return None, None
+        tables = select_tables(statement, self.database)
+        if tables is None or not all(self.schema.is_base_table(table) for table in tables):
+            return None, None
+        key = self.key(statement, params)
+        with self.lock:
+            ticket = (key, tables, self.generation)
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None, ticket
+            self.entries.move_to_end(key)
+        result, size, tables, update_times, stored_at = entry
+        if self.check_update_time and connection is not None and self.update_times(connection, tables) != update_times:
+            with self.lock:
+                if self.entries.get(key) is entry:
+                    del self.entries[key]
+                    self.size -= size
+                self.stale += 1
+            return None, ticket
+        with self.lock:
+            self.hits += 1
+        # Callers own the rows they get back, models append to and patch them
+        return QueryResult(result.statement, result.headers, copy_rows(result.rows), result.rowcount, result.lastrowid,
+                           cached_at=stored_at), ticket
+
+    def store(self, ticket, result, connection=None):
+        key, tables, generation = ticket
+        size = estimate_size(result.rows)
+        if size > self.max_bytes // 4:
+            return  # One huge result would push everything else out
+        update_times = self.update_times(connection, tables) if self.check_update_time and connection else None
+        with self.lock:
+            if generation != self.generation:
+                return  # A write happened while the query ran
+            if key in self.entries:
+                self.size -= self.entries.pop(key)[1]
+            while self.entries and self.size + size > self.max_bytes:
+                self.size -= self.entries.popitem(last=False)[1][1]
+                self.evictions += 1
+            result = QueryResult(result.statement, list(result.headers), copy_rows(result.rows), result.rowcount,
+                                 result.lastrowid)
+            self.entries[key] = (result, size, tables, update_times, time.time())
+            self.size += size
+
+    def update_times(self, connection, tables):
+        cursor = connection.cursor()
+        try:
+            # MySQL 8 caches table statistics for a day unless told otherwise
+            cursor.execute_unmarked("SET SESSION information_schema_stats_expiry = 0")
+            expiry_set = True
+        except mysql.connector.Error:
+            expiry_set = False
+        try:
+            placeholders = ", ".join(["%s"] * len(tables))
+            cursor.execute(f"SELECT TABLE_NAME, UPDATE_TIME FROM information_schema.TABLES "
+                           f"WHERE TABLE_SCHEMA = %s AND TABLE_NAME IN ({placeholders})",
+                           [self.database] + sorted(tables))
+            update_times = tuple(sorted((as_text(name), str(update_time))
+                                        for name, update_time in cursor.fetchall()))
+        finally:
+            if expiry_set:
+                try:
+                    cursor.execute_unmarked("SET SESSION information_schema_stats_expiry = DEFAULT")
+                except mysql.connector.Error:
+                    connection.session_changed = True  # Still set, the pool resets it on release
+                    raise
+            cursor.close()
+        return update_times
+
+    def affected_tables(self, tables):
+        # Tables whose rows a write to these tables can change: foreign key children through ON DELETE/UPDATE
+        # CASCADE and SET NULL. None when a trigger on them may write anywhere
+        try:
+            if tables & self.schema.triggered_tables():
+                return None
+            return tables | self.schema.referencing_tables(tables)
+        except mysql.connector.Error:
+            return None
+
+    def invalidate(self, tables=None):
+        # Drops results that read any of the tables or tables a write to them can change, everything when tables
+        # is None
+        if tables and self.entries:
+            tables = self.affected_tables(set(tables))
+        with self.lock:
+            self.generation += 1
+            self.invalidations += 1
+            for key, entry in list(self.entries.items()):
+                if tables is None or entry[2] & set(tables):
+                    del self.entries[key]
+                    self.size -= entry[1]
+
+    def invalidate_statement(self, statement):
+        keyword = statement_keyword(statement)
+        if keyword in read_only_keywords:
+            return
+        if keyword in ddl_keywords:
+            self.invalidate(ddl_tables(statement, self.database))
+        else:
+            self.invalidate(dml_tables(statement, self.database))
+
+    def stats_text(self):
+        lookups = self.hits + self.misses
+        hit_rate = self.hits / lookups if lookups else 0.0
+        return (f"Enabled: {'yes' if self.enabled else 'no'}\n"
+                f"Cached results: {len(self.entries)}\n"
+                f"Estimated size: {self.size / 1048576:.1f} / {self.max_bytes / 1048576:.0f} MB\n"
+                f"Hits: {self.hits}\n"
+                f"Misses: {self.misses}\n"
+                f"Hit rate: {hit_rate:.0%}\n"
+                f"Stale (UPDATE_TIME changed): {self.stale}\n"
+                f"Evictions: {self.evictions}\n"
+                f"Invalidations: {self.invalidations}")
+
+def plan_node(label):
+    return {"label": label, "access": "", "key": "", "estimated": "", "actual": "", "cost": "", "flags": [],
+            "detail": "", "children": []}
+
+def explain_json_nodes(name, value):
+    # Turns EXPLAIN FORMAT=JSON output into plan nodes, one per operation and table access
+    if isinstance(value, list):
+        nodes = []
+        for item in value:
+            if isinstance(item, dict) and len(item) == 1:
+                # Wrappers such as {"table": {...}} inside nested_loop
+                item_name, item = next(iter(item.items()))
+                nodes.extend(explain_json_nodes(item_name, item))
+            else:
+                nodes.extend(explain_json_nodes(name, item))
+        return nodes
+    if not isinstance(value, dict):
+        return []
+
+    node = plan_node(name.replace("_", " "))
+    if "select_id" in value:
+        node["label"] = f"query block #{value['select_id']}"
+    if "table_name" in value:
+        node["label"] = f"table {value['table_name']}"
+        node["access"] = value.get("access_type", "")
+        node["key"] = value.get("key", "")
+        node["estimated"] = value.get("rows_examined_per_scan", "")
+        node["detail"] = value.get("attached_condition", "")
+        if node["access"] == "ALL":
+            node["flags"].append("full table scan")
+        elif node["access"] == "index":
+            node["flags"].append("full index scan")
+    cost_info = value.get("cost_info", {})
+    node["cost"] = cost_info.get("query_cost") or cost_info.get("prefix_cost") or cost_info.get("sort_cost") or ""
+    if value.get("using_filesort"):
+        node["flags"].append("filesort")
+    if value.get("using_temporary_table"):
+        node["flags"].append("temporary table")
+
+    for key, child in value.items():
+        if key != "cost_info" and isinstance(child, (dict, list)):
+            node["children"].extend(explain_json_nodes(key, child))
+    return [node]
+
+analyze_line_pattern = re.compile(r"^(?P<indent> *)-> (?P<label>.*?)"
+                                  r"(?:\s+\(cost=(?P<cost>[\d.e+]+)\s+rows=(?P<rows>[\d.e+]+)\))?"
+                                  r"(?:\s+\(actual time=[\d.e+]+\.\.(?P<time>[\d.e+]+) rows=(?P<actual>[\d.e+]+)"
+                                  r" loops=(?P<loops>\d+)\)|\s+\((?P<never>never executed)\))?\s*$")
+
+def explain_analyze_nodes(text):
+    # Turns the EXPLAIN ANALYZE tree into plan nodes, nesting follows the indentation of the "->" lines
+    roots = []
+    stack = []  # (indent, node)
+    for line in text.splitlines():
+        match = analyze_line_pattern.match(line)
+        if not match:
+            continue
+        node = plan_node(match.group("label"))
+        label = node["label"]
+        node["cost"] = match.group("cost") or ""
+        node["estimated"] = match.group("rows") or ""
+        if match.group("never"):
+            node["actual"] = "never executed"
+        elif match.group("actual"):
+            rows = float(match.group("actual"))
+            loops = int(match.group("loops"))
+            node["actual"] = f"{rows:g}" if loops == 1 else f"{rows:g} x {loops} loops"
+            node["detail"] = f"Last row after {match.group('time')} ms per loop"
+            # Estimates off by more than 10x are what usually sends the optimizer down the wrong plan
+            estimated = float(node["estimated"] or 0)
+            ratio = max(rows, 1) / max(estimated, 1)
+            if max(rows, estimated) >= 100 and not 0.1 <= ratio <= 10:
+                node["flags"].append("misestimate")
+        if label.startswith("Table scan on"):
+            node["flags"].append("full table scan")
+        elif label.startswith("Index scan on"):
+            node["flags"].append("full index scan")
+        elif label.startswith("Sort"):
+            node["flags"].append("filesort")
+        elif label.startswith(("Temporary table", "Materialize")):
+            node["flags"].append("temporary table")
+
+        indent = len(match.group("indent"))
+        while stack and stack[-1][0] >= indent:
+            stack.pop()
+        if stack:
+            stack[-1][1]["children"].append(node)
+        else:
+            roots.append(node)
+        stack.append((indent, node))
+    return roots
+
+def format_age(seconds):
+    if seconds < 60:
+        return f"{seconds:.0f} s"
+    if seconds < 3600:
+        return f"{seconds / 60:.0f} min"
+    return f"{seconds / 3600:.1f} h"
+
+epoch = datetime.datetime(1970, 1, 1)
+epoch_ordinal = epoch.toordinal()
+
+class Column:
+    # One column of a chunk of rows as a typed NumPy array. Integers, floats, dates, datetimes and times are
+    # int64 or float64 values (dates as days, datetimes and times as microseconds), decimals are int64 scaled
+    # by 10 ** scale, text and binary values are an offsets array into one buffer. NULLs are a packed bitmap,
+    # None when the column has none. Anything else is kept as Python objects
+    # Every character the text of a value of these kinds can have
+    text_characters = {"int": "-0123456789", "decimal": "-.0123456789", "float": "-+.0123456789aefin",
+                       "datetime": "-:.T0123456789", "date": "-0123456789"}
+
+    def __init__(self, kind, length, values=None, nulls=None, buffer=None, scale=0):
+        self.kind = kind
+        self.length = length
+        self.values = values
+        self.nulls = nulls
+        self.buffer = buffer
+        self.scale = scale
+
+    @classmethod
+    def from_values(cls, values):
+        length = len(values)
+        present = values
+        nulls = None
+        missing = np.fromiter((value is None for value in values), bool, length)
+        if missing.any():
+            present = [value for value in values if value is not None]
+            if not present:
+                return cls("null", length)
+            nulls = np.packbits(missing)
+        value_types = set(map(type, present))
+        value_type = value_types.pop() if len(value_types) == 1 else None
+
+        try:
+            if value_type is int:
+                return cls("int", length, np.array([0 if value is None else value for value in values], np.int64),
+                           nulls)
+            if value_type is float:
+                return cls("float", length, np.array([0.0 if value is None else value for value in values],
+                                                     np.float64), nulls)
+            if value_type is datetime.datetime and all(value.tzinfo is None for value in present):
+                return cls("datetime", length, time_values(values, "datetime64[us]"), nulls)
+            if value_type is datetime.date:
+                return cls("date", length, time_values(values, "datetime64[D]"), nulls)
+            if value_type is datetime.timedelta:
+                return cls("timedelta", length, time_values(values, "timedelta64[us]"), nulls)
+            if value_type is Decimal and all(map(Decimal.is_finite, present)):
+                scale, scaled = decimal_values(values, present)
+                return cls("decimal", length, np.array(scaled, np.int64), nulls, scale=scale)
+            if value_type is str:
+                texts = values if nulls is None else ["" if value is None else value for value in values]
+                buffer = "".join(texts).encode("utf-8")
+                if len(buffer) != sum(map(len, texts)):
+                    # Some text isn't ASCII, so character counts aren't byte counts
+                    texts = [text.encode("utf-8") for text in texts]
+                return cls("str", length, string_offsets(texts), nulls, buffer)
+            if value_type in (bytes, bytearray):
+                encoded = [b"" if value is None else bytes(value) for value in values]
+                return cls("bytes", length, string_offsets(encoded), nulls, b"".join(encoded))
+        except (OverflowError, ArithmeticError, ValueError):
+            pass  # Out of int64 range, or a date numpy can't represent
+        objects = np.empty(length, object)
+        objects[:] = values
+        return cls("object", length, objects)
+
+    @classmethod
+    def concat(cls, columns):
+        # Joins the columns of consecutive chunks, mixed kinds fall back to Python objects
+        if len(columns) == 1:
+            return columns[0]
+        length = sum(column.length for column in columns)
+        kinds = {column.kind for column in columns if column.kind != "null"}
+        scales = {column.scale for column in columns if column.kind != "null"}
+        if not kinds:
+            return cls("null", length)
+        if len(kinds) > 1 or len(scales) > 1 or "object" in kinds:
+            return cls.from_values([value for column in columns for value in column.to_list()])
+        kind = kinds.pop()
+        nulls = None
+        if any(column.nulls is not None or column.kind == "null" for column in columns):
+            nulls = np.packbits(np.concatenate([column.null_mask() for column in columns]))
+        if kind in ("str", "bytes"):
+            values = [np.zeros(1, np.int64)]
+            position = 0
+            for column in columns:
+                offsets = column.values if column.kind != "null" else np.zeros(column.length + 1, np.int64)
+                values.append(offsets[1:] + position)
+                position += offsets[-1]
+            buffer = b"".join(column.buffer for column in columns if column.kind != "null")
+            return cls(kind, length, np.concatenate(values), nulls, buffer)
+        dtype = np.float64 if kind == "float" else np.int64
+        values = np.concatenate([column.values if column.kind != "null" else np.zeros(column.length, dtype)
+                                 for column in columns])
+        return cls(kind, length, values, nulls, scale=scales.pop())
+
+    @property
+    def nbytes(self):
+        size = 0
+        if self.values is not None:
+            size += self.values.nbytes
+            if self.kind == "object":
+                size += sum(sys.getsizeof(value) for value in self.values[:100]) * self.length // max(1, min(
+                    100, self.length))
+        if self.nulls is not None:
+            size += self.nulls.nbytes
+        if self.buffer is not None:
+            size += len(self.buffer)
+        return size
+
+    def null_mask(self):
+        if self.kind == "null":
+            return np.ones(self.length, bool)
+        if self.nulls is None:
+            return np.zeros(self.length, bool)
+        return np.unpackbits(self.nulls, count=self.length).astype(bool)
+
+    def is_null(self, index):
+        return self.kind == "null" or (self.nulls is not None and bool(self.nulls[index >> 3] & (128 >> (index & 7))))
+
+    def value(self, index):
+        if self.is_null(index):
+            return None
+        kind = self.kind
+        if kind == "str":
+            return self.buffer[self.values[index]:self.values[index + 1]].decode("utf-8")
+        if kind == "bytes":
+            return self.buffer[self.values[index]:self.values[index + 1]]
+        value = self.values[index]
+        if kind == "int":
+            return int(value)
+        if kind == "float":
+            return float(value)
+        if kind == "decimal":
+            return Decimal(int(value)).scaleb(-self.scale)
+        if kind == "datetime":
+            return epoch + datetime.timedelta(microseconds=int(value))
+        if kind == "date":
+            return datetime.date.fromordinal(epoch_ordinal + int(value))
+        if kind == "timedelta":
+            return datetime.timedelta(microseconds=int(value))
+        return value
+
+    def to_list(self, start=0, stop=None):
+        # Python values for a range of rows, converted a whole range at a time
+        stop = self.length if stop is None else stop
+        kind = self.kind
+        if kind == "null":
+            return [None] * (stop - start)
+        if kind in ("str", "bytes"):
+            offsets = self.values[start:stop + 1].tolist()
+            buffer = self.buffer
+            if kind == "str":
+                values = [buffer[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(stop - start)]
+            else:
+                values = [buffer[offsets[i]:offsets[i + 1]] for i in range(stop - start)]
+        elif kind == "decimal":
+            values = [Decimal(value).scaleb(-self.scale) for value in self.values[start:stop].tolist()]
+        elif kind == "datetime":
+            values = self.values[start:stop].view("datetime64[us]").tolist()
+        elif kind == "date":
+            values = self.values[start:stop].view("datetime64[D]").tolist()
+        elif kind == "timedelta":
+            values = self.values[start:stop].view("timedelta64[us]").tolist()
+        else:
+            values = self.values[start:stop].tolist()
+        if self.nulls is not None:
+            for index in np.flatnonzero(self.null_mask()[start:stop]).tolist():
+                values[index] = None
+        return values
+
+    def sort_keys(self):
+        # An array that sorts like the column's values, NULL rows hold a placeholder
+        if self.kind in ("int", "float", "decimal", "datetime", "date", "timedelta"):
+            return self.values
+        if self.kind == "null":
+            return np.zeros(self.length, np.int64)
+        if self.kind in ("str", "bytes"):
+            # UTF-8 bytes sort in code point order, the same as the strings. Values are copied from the buffer into
+            # a fixed width byte array, a chunk of rows at a time so the index arrays stay small. Long values stay
+            # objects rather than padding every value to the longest one
+            width = max(1, int(np.diff(self.values).max()))
+            if width > sort_key_bytes:
+                keys = np.empty(self.length, object)
+                keys[:] = [self.buffer[start:stop] for start, stop in zip(self.values[:-1].tolist(),
+                                                                          self.values[1:].tolist())]
+                return keys
+            keys = np.empty(self.length, f"S{width}")
+            for start in range(0, self.length, columnar_chunk_rows):
+                stop = min(start + columnar_chunk_rows, self.length)
+                keys[start:stop] = self.fixed_width(np.arange(start, stop))
+            return keys
+        keys = np.empty(self.length, object)
+        keys[:] = self.to_list()
+        return keys
+
+    def sort_rows(self, rows, descending=False):
+        # The given row indexes in the column's order. The sort is stable and NULLs come first ascending and last
+        # descending, the way MySQL sorts them
+        nulls = self.null_mask()[rows]
+        null_rows, rows = rows[nulls], rows[~nulls]
+        keys = self.sort_keys()[rows]
+        if descending:
+            keys = keys[::-1]
+        try:
+            order = np.argsort(keys, kind="stable")
+        except TypeError:
+            order = np.argsort(np.array([str(key) for key in keys]), kind="stable")  # Values of mixed types
+        if descending:
+            # Sorting the reversed keys and reversing the result keeps equal values in their original order
+            return np.concatenate([rows[len(rows) - 1 - order[::-1]], null_rows])
+        return np.concatenate([null_rows, rows[order]])
+
+    def compare(self, operation, text):
+        # Rows whose value matches the predicate, NULLs only match the NULL checks
+        nulls = self.null_mask()
+        if operation == "is null":
+            return nulls
+        if operation == "is not null":
+            return ~nulls
+        if operation == "contains":
+            return self.contains(text)
+        if self.kind == "null":
+            return np.zeros(self.length, bool)
+        kind = self.kind
+        try:
+            if kind == "int":
+                try:
+                    value = int(text)
+                except ValueError:
+                    value = float(text)
+            elif kind == "float":
+                value = float(text)
+            elif kind == "decimal":
+                value = float(Decimal(text).scaleb(self.scale))
+            elif kind == "datetime":
+                value = (datetime.datetime.fromisoformat(text) - epoch) // datetime.timedelta(microseconds=1)
+            elif kind == "date":
+                value = datetime.date.fromisoformat(text).toordinal() - epoch_ordinal
+            elif kind == "timedelta":
+                value = pd.Timedelta(text).value // 1000
+            elif kind in ("str", "bytes") and operation in ("=", "!="):
+                # A whole value match against the buffer, without building the strings. Only values of the
+                # needle's length are compared, as rows of a byte matrix
+                needle = np.frombuffer(text.encode("utf-8"), np.uint8)
+                candidates = np.flatnonzero(np.diff(self.values) == len(needle))
+                equal = np.zeros(self.length, bool)
+                if len(needle):
+                    data = np.frombuffer(self.buffer, np.uint8)
+                    step = max(1, search_block_bytes // len(needle))
+                    for start in range(0, len(candidates), step):
+                        rows = candidates[start:start + step]
+                        values = data[self.values[rows][:, None] + np.arange(len(needle))]
+                        equal[rows] = (values == needle).all(axis=1)
+                else:
+                    equal[candidates] = True
+                return (equal if operation == "=" else ~equal) & ~nulls
+            else:
+                # Text and anything else is compared as Python objects, numpy still runs the loop
+                value = text.encode("utf-8") if kind == "bytes" else text
+                values = np.empty(self.length, object)
+                values[:] = [value if item is None else item for item in self.to_list()]
+                return np.asarray(filter_operators[operation](values, value), bool) & ~nulls
+        except (ArithmeticError, ValueError, TypeError) as err:
+            raise ValueError(f"{text!r} is not a valid {kind} value: {err}")
+        return filter_operators[operation](self.values, value) & ~nulls
+
+    def contains(self, text):
+        # Case insensitive substring match against the text each value is shown as
+        mask = np.zeros(self.length, bool)
+        kind = self.kind
+        if kind == "null":
+            return mask
+        if kind in ("str", "bytes"):
+            needle = text.lower()
+            if not needle:
+                return ~self.null_mask()
+            # Rows are grouped by their length rounded up to a power of two so short values aren't padded to the
+            # width of the longest one. ASCII values are lowered as bytes, other text is decoded first so that
+            # searching "ÜB" finds "über". Binary values only fold ASCII letters
+            lengths = np.diff(self.values)
+            groups = np.left_shift(2, np.ceil(np.log2(np.maximum(lengths, 16))).astype(np.int64))
+            if kind == "str" and not self.buffer.isascii():
+                wide = np.flatnonzero(np.frombuffer(self.buffer, np.uint8) >= 128)
+                groups[np.searchsorted(self.values, wide, "right") - 1] |= 1
+            for group in np.flatnonzero(np.bincount(groups[lengths <= search_value_bytes])).tolist():
+                members = np.flatnonzero(groups == group)
+                step = max(1, search_block_bytes // (group // 2))
+                for start in range(0, len(members), step):
+                    rows = members[start:start + step]
+                    block = self.fixed_width(rows)
+                    if group % 2:
+                        block = np.char.decode(block, "utf-8")
+                    mask[rows] = np.char.find(np.char.lower(block), needle if group % 2 else needle.encode()) >= 0
+            for row in np.flatnonzero(lengths > search_value_bytes).tolist():
+                value = self.buffer[self.values[row]:self.values[row + 1]]
+                if groups[row] % 2:
+                    mask[row] = needle in value.decode("utf-8").lower()
+                else:
+                    mask[row] = needle.encode() in value.lower()
+            return mask & ~self.null_mask()
+        needle = text.lower()
+        if kind == "datetime":
+            needle = needle.replace(" ", "T")  # numpy puts a T between the date and the time
+        if kind in self.text_characters and not set(needle) <= set(self.text_characters[kind]):
+            return mask  # The text of these values can't hold the search, letters in a number column say
+        if kind in ("int", "float"):
+            texts = self.values.astype(str)
+        elif kind == "decimal":
+            digits = np.abs(self.values)
+            texts = np.where(self.values < 0, "-", "")
+            texts = np.char.add(texts, (digits // 10 ** self.scale).astype(str))
+            if self.scale:
+                fraction = np.char.zfill((digits % 10 ** self.scale).astype(str), self.scale)
+                texts = np.char.add(np.char.add(texts, "."), fraction)
+        elif kind == "datetime":
+            whole_seconds = not (self.values % 1000000).any()
+            texts = np.datetime_as_string(self.values.view("datetime64[us]"), "s" if whole_seconds else "us")
+        elif kind == "date":
+            texts = np.datetime_as_string(self.values.view("datetime64[D]"))
+        else:
+            texts = np.char.lower(np.array([str(value) for value in self.to_list()]))
+        return (np.char.find(texts, needle) >= 0) & ~self.null_mask()
+
+    def fixed_width(self, rows):
+        # The given rows of a str or bytes column as a fixed width byte array, copied out of the buffer without
+        # building Python objects
+        offsets = self.values[rows]
+        lengths = self.values[rows + 1] - offsets
+        width = max(1, int(lengths.max(initial=0)))
+        data = np.frombuffer(self.buffer, np.uint8)
+        keys = np.zeros((len(rows), width), np.uint8)
+        shifts = np.repeat(offsets - (np.cumsum(lengths) - lengths), lengths)
+        keys[np.arange(width) < lengths[:, None]] = data[shifts + np.arange(len(shifts))]
+        return keys.view(f"S{width}").ravel()
+
+def decimal_values(values, present):
+    # Returns the scale and the values as integers scaled by 10 ** scale. A DECIMAL column has one scale, so the
+    # first value's is tried and checked with a sum, int() truncates so any value with more digits makes the scaled
+    # sum of absolute values come up short
+    scale = max(0, -present[0].as_tuple().exponent)
+    factor = Decimal(10) ** scale
+    scaled = [0 if value is None else int(value * factor) for value in values]
+    with localcontext() as context:
+        context.prec = 100
+        if sum(map(abs, present)) * factor == sum(map(abs, scaled)):
+            return scale, scaled
+    scale = max(0, -min(value.as_tuple().exponent for value in present))
+    return scale, [0 if value is None else int(value.scaleb(scale)) for value in values]
+
+def time_values(values, unit):
+    # pandas converts date and time objects in C, far faster than numpy does. numpy covers the years pandas
+    # can't hold (before 1677 or after 2262)
+    try:
+        index = pd.TimedeltaIndex(values) if unit.startswith("timedelta") else pd.DatetimeIndex(values)
+        return np.asarray(index).astype(unit).view(np.int64)
+    except (ValueError, OverflowError, TypeError):
+        return np.array(values, unit).view(np.int64)
+
+def string_offsets(encoded):
+    offsets = np.zeros(len(encoded) + 1, np.int64)
+    np.cumsum(np.fromiter(map(len, encoded), np.int64, len(encoded)), out=offsets[1:])
+    return offsets
+
+class ColumnChunk:
+    # A batch of rows stored column by column. The arrays are never changed in place, replaced rows are kept as
+    # tuples in patches until the chunk is rebuilt
+    def __init__(self, columns, length, patches=None):
+        self.columns = columns
+        self.length = length
+        self.patches = patches if patches is not None else {}  # Row in chunk -> row tuple
+
+    @classmethod
+    def from_rows(cls, rows):
+        width = len(rows[0]) if rows else 0
+        return cls([Column.from_values([row[i] for row in rows]) for i in range(width)], len(rows))
+
+    def row(self, index):
+        patched = self.patches.get(index)
+        if patched is not None:
+            return patched
+        return tuple(column.value(index) for column in self.columns)
+
+    def cell(self, index, column):
+        patched = self.patches.get(index)
+        if patched is not None:
+            return patched[column]
+        return self.columns[column].value(index)
+
+    def rows(self, start=0, stop=None):
+        stop = self.length if stop is None else stop
+        rows = list(zip(*[column.to_list(start, stop) for column in self.columns]))
+        for index, row in self.patches.items():
+            if start <= index < stop:
+                rows[index - start] = row
+        return rows
+
+    def compacted(self):
+        # The same rows with the patches folded into the arrays
+        return ColumnChunk.from_rows(self.rows()) if self.patches else self
+
+    def copy(self):
+        return ColumnChunk(self.columns, self.length, dict(self.patches))
+
+    @property
+    def nbytes(self):
+        return sum(column.nbytes for column in self.columns) + estimate_size(list(self.patches.values()))
+
+class ColumnarRows:
+    # Result rows held as a list of column chunks, usually one per fetch. It behaves like the list of row tuples
+    # it replaces (len, indexing, slicing, iteration, append, replace and delete), rows are only built as tuples
+    # when asked for, so a result costs a few bytes per value instead of a Python object per value
+    def __init__(self, rows=None, chunk_rows=None):
+        self.chunk_rows = chunk_rows or columnar_chunk_rows
+        self.chunks = []
+        self.starts = []  # Index of the first row of each chunk
+        self.length = 0
+        if rows:
+            self.extend(rows)
+
+    @classmethod
+    def from_cursor(cls, cursor, chunk_rows=None, first_rows=None):
+        # Fetches a result a chunk at a time, so it is never held as tuples all at once. first_rows is called with
+        # the tuples of the first fetch before anything is converted, so they can be shown while the rest loads
+        result = cls(chunk_rows=chunk_rows)
+        while True:
+            rows = cursor.fetchmany(result.chunk_rows)
+            if not rows:
+                return result
+            if first_rows is not None:
+                first_rows(rows)
+                first_rows = None
+            result.append_chunk(ColumnChunk.from_rows(rows))
+
+    def append_chunk(self, chunk):
+        if chunk.length:
+            self.chunks.append(chunk)
+            self.starts.append(self.length)
+            self.length += chunk.length
+
+    def extend(self, rows):
+        if isinstance(rows, ColumnarRows):
+            for chunk in rows.chunks:
+                self.append_chunk(chunk.copy())
+            return
+        rows = list(rows)
+        for start in range(0, len(rows), self.chunk_rows):
+            self.append_chunk(ColumnChunk.from_rows(rows[start:start + self.chunk_rows]))
+
+    def append(self, row):
+        self.extend([row])
+
+    def locate(self, index):
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError("row index out of range")
+        chunk_index = bisect.bisect_right(self.starts, index) - 1
+        return self.chunks[chunk_index], index - self.starts[chunk_index]
+
+    def __len__(self):
+        return self.length
+
+    def __bool__(self):
+        return self.length > 0
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self.length)
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+            return self.rows(start, stop)
+        chunk, offset = self.locate(index)
+        return chunk.row(offset)
+
+    def __setitem__(self, index, row):
+        chunk, offset = self.locate(index)
+        chunk.patches[offset] = tuple(row)
+
+    def __delitem__(self, index):
+        self.delete_rows([index])
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            for start in range(0, chunk.length, 1000):
+                yield from chunk.rows(start, min(start + 1000, chunk.length))
+
+    def cell(self, index, column):
+        chunk, offset = self.locate(index)
+        return chunk.cell(offset, column)
+
+    def rows(self, start=0, stop=None):
+        stop = self.length if stop is None else min(stop, self.length)
+        rows = []
+        for chunk, chunk_start in zip(self.chunks, self.starts):
+            if chunk_start >= stop:
+                break
+            if chunk_start + chunk.length > start:
+                rows.extend(chunk.rows(max(start - chunk_start, 0), min(stop - chunk_start, chunk.length)))
+        return rows
+
+    def delete_rows(self, indexes):
+        # Only the chunks that lose rows are rebuilt
+        by_chunk = {}
+        for index in indexes:
+            chunk, offset = self.locate(index)
+            by_chunk.setdefault(id(chunk), set()).add(offset)
+        chunks = self.chunks
+        self.chunks, self.starts, self.length = [], [], 0
+        for chunk in chunks:
+            removed = by_chunk.get(id(chunk))
+            if removed:
+                chunk = ColumnChunk.from_rows([row for offset, row in enumerate(chunk.rows())
+                                               if offset not in removed])
+            self.append_chunk(chunk)
+
+    def column(self, index, start=0):
+        # The column from row start on as one Column, for vectorized work over every row
+        columns = []
+        for chunk, chunk_start in zip(self.chunks, self.starts):
+            if chunk_start + chunk.length <= start:
+                continue
+            if chunk_start < start:
+                chunk = ColumnChunk.from_rows(chunk.rows(start - chunk_start))
+            columns.append(chunk.compacted().columns[index])
+        return Column.concat(columns)
+
+    def find_rows(self, key_indexes, keys):
+        # Indexes of rows whose key columns match one of the keys
+        if len(key_indexes) == 1 and self.chunks:
+            column = self.column(key_indexes[0])
+            wanted = [key[0] for key in keys]
+            if column.kind == "int" and all(type(value) is int for value in wanted):
+                matches = np.isin(column.values, np.array(wanted, np.int64)) & ~column.null_mask()
+                return np.flatnonzero(matches).tolist()
+        wanted = set(keys)
+        return [row_index for row_index, row in enumerate(self) if tuple(row[i] for i in key_indexes) in wanted]
+
+    def copy(self):
+        rows = ColumnarRows(chunk_rows=self.chunk_rows)
+        rows.extend(self)
+        return rows
+
+    @property
+    def nbytes(self):
+        return sum(chunk.nbytes for chunk in self.chunks)
+
+class TablePager:
+    def __init__(self, pool, tablename, primary_keys, page_size=default_page_size, cache=None, tiebreakers=()):
+        self.pool = pool
+        self.tablename = tablename
+        self.primary_keys = list(primary_keys)
+        self.tiebreakers = list(tiebreakers)  # Follow the sort column when there's no primary key to seek on
+        self.page_size = page_size
+        self.cache = cache
+        self.headers = []
+        # Sort and filters pushed into the query, by column name
+        self.order = None  # (column, descending)
+        self.filters = []  # (column, operation, text) with the filter bar's operations
+        self.search = ""
+        self.search_columns = []
+        self.reset()
+
+    def reset(self):
+        self.last_key = None  # Primary key of the last row handed out, led by its sort value when sorted
+        self.offset = 0
+        self.exhausted = False
+        self.cached_at = None  # Set when the first page came from the result cache
+
+    def copy(self):
+        # A pager for the same table starting from the first page, a page still being fetched can't touch it
+        return TablePager(self.pool, self.tablename, self.primary_keys, self.page_size, self.cache, self.tiebreakers)
+
+    @property
+    def conditioned(self):
+        return self.order is not None or bool(self.filters) or bool(self.search)
+
+    def filter_conditions(self):
+        conditions = []
+        params = []
+        for column, operation, text in self.filters:
+            name = quote_identifier(column)
+            if operation in ("is null", "is not null"):
+                conditions.append(f"{name} {operation.upper()}")
+            elif operation == "contains":
+                conditions.append(f"{name} LIKE %s")
+                params.append(like_pattern(text))
+            else:
+                conditions.append(f"{name} {operation} %s")
+                params.append(text)
+        if self.search and self.search_columns:
+            conditions.append("(" + " OR ".join(f"{quote_identifier(column)} LIKE %s"
+                                                for column in self.search_columns) + ")")
+            params += [like_pattern(self.search)] * len(self.search_columns)
+        return conditions, params
+
+    def seek_condition(self):
+        # Rows after last_key in (sort column, primary key) order. MySQL sorts NULLs first ascending and last
+        # descending, and NULL never compares, so a NULL sort value gets conditions of its own
+        key_list = ", ".join(quote_identifier(key) for key in self.primary_keys)
+        after_key = f"({key_list}) > ({', '.join(['%s'] * len(self.primary_keys))})"
+        if self.order is None:
+            return after_key, list(self.last_key)
+        column, descending = quote_identifier(self.order[0]), self.order[1]
+        value, key = self.last_key[0], list(self.last_key[1:])
+        if value is None:
+            if descending:
+                return f"({column} IS NULL AND {after_key})", key
+            return f"({column} IS NULL AND {after_key} OR {column} IS NOT NULL)", key
+        condition = f"{column} {'<' if descending else '>'} %s OR {column} = %s AND {after_key}"
+        if descending:
+            condition += f" OR {column} IS NULL"
+        return f"({condition})", [value, value] + key
+
+    def build_query(self):
+        table = quote_identifier(self.tablename)
+        conditions, params = self.filter_conditions()
+        order = []
+        if self.order is not None:
+            order.append(f"{quote_identifier(self.order[0])}{' DESC' if self.order[1] else ''}")
+        if self.primary_keys:
+            # Keyset pagination, every page is an index range scan no matter how deep we are. A sort column leads
+            # the key, the primary key keeps the order stable between equal values
+            key_list = ", ".join(quote_identifier(key) for key in self.primary_keys)
+            if self.last_key is not None:
+                condition, seek_params = self.seek_condition()
+                conditions.append(condition)
+                params += seek_params
+            where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+            sort_column = self.order[0] if self.order is not None else None
+            order_by = ", ".join(order + [quote_identifier(key) for key in self.primary_keys if key != sort_column])
+            return f"SELECT * FROM {table}{where} ORDER BY {order_by} LIMIT %s", params + [self.page_size]
+        # Without a primary key there is nothing stable to seek on, fall back to offsets. Rows with equal sort values
+        # could come back in a different order for each page, so the tiebreakers settle it and no row is skipped or
+        # shown twice
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        order_by = ""
+        if order:
+            order_by = " ORDER BY " + ", ".join(order + [quote_identifier(column) for column in self.tiebreakers
+                                                         if column != self.order[0]])
+        return f"SELECT * FROM {table}{where}{order_by} LIMIT %s OFFSET %s", params + [self.page_size, self.offset]
+
+    def fetch_page(self):
+        if self.exhausted:
+            return []
+        query, params = self.build_query()
+        with self.pool.connection() as connection:
+            cached, ticket = (None, None) if self.cache is None else self.cache.lookup(query, params, connection)
+            if cached is not None:
+                rows = cached.rows
+                self.headers = cached.headers
+                if self.offset == 0:
+                    self.cached_at = cached.cached_at
+            else:
+                cursor = connection.cursor()
+                cursor.execute(query, params)
+                rows = ColumnarRows(cursor.fetchall())  # Converted here, on the worker thread
+                self.headers = [desc[0] for desc in cursor.description]
+                cursor.close()
+                if ticket is not None:
+                    self.cache.store(ticket, QueryResult(query, self.headers, rows, len(rows)), connection)
+
+        if rows and self.primary_keys:
+            key_indexes = [self.headers.index(key) for key in self.primary_keys]
+            if self.order is not None:
+                key_indexes.insert(0, self.headers.index(self.order[0]))
+            self.last_key = tuple(rows[-1][i] for i in key_indexes)
+        self.offset += len(rows)
+        self.exhausted = len(rows) < self.page_size
+        return rows
+
+class QueryResult:
+    def __init__(self, statement, headers=None, rows=None, rowcount=-1, lastrowid=None, elapsed=0.0, cached_at=None):
+        self.statement = statement
+        self.headers = headers or []
+        self.rows = rows if rows is not None else []
+        self.rowcount = rowcount
+        self.lastrowid = lastrowid
+        self.elapsed = elapsed
+        self.cached_at = cached_at  # Wall clock time the result was read from the server when served from cache
+
+class QueryTaskSignals(QObject):
+    finished = pyqtSignal(int, object)
+    failed = pyqtSignal(int, str)
+    first_rows = pyqtSignal(int, object)  # QueryResult with the rows of the first fetch, before the rest is read
+
+class QueryTask(QRunnable):
+    def __init__(self, task_id, pool, statement, params=None, commit=True, work=None, timeout=0, cache=None,
+                 stop=None):
+        super().__init__()
+        self.task_id = task_id
+        self.pool = pool
+        self.cache = cache  # ResultCache consulted before the statement is sent
+        self.statement = statement
+        self.params = params
+        self.commit = commit
+        self.work = work  # Optional callable run instead of the statement
+        self.stop = stop  # Optional callable that makes the work give up between its statements
+        self.timeout = timeout
+        self.report_first_rows = False  # Emit first_rows for a result, set when someone shows them early
+        self.signals = QueryTaskSignals()
+        self.setAutoDelete(False)  # The executor keeps the task until it reports back
+
+        # Server side ids of the connections the task has borrowed, guarded so a KILL never
+        # reaches a connection that has already gone back to the pool
+        self.connection_ids = set()
+        self.connection_lock = threading.Lock()
+        self.cancel_reason = None
+        self.started = None  # When a worker thread picked the task up, queued time doesn't count
+        self.statement_started = None  # When the statement the task is waiting on was sent
+        self.action = call_recorder.current_action()  # UI action the task's database calls count towards
+
+    def run(self):
+        # Runs on a worker thread, results go back to the GUI thread through queued signals
+        self.started = time.monotonic()
+        task_context.task = self
+        try:
+            with call_recorder.resume(self.action):
+                if self.work is not None:
+                    result = self.work()
+                else:
+                    result = self.execute()
+            if isinstance(result, QueryResult):
+                result.elapsed = time.monotonic() - self.started
+            self.signals.finished.emit(self.task_id, result)
+        except Exception as err:
+            self.signals.failed.emit(self.task_id, str(err))
+        finally:
+            task_context.task = None
+
+    def execute(self):
+        with self.pool.connection() as connection:
+            ticket = None
+            if self.cache is not None:
+                cached, ticket = self.cache.lookup(self.statement, self.params, connection)
+                if cached is not None:
+                    return cached
+            cursor = connection.cursor()
+            limited = self.apply_server_timeout(cursor)
+            try:
+                cursor.execute(self.statement, self.params)
+                headers = []
+                rows = []
+                if cursor.description:
+                    headers = [column[0] for column in cursor.description]
+                    first_rows = None
+                    if self.report_first_rows:
+                        first_rows = lambda rows: self.signals.first_rows.emit(
+                            self.task_id, QueryResult(self.statement, headers, rows))
+                    rows = ColumnarRows.from_cursor(cursor, first_rows=first_rows)
+                result = QueryResult(self.statement, headers, rows, cursor.rowcount, cursor.lastrowid)
+                if self.commit:
+                    self.pool.commit(connection, self.statement)
+                if ticket is not None:
+                    self.cache.store(ticket, result, connection)
+            finally:
+                if limited:
+                    self.clear_server_timeout(connection)
+            cursor.close()
+        return result
+
+    def apply_server_timeout(self, cursor):
+        # The server enforces the limit itself for SELECTs, everything else relies on the watchdog
+        if not self.timeout or statement_keyword(self.statement) != "SELECT":
+            return False
+        try:
+            cursor.execute_unmarked("SET SESSION max_execution_time = %s", (int(self.timeout * 1000),))
+            return True
+        except mysql.connector.Error:
+            return False  # Older servers don't have max_execution_time
+
+    def clear_server_timeout(self, connection):
+        try:
+            if connection.unread_result:
+                connection.consume_results()
+            cursor = connection.cursor()
+            cursor.execute_unmarked("SET SESSION max_execution_time = 0")
+            cursor.close()
+        except mysql.connector.Error:
+            connection.session_changed = True  # Still limited, the pool resets it on release
+
+    def track(self, connection):
+        with self.connection_lock:
+            self.connection_ids.add(connection.connection_id)
+
+    def untrack(self, connection):
+        with self.connection_lock:
+            self.connection_ids.discard(connection.connection_id)
+
+    def kill(self, reason):
+        # Runs on a side thread with its own connection, the pooled ones are busy running the statements
+        self.cancel_reason = reason
+        if self.stop is not None:
+            self.stop()
+        with self.connection_lock:
+            if not self.connection_ids:
+                return
+            try:
+                side_connection = self.pool.create_connection()
+                try:
+                    cursor = side_connection.cursor()
+                    for connection_id in self.connection_ids:
+                        cursor.execute(f"KILL QUERY {int(connection_id)}")
+                    cursor.close()
+                finally:
+                    side_connection.close()
+            except mysql.connector.Error as err:
+                print(f"Error cancelling query: {err}")
+
+class QueryExecutor(QObject):
+    started = pyqtSignal(int, str)
+    progress = pyqtSignal(int, float)  # Task id and seconds elapsed, emitted while a task runs
+    finished = pyqtSignal(int, object)
+    failed = pyqtSignal(int, str, float)
+
+    def __init__(self, pool, parent=None):
+        super().__init__(parent)
+        self.pool = pool
+        self.statement_timeout = default_statement_timeout
+        self.session = None  # TransactionSession that statements go through when set
+        self.result_cache = None  # ResultCache for read-only statements when set
+        self.thread_pool = QThreadPool(self)
+        # Leave one pooled connection free for the GUI thread
+        self.thread_pool.setMaxThreadCount(max(1, pool.max_size - 1))
+        self.next_task_id = 1
+        self.running = {}  # Task id -> (task, start time, on_finished, on_failed)
+
+        self.ticker = QTimer(self)
+        self.ticker.setInterval(1000)
+        self.ticker.timeout.connect(self.report_progress)
+
+    def submit(self, statement, params=None, on_finished=None, on_failed=None, commit=True, work=None, owner=None,
+               stop=None, on_first_rows=None):
+        task_id = self.next_task_id
+        self.next_task_id += 1
+
+        # Statements join the open transaction, if there is one
+        source = self.session if self.session is not None else self.pool
+        task = QueryTask(task_id, source, statement, params, commit, work, self.statement_timeout,
+                         self.result_cache if work is None else None, stop)
+        task.signals.finished.connect(self.task_finished)
+        task.signals.failed.connect(self.task_failed)
+        if on_first_rows is not None:
+            task.report_first_rows = True
+            task.signals.first_rows.connect(lambda task_id, result: self.task_first_rows(task_id, result,
+                                                                                        on_first_rows))
+        self.running[task_id] = (task, time.monotonic(), on_finished, on_failed)
+        if owner is not None:
+            # Results for a widget that has since been deleted are dropped
+            owner.destroyed.connect(lambda *_: self.drop_callbacks(task_id))
+
+        self.thread_pool.start(task)
+        self.started.emit(task_id, statement)
+        if not self.ticker.isActive():
+            self.ticker.start()
+        return task_id
+
+    def drop_callbacks(self, task_id):
+        if task_id in self.running:
+            task, started, _, _ = self.running[task_id]
+            self.running[task_id] = (task, started, None, None)
+
+    def elapsed(self, task_id):
+        # Time spent running, a task still waiting for a worker thread hasn't started yet
+        if task_id not in self.running or self.running[task_id][0].started is None:
+            return 0.0
+        return time.monotonic() - self.running[task_id][0].started
+
+    def report_progress(self):
+        for task_id in list(self.running):
+            elapsed = self.elapsed(task_id)
+            self.progress.emit(task_id, elapsed)
+
+            # Client side watchdog on the statement the task is waiting on, so work callables running many
+            # statements get the limit per statement. SELECTs get a second of grace since the server should
+            # stop them first
+            task = self.running[task_id][0]
+            statement_started = task.statement_started
+            if task.timeout and task.cancel_reason is None and statement_started is not None:
+                grace = 1 if task.work is None and statement_keyword(task.statement) == "SELECT" else 0
+                if time.monotonic() - statement_started > task.timeout + grace:
+                    self.cancel(task_id, f"Timed out after {task.timeout} s")
+        if not self.running:
+            self.ticker.stop()
+
+    def cancel(self, task_id, reason="Cancelled"):
+        if task_id not in self.running:
+            return
+        task = self.running[task_id][0]
+        if self.thread_pool.tryTake(task):
+            # Still queued, it never reached the server
+            task.cancel_reason = reason
+            self.task_failed(task_id, reason)
+        elif task.cancel_reason is None:
+            threading.Thread(target=task.kill, args=(reason,), daemon=True).start()
+
+    def cancel_all(self):
+        for task_id in list(self.running):
+            self.cancel(task_id)
+
+    def task_first_rows(self, task_id, result, on_first_rows):
+        # Dropped along with the other callbacks once the owner is gone
+        if task_id in self.running and self.running[task_id][2] is not None:
+            on_first_rows(result)
+
+    def task_finished(self, task_id, result):
+        task, started, on_finished, _ = self.running.pop(task_id, (None, 0.0, None, None))
+        self.finished.emit(task_id, result)
+        if on_finished is not None:
+            on_finished(result)
+
+    def task_failed(self, task_id, message):
+        task, started, _, on_failed = self.running.pop(task_id, (None, time.monotonic(), None, None))
+        if task is not None and task.cancel_reason is not None:
+            message = task.cancel_reason
+        if task is not None and task.started is not None:
+            started = task.started
+        self.failed.emit(task_id, message, time.monotonic() - started)
+        if on_failed is not None:
+            on_failed(message)
+
+    def active_count(self):
+        return len(self.running)
+
+transaction_control_pattern = re.compile(r"\s*(BEGIN|START\s+TRANSACTION|COMMIT|ROLLBACK)(\s+WORK)?\s*;?\s*$",
+                                         re.IGNORECASE)
+delimiter_pattern = re.compile(r"[ \t\r\n]*DELIMITER[ \t]+(\S+)[^\n]*(\n|$)", re.IGNORECASE)
+
+def split_statements(script):
+    # Splits a script the way the mysql client does: delimiters inside quotes and comments don't count and
+    # DELIMITER lines switch the delimiter, e.g. around CREATE PROCEDURE bodies
+    statements = []
+    delimiter = ";"
+    start = 0
+    index = 0
+    length = len(script)
+
+    def add(statement):
+        statement = statement.strip()
+        if strip_leading_comments(statement):
+            statements.append(statement)
+
+    while index < length:
+        if (index == start or script[index - 1] == "\n") and not strip_leading_comments(script[start:index]):
+            match = delimiter_pattern.match(script, index)
+            if match:
+                delimiter = match.group(1)
+                start = index = match.end()
+                continue
+        char = script[index]
+        if char in "'\"`":
+            # Skip to the closing quote, backslash escapes and doubled quotes included
+            index += 1
+            while index < length:
+                if script[index] == "\\" and char != "`":
+                    index += 2
+                elif script[index] == char and script.startswith(char * 2, index):
+                    index += 2
+                elif script[index] == char:
+                    break
+                else:
+                    index += 1
+            index += 1
+        elif script.startswith("/*", index):
+            end = script.find("*/", index + 2)
+            index = length if end == -1 else end + 2
+        elif char == "#" or (script.startswith("--", index) and (index + 2 == length or script[index + 2].isspace())):
+            end = script.find("\n", index)
+            index = length if end == -1 else end + 1
+        elif script.startswith(delimiter, index):
+            add(script[start:index])
+            index += len(delimiter)
+            start = index
+        else:
+            index += 1
+    add(script[start:])
+    return statements
+
+class ScriptRunner(QObject):
+    statement_done = pyqtSignal(int, object)  # Statement index and its (statement, rows, elapsed, error)
+
+    def __init__(self, pool, statements, stop_on_error=True):
+        super().__init__()
+        self.pool = pool
+        self.statements = statements
+        self.stop_on_error = stop_on_error
+        self.results = []
+        self.stopped = False
+
+    def stop(self):
+        self.stopped = True  # Takes effect between statements
+
+    def run(self):
+        # Runs on a worker thread, the whole script goes over one connection and each statement is committed
+        # as it completes, like it would be when typed into the console
+        with self.pool.connection() as connection:
+            cursor = connection.cursor()
+            for index, statement in enumerate(self.statements):
+                if self.stopped:
+                    break
+                started = time.monotonic()
+                rows = 0
+                error = None
+                try:
+                    cursor.execute(statement)
+                    if cursor.description:
+                        batch = cursor.fetchmany(1000)
+                        while batch:
+                            rows += len(batch)
+                            batch = cursor.fetchmany(1000)
+                    else:
+                        rows = max(cursor.rowcount, 0)
+                    self.pool.commit(connection, statement)
+                except mysql.connector.Error as err:
+                    error = str(err)
+                    if connection.unread_result:
+                        connection.consume_results()
+                result = (statement, rows, time.monotonic() - started, error)
+                self.results.append(result)
+                self.statement_done.emit(index, result)
+                if error is not None and self.stop_on_error:
+                    break
+            cursor.close()
+        return self.results
+
+def as_text(value):
+    # information_schema columns can come back as bytes depending on server and connector version
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode("utf-8")
+    return value
+
+class SchemaCache:
+    def __init__(self, pool):
+        self.pool = pool
+        self.database = pool.config.get("database")
+        self.tables = {}  # Table name -> metadata dict
+        self.schema_loaded = False  # Set once every table has been loaded in one batch
+        self.triggered = None  # Names of tables with triggers, loaded when first asked for
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.round_trips = 0
+
+    def table(self, tablename):
+        entry = self.tables.get(tablename)
+        if entry is None:
+            self.misses += 1
+            # The first miss pulls in the whole schema, later misses only reload the invalidated table
+            self.load([tablename] if self.schema_loaded else None)
+            entry = self.tables.get(tablename)
+            if entry is None:
+                raise mysql.connector.errors.ProgrammingError(
+                    msg=f"Table '{self.database}.{tablename}' doesn't exist", errno=1146)
+        else:
+            self.hits += 1
+        return entry
+
+    def load(self, tablenames=None):
+        # A handful of set based information_schema queries, however many tables there are
+        condition = "TABLE_SCHEMA = %s"
+        params = [self.database]
+        if tablenames is not None:
+            condition += " AND TABLE_NAME IN (" + ", ".join(["%s"] * len(tablenames)) + ")"
+            params += list(tablenames)
+
+        with self.pool.connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute(f"SELECT TABLE_NAME, TABLE_TYPE, ENGINE, TABLE_ROWS FROM information_schema.TABLES "
+                           f"WHERE {condition}", params)
+            table_rows = cursor.fetchall()
+            cursor.execute(f"SELECT TABLE_NAME, COLUMN_NAME, COLUMN_TYPE, IS_NULLABLE, COLUMN_KEY, COLUMN_DEFAULT, "
+                           f"EXTRA FROM information_schema.COLUMNS WHERE {condition} "
+                           f"ORDER BY TABLE_NAME, ORDINAL_POSITION", params)
+            column_rows = cursor.fetchall()
+            cursor.execute(f"SELECT TABLE_NAME, CONSTRAINT_NAME, COLUMN_NAME, REFERENCED_TABLE_NAME, "
+                           f"REFERENCED_COLUMN_NAME FROM information_schema.KEY_COLUMN_USAGE WHERE {condition} "
+                           f"ORDER BY TABLE_NAME, CONSTRAINT_NAME, ORDINAL_POSITION", params)
+            key_rows = cursor.fetchall()
+            cursor.execute(f"SELECT TABLE_NAME, INDEX_NAME, NON_UNIQUE, COLUMN_NAME FROM information_schema.STATISTICS "
+                           f"WHERE {condition} ORDER BY TABLE_NAME, INDEX_NAME, SEQ_IN_INDEX", params)
+            index_rows = cursor.fetchall()
+            cursor.close()
+        self.round_trips += 4
+
+        loaded = {}
+        for tablename, table_type, engine, row_estimate in table_rows:
+            loaded[as_text(tablename)] = {
+                "table_type": as_text(table_type),
+                "engine": as_text(engine),
+                "row_estimate": row_estimate,
+                "columns": [],
+                "primary_keys": [],
+                "foreign_keys": [],
+                "foreign_key_details": [],
+                "indexes": {},
+            }
+
+        for tablename, column_name, column_type, nullable, column_key, default, extra in column_rows:
+            entry = loaded.get(as_text(tablename))
+            if entry is not None:
+                # Same shape as a SHOW COLUMNS row
+                entry["columns"].append({"Field": as_text(column_name), "Type": as_text(column_type),
+                                         "Null": as_text(nullable), "Key": as_text(column_key),
+                                         "Default": as_text(default), "Extra": as_text(extra)})
+
+        for tablename, constraint, column_name, referenced_table, referenced_column in key_rows:
+            entry = loaded.get(as_text(tablename))
+            if entry is None:
+                continue
+            if as_text(constraint) == "PRIMARY":
+                entry["primary_keys"].append(as_text(column_name))
+            elif referenced_table is not None:
+                entry["foreign_keys"].append(as_text(column_name))
+                entry["foreign_key_details"].append({"constraint": as_text(constraint),
+                                                     "column": as_text(column_name),
+                                                     "referenced_table": as_text(referenced_table),
+                                                     "referenced_column": as_text(referenced_column)})
+
+        for tablename, index_name, non_unique, column_name in index_rows:
+            entry = loaded.get(as_text(tablename))
+            if entry is not None:
+                index = entry["indexes"].setdefault(as_text(index_name), {"unique": not int(non_unique), "columns": []})
+                index["columns"].append(as_text(column_name))
+
+        for entry in loaded.values():
+            for column in entry["columns"]:
+                column_name = column["Field"]
+                column["auto_increment"] = column_name in entry["primary_keys"] and "auto_increment" in column["Extra"]
+                column["key_type"] = "P" if column_name in entry["primary_keys"] else "F" if column["Key"] == "MUL" else ""
+
+        if tablenames is None:
+            self.tables = loaded
+            self.schema_loaded = True
+        else:
+            self.tables.update(loaded)
+
+    def columns(self, tablename):
+        return self.table(tablename)["columns"]
+
+    def primary_keys(self, tablename):
+        return self.table(tablename)["primary_keys"]
+
+    def foreign_keys(self, tablename):
+        return self.table(tablename)["foreign_keys"]
+
+    def indexes(self, tablename):
+        return self.table(tablename)["indexes"]
+
+    def tiebreak_columns(self, tablename):
+        # Columns that put every row of a table in one order: the shortest unique index over NOT NULL columns,
+        # or all the columns when there isn't one
+        entry = self.table(tablename)
+        not_null = {column["Field"] for column in entry["columns"] if column["Null"] == "NO"}
+        unique = [index["columns"] for index in entry["indexes"].values()
+                  if index["unique"] and set(index["columns"]) <= not_null]
+        if unique:
+            return list(min(unique, key=len))
+        return [column["Field"] for column in entry["columns"]]
+
+    def is_base_table(self, tablename):
+        # False for views and for names that aren't tables at all, e.g. a common table expression
+        try:
+            return self.table(tablename)["table_type"] == "BASE TABLE"
+        except mysql.connector.Error:
+            return False
+
+    def referencing_tables(self, tablenames):
+        # Tables with foreign keys to any of these tables, followed through their own children
+        if not self.schema_loaded:
+            self.load()
+        found = set()
+        pending = set(tablenames)
+        while pending:
+            children = {tablename for tablename, entry in list(self.tables.items())
+                        if any(key["referenced_table"] in pending for key in entry["foreign_key_details"])}
+            pending = children - found - set(tablenames)
+            found |= children
+        return found
+
+    def triggered_tables(self):
+        triggered = self.triggered
+        if triggered is None:
+            with self.pool.connection() as connection:
+                cursor = connection.cursor()
+                cursor.execute("SELECT DISTINCT EVENT_OBJECT_TABLE FROM information_schema.TRIGGERS "
+                               "WHERE EVENT_OBJECT_SCHEMA = %s", (self.database,))
+                triggered = self.triggered = {as_text(row[0]) for row in cursor.fetchall()}
+                cursor.close()
+            self.round_trips += 1
+        return triggered
+
+    def describe(self, tablename):
+        # Readable summary for the table info window
+        entry = self.table(tablename)
+        lines = [f"{tablename} ({entry['table_type']}, {entry['engine'] or 'no engine'}, "
+                 f"~{entry['row_estimate'] or 0} rows)", "", "Columns:"]
+        for column in entry["columns"]:
+            details = column["Type"]
+            if column["Null"] == "NO":
+                details += " NOT NULL"
+            if column["Default"] is not None:
+                details += f" DEFAULT {column['Default']}"
+            if column["Extra"]:
+                details += f" {column['Extra']}"
+            lines.append(f"  {column['Field']} {details}")
+        if entry["primary_keys"]:
+            lines += ["", "Primary key: " + ", ".join(entry["primary_keys"])]
+        if entry["foreign_key_details"]:
+            lines += ["", "Foreign keys:"]
+            for key in entry["foreign_key_details"]:
+                lines.append(f"  {key['constraint']}: {key['column']} -> "
+                             f"{key['referenced_table']}.{key['referenced_column']}")
+        if entry["indexes"]:
+            lines += ["", "Indexes:"]
+            for index_name, index in entry["indexes"].items():
+                unique = "unique " if index["unique"] else ""
+                lines.append(f"  {index_name}: {unique}({', '.join(index['columns'])})")
+        return "\n".join(lines)
+
+    def invalidate(self, tablename=None):
+        if tablename is None:
+            self.invalidations += len(self.tables)
+            self.tables.clear()
+            self.schema_loaded = False
+            self.triggered = None
+        elif self.tables.pop(tablename, None) is not None:
+            self.invalidations += 1
+
+    def invalidate_statement(self, statement):
+        # Drops whatever a DDL statement may have changed, returns the tables it touched
+        if re.match(r"\w+\s+(?:DEFINER\s*=\s*\S+\s+)?TRIGGER\b", strip_leading_comments(statement), re.IGNORECASE):
+            self.triggered = None
+        tables = ddl_tables(statement, self.database)
+        if tables is None:
+            self.invalidate()
+        else:
+            for tablename in tables:
+                self.invalidate(tablename)
+        return tables
+
+    def stats_text(self):
+        lookups = self.hits + self.misses
+        hit_rate = self.hits / lookups if lookups else 0.0
+        return (f"Cached tables: {len(self.tables)}\n"
+                f"Hits: {self.hits}\n"
+                f"Misses: {self.misses}\n"
+                f"Hit rate: {hit_rate:.0%}\n"
+                f"Invalidations: {self.invalidations}\n"
+                f"information_schema round trips: {self.round_trips}")
+
+def dml_tables(statement, database=None):
+    # Tables whose rows a DML statement changes, None when it can't be worked out
+    keyword = statement_keyword(statement)
+    text = " ".join(statement_body(statement).split())
+    names = []
+    if keyword in ("INSERT", "REPLACE"):
+        match = re.search(r"^\w+\s+(?:(?:LOW_PRIORITY|DELAYED|HIGH_PRIORITY|IGNORE)\s+)*(?:INTO\s+)?"
+                          + table_name_pattern, text, re.IGNORECASE)
+        if match:
+            names.append(match.group(1))
+    elif keyword == "UPDATE":
+        match = re.search(r"^UPDATE\s+(?:(?:LOW_PRIORITY|IGNORE)\s+)*(.*?)\s+SET\s", text, re.IGNORECASE)
+        if match:
+            names += re.findall(r"(?:^|,|\bJOIN)\s*" + table_name_pattern, match.group(1), re.IGNORECASE)
+    elif keyword == "DELETE":
+        # Multi table deletes can name tables before FROM, so take every table mentioned
+        names += re.findall(r"\b(?:FROM|JOIN|USING)\s+" + table_name_pattern, text, re.IGNORECASE)
+    elif keyword == "LOAD":
+        match = re.search(r"\bINTO\s+TABLE\s+" + table_name_pattern, text, re.IGNORECASE)
+        if match:
+            names.append(match.group(1))
+    if not names:
+        return None
+
+    tables = set()
+    for name in names:
+        table = normalize_table_name(name, database)
+        if table:
+            tables.add(table)
+    return tables
+
+def select_affected_keys(cursor, tablename, primary_keys, condition):
+    # Primary keys of the rows a WHERE condition matches, so only those rows need refreshing afterwards
+    if not primary_keys:
+        return None
+    key_list = ", ".join(quote_identifier(key) for key in primary_keys)
+    cursor.execute(f"SELECT {key_list} FROM {quote_identifier(tablename)} WHERE {condition} "
+                   f"LIMIT {row_refresh_limit + 1}")
+    keys = [tuple(row) for row in cursor.fetchall()]
+    return keys if len(keys) <= row_refresh_limit else None
+
+def write_updates(source, updates):
+    # Runs (statement, parameter rows) pairs through a pool or session as one transaction, returns the number of
+    # rows changed. Inside a transaction the user opened, a savepoint makes the batch all or nothing without
+    # ending that transaction
+    changed = 0
+    with source.connection() as connection:
+        savepoint = connection.in_transaction
+        cursor = connection.cursor()
+        try:
+            if savepoint:
+                cursor.execute("SAVEPOINT row_edits")
+            for statement, rows in updates:
+                cursor.executemany(statement, rows)
+                changed += max(cursor.rowcount, 0)
+        except mysql.connector.Error:
+            if savepoint:
+                cursor.execute("ROLLBACK TO SAVEPOINT row_edits")
+            else:
+                connection.rollback()
+            raise
+        finally:
+            cursor.close()
+        source.commit(connection, updates[0][0])
+    return changed
+
+integer_pattern = r"[+-]?\d+"
+decimal_pattern = r"[+-]?(\d+\.?\d*|\.\d+)"
+datetime_pattern = r"\d{4}-\d{1,2}-\d{1,2}([ T]\d{1,2}:\d{2}(:\d{2}(\.\d+)?)?)?"
+# Numbers written with a leading zero (after any minus sign) or a plus sign are codes (ZIP codes, phone numbers,
+# IDs) and stay text, a numeric column would drop the zeros and the sign
+code_pattern = r"\+|-?0\d"
+
+
+def read_sample(file_path, sample_rows=inference_sample_rows, sample_cells=inference_sample_cells):
+    # Returns the first rows of the file as strings, empty cells are NaN
+    if file_path.endswith(".csv"):
+        headers = pd.read_csv(file_path, nrows=0, encoding="utf-8-sig").columns
+        nrows = max(1, min(sample_rows, sample_cells // max(1, len(headers))))
+        return pd.read_csv(file_path, nrows=nrows, dtype=str, keep_default_na=False, na_values=[""],
+                           encoding="utf-8-sig")
+
+    import openpyxl
+    workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        headers = [str(header) for header in next(rows)]
+        nrows = max(1, min(sample_rows, sample_cells // max(1, len(headers))))
+        sample = []
+        for row in rows:
+            if len(sample) >= nrows:
+                break
+            # Excel cells arrive typed, render them the way they would appear in a CSV export
+            sample.append([None if value is None or value == "" else
+                           value.isoformat(" ") if hasattr(value, "isoformat") else str(value)
+                           for value in row[:len(headers)]])
+    finally:
+        workbook.close()
+    return pd.DataFrame(sample, columns=headers, dtype=object)
+
+
+def infer_column_type(values):
+    # Picks the narrowest MySQL type that holds every sampled value, working on whole columns at once
+    values = values.dropna().str.strip()
+    values = values[values != ""]
+    if values.empty:
+        return "VARCHAR(255)"
+
+    numeric = not values.str.match(code_pattern).any()
+    if numeric and values.str.fullmatch(integer_pattern).all():
+        digits = int(values.str.lstrip("+-").str.lstrip("0").str.len().max())
+        if digits > 65:
+            return "DOUBLE"
+        if digits > 18:
+            return f"DECIMAL({digits},0)"
+        numbers = values.astype("int64")
+        if numbers.between(-2 ** 31, 2 ** 31 - 1).all():
+            return "INT"
+        return "BIGINT"
+
+    if numeric and values.str.fullmatch(decimal_pattern).all():
+        parts = values.str.lstrip("+-").str.split(".", n=1, expand=True)
+        scale = int(parts[1].fillna("").str.len().max()) if parts.shape[1] > 1 else 0
+        integer_digits = int(parts[0].str.lstrip("0").str.len().max())
+        if integer_digits + scale <= 65 and scale <= 30:
+            return f"DECIMAL({max(1, integer_digits + scale)},{scale})"
+        return "DOUBLE"
+
+    if numeric:
+        numbers = pd.to_numeric(values, errors="coerce")
+        # Exponent notation and the like. MySQL has no infinity or NaN, so inf, nan and overflowing exponents stay
+        # text rather than failing the load
+        if numbers.notna().all() and np.isfinite(numbers).all():
+            return "DOUBLE"
+
+    if values.str.fullmatch(datetime_pattern).all():
+        parsed = pd.to_datetime(values, errors="coerce", format="ISO8601")
+        if parsed.notna().all():
+            if not values.str.contains(r"\d[ T]\d").any():
+                return "DATE"
+            return "DATETIME"
+
+    length = int(values.str.len().max())
+    if length <= 255:
+        # Leave headroom for longer values past the sample
+        return f"VARCHAR({min(255, max(16, (length * 5 // 4 + 15) // 16 * 16))})"
+    if length <= 16383:
+        return "TEXT"
+    if length <= 4194303:
+        return "MEDIUMTEXT"
+    return "LONGTEXT"
+
+
+def infer_table_columns(sample):
+    # Returns CreateTableWindow rows (key_type, data_type, column_name, not_null) for a sample DataFrame
+    columns = []
+    for name in sample.columns:
+        values = sample[name]
+        columns.append(["", infer_column_type(values), str(name), bool(len(values)) and bool(values.notna().all())])
+
+    # Candidate primary key: an "id" column if there is one, otherwise the first unique, never empty integer column
+    candidates = [index for index, (_, data_type, name, not_null) in enumerate(columns)
+                  if not_null and data_type in ("INT", "BIGINT") and sample.iloc[:, index].is_unique]
+    named = [index for index in candidates if columns[index][2].lower() == "id"]
+    if named or candidates:
+        columns[(named or candidates)[0]][0] = "Primary Key"
+    return [tuple(column) for column in columns]
+
+
+class BulkLoader(QObject):
+    progress = pyqtSignal(int, float)  # Rows committed so far and rows per second
+    fell_back = pyqtSignal(str)  # LOAD DATA failed with this error, the load carries on with batched INSERTs
+    skipped = pyqtSignal(int, str)  # Rows LOAD DATA skipped so far and the server's first warning about them
+
+    def __init__(self, pool, file_path, tablename, batch_rows=bulk_batch_rows, commit_rows=bulk_commit_rows,
+                 resume=False):
+        super().__init__()
+        self.pool = pool
+        self.file_path = file_path
+        self.tablename = tablename
+        self.batch_rows = batch_rows
+        self.commit_rows = commit_rows
+        self.checkpoint_path = file_path + ".progress"
+        self.start_row = BulkLoader.pending_checkpoint(file_path, tablename) if resume else 0
+        self.rows_committed = self.start_row  # Records of the file done with, where a resumed load starts
+        self.rows_skipped = 0  # Records LOAD DATA turned into warnings instead of rows, duplicate keys say
+        self.warnings = []
+        self.stopped = False
+        self.method = None
+        self.fallback_error = None
+
+    @staticmethod
+    def file_signature(file_path):
+        stat = os.stat(file_path)
+        return {"size": stat.st_size, "mtime": stat.st_mtime}
+
+    @staticmethod
+    def pending_checkpoint(file_path, tablename):
+        # Rows already committed by an earlier load of this same file into this table
+        try:
+            with open(file_path + ".progress") as checkpoint_file:
+                checkpoint = json.load(checkpoint_file)
+        except (OSError, ValueError):
+            return 0
+        if checkpoint.get("table") != tablename or checkpoint.get("file") != BulkLoader.file_signature(file_path):
+            return 0
+        return checkpoint.get("rows_committed", 0)
+
+    def write_checkpoint(self):
+        with open(self.checkpoint_path, "w") as checkpoint_file:
+            json.dump({"table": self.tablename, "file": BulkLoader.file_signature(self.file_path),
+                       "rows_committed": self.rows_committed}, checkpoint_file)
+
+    def clear_checkpoint(self):
+        if os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+
+    def stop(self):
+        self.stopped = True
+
+    def chunks(self):
+        # Yields (headers, rows) with at most commit_rows rows each, so memory stays bounded
+        if self.file_path.endswith(".csv"):
+            # Records already loaded are parsed and dropped rather than skipped as lines, a quoted field can hold a
+            # line break
+            reader = pd.read_csv(self.file_path, chunksize=self.commit_rows, dtype=str, keep_default_na=False,
+                                 na_values=[""])
+            to_skip = self.start_row
+            for chunk in reader:
+                if to_skip:
+                    skipped = min(to_skip, len(chunk))
+                    chunk = chunk.iloc[skipped:]
+                    to_skip -= skipped
+                    if chunk.empty:
+                        continue
+                chunk = chunk.astype(object).where(chunk.notna(), None)
+                yield list(chunk.columns), list(chunk.itertuples(index=False, name=None))
+        else:
+            import openpyxl
+            workbook = openpyxl.load_workbook(self.file_path, read_only=True, data_only=True)
+            try:
+                rows = workbook.active.iter_rows(values_only=True)
+                headers = [str(header) for header in next(rows)]
+                chunk = []
+                for row_number, row in enumerate(rows):
+                    if row_number < self.start_row:
+                        continue
+                    chunk.append(tuple(None if value == "" else value for value in row[:len(headers)]))
+                    if len(chunk) >= self.commit_rows:
+                        yield headers, chunk
+                        chunk = []
+                if chunk:
+                    yield headers, chunk
+            finally:
+                workbook.close()
+
+    def run(self):
+        # Runs on a worker thread, returns the number of rows in the table from this file
+        if self.file_path.endswith(".csv") and self.server_allows_local_infile():
+            try:
+                return self.load_data_infile()
+            except mysql.connector.Error as err:
+                if self.stopped:
+                    raise  # Cancelled, not a reason to try another way
+                self.fallback_error = str(err)
+                self.fell_back.emit(self.fallback_error)
+                self.start_row = self.rows_committed  # Carry on after the chunks LOAD DATA committed
+        return self.insert_batches()
+
+    def server_allows_local_infile(self):
+        with self.pool.connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute("SHOW GLOBAL VARIABLES LIKE 'local_infile'")
+            row = cursor.fetchone()
+            cursor.close()
+        return row is not None and str(row[1]).upper() in ("ON", "1")
+
+    @staticmethod
+    def raw_records(csv_file):
+        # Yields the text of each CSV record as it is in the file, a quoted field can span several lines
+        lines = []
+
+        def read_lines():
+            for line in csv_file:
+                lines.append(line)
+                yield line
+
+        for _ in csv.reader(read_lines()):
+            yield "".join(lines)
+            lines.clear()
+
+    def load_data_infile(self):
+        # One LOAD DATA per commit_rows records, each committed and checkpointed like a chunk of the batched path.
+        # The chunks are cut from the file's own text so the server parses exactly what is in the file
+        self.method = "LOAD DATA LOCAL INFILE"
+        started = time.monotonic()
+        loaded_here = 0
+        with open(self.file_path, newline="", encoding="utf-8-sig") as csv_file:
+            header_line = csv_file.readline()
+            line_end = "\\r\\n" if header_line.endswith("\r\n") else "\\n"
+            headers = next(csv.reader([header_line]))
+
+            # Empty fields become NULL, the same as the batched path
+            variables = ", ".join(f"@c{i}" for i in range(len(headers)))
+            assignments = ", ".join(f"{quote_identifier(header)} = NULLIF(@c{i}, '')"
+                                    for i, header in enumerate(headers))
+            query = (f"LOAD DATA LOCAL INFILE %s INTO TABLE {quote_identifier(self.tablename)} CHARACTER SET utf8mb4 "
+                     f"FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' ESCAPED BY '' "
+                     f"LINES TERMINATED BY '{line_end}' ({variables}) SET {assignments}")
+
+            records = itertools.islice(BulkLoader.raw_records(csv_file), self.start_row, None)
+            chunk_file, chunk_path = tempfile.mkstemp(suffix=".csv")
+            os.close(chunk_file)
+            connection = connect(**self.pool.config, allow_local_infile=True)
+            task = running_task()
+            if task is not None:
+                task.track(connection)
+            try:
+                cursor = connection.cursor()
+                while not self.stopped:
+                    chunk = list(itertools.islice(records, self.commit_rows))
+                    if not chunk:
+                        break
+                    with open(chunk_path, "w", newline="", encoding="utf-8") as chunk_output:
+                        chunk_output.writelines(chunk)
+                    cursor.execute(query, (chunk_path,))
+                    # LOCAL turns duplicate keys and bad values into warnings, the affected row count says how many
+                    # records actually became rows
+                    loaded = max(cursor.rowcount, 0)
+                    if loaded < len(chunk):
+                        self.record_skipped(cursor, len(chunk) - loaded)
+                    connection.commit()
+
+                    self.rows_committed += len(chunk)
+                    loaded_here += loaded
+                    self.write_checkpoint()
+                    self.progress.emit(self.rows_committed, loaded_here / max(time.monotonic() - started, 1e-6))
+                cursor.close()
+            finally:
+                if task is not None:
+                    task.untrack(connection)
+                connection.close()
+                os.remove(chunk_path)
+        if not self.stopped:
+            self.clear_checkpoint()
+        return self.rows_committed - self.rows_skipped
+
+    def record_skipped(self, cursor, rows):
+        # Keeps the first few of the server's warnings for the skipped rows, they go before the commit clears them
+        self.rows_skipped += rows
+        if len(self.warnings) < bulk_warning_messages:
+            cursor.execute(f"SHOW WARNINGS LIMIT {bulk_warning_messages}")
+            self.warnings += [as_text(row[2]) for row in cursor.fetchall()][:bulk_warning_messages - len(self.warnings)]
+        self.skipped.emit(self.rows_skipped, self.warnings[0] if self.warnings else "")
+
+    def insert_batches(self):
+        self.method = "batched INSERT"
+        started = time.monotonic()
+        loaded_here = 0
+        with self.pool.connection() as connection:
+            cursor = connection.cursor()
+            for headers, rows in self.chunks():
+                if self.stopped:
+                    break
+                columns = ", ".join(quote_identifier(header) for header in headers)
+                placeholders = ", ".join(["%s"] * len(headers))
+                query = f"INSERT INTO {quote_identifier(self.tablename)} ({columns}) VALUES ({placeholders})"
+
+                # One transaction per chunk, the connector turns each executemany into a multi-row INSERT
+                for start in range(0, len(rows), self.batch_rows):
+                    cursor.executemany(query, rows[start:start + self.batch_rows])
+                connection.commit()
+
+                self.rows_committed += len(rows)
+                loaded_here += len(rows)
+                self.write_checkpoint()
+                self.progress.emit(self.rows_committed, loaded_here / max(time.monotonic() - started, 1e-6))
+            cursor.close()
+        if not self.stopped:
+            self.clear_checkpoint()
+        return self.rows_committed - self.rows_skipped
+
+def export_value(value):
+    # Text form of a value for CSV and JSON Lines, binary data that isn't UTF-8 is written as hex
+    if isinstance(value, (bytes, bytearray)):
+        try:
+            return value.decode("utf-8")
+        except UnicodeDecodeError:
+            return value.hex()
+    if value is None or isinstance(value, (str, int, float)):
+        return value
+    return str(value)  # Decimal, date, datetime, timedelta, set
+
+
+def arrow_type(type_code):
+    # Parquet column type for a cursor.description type code, anything unusual is kept as text
+    field_type = mysql.connector.FieldType
+    if type_code in (field_type.TINY, field_type.SHORT, field_type.INT24, field_type.LONG, field_type.LONGLONG,
+                     field_type.YEAR):
+        return pyarrow.int64()
+    if type_code in (field_type.FLOAT, field_type.DOUBLE):
+        return pyarrow.float64()
+    if type_code in (field_type.DATE, field_type.NEWDATE):
+        return pyarrow.date32()
+    if type_code in (field_type.DATETIME, field_type.TIMESTAMP):
+        return pyarrow.timestamp("us")
+    if type_code == field_type.TIME:
+        return pyarrow.duration("us")
+    return pyarrow.string()
+
+def arrow_array(column, arrow_type):
+    # Builds the Parquet column straight from the column's arrays where the types line up
+    mask = column.null_mask() if column.nulls is not None else None
+    kind = column.kind
+    if kind == "int" and pyarrow.types.is_integer(arrow_type) or kind == "float" and arrow_type == pyarrow.float64():
+        return pyarrow.array(column.values, type=arrow_type, mask=mask)
+    if kind == "datetime" and pyarrow.types.is_timestamp(arrow_type):
+        return pyarrow.array(column.values.view("datetime64[us]"), type=arrow_type, mask=mask)
+    if kind == "date" and arrow_type == pyarrow.date32():
+        return pyarrow.array(column.values.astype(np.int32), type=arrow_type, mask=mask)
+    if kind == "timedelta" and pyarrow.types.is_duration(arrow_type):
+        return pyarrow.array(column.values, type=arrow_type, mask=mask)
+    if kind == "str" and arrow_type == pyarrow.string() and len(column.buffer) < 2 ** 31:
+        validity = None if mask is None else pyarrow.py_buffer(np.packbits(~mask, bitorder="little"))
+        return pyarrow.StringArray.from_buffers(column.length, pyarrow.py_buffer(column.values.astype(np.int32)),
+                                                pyarrow.py_buffer(column.buffer), validity)
+    values = column.to_list()
+    if arrow_type == pyarrow.string():
+        values = [None if value is None else str(export_value(value)) for value in values]
+    return pyarrow.array(values, type=arrow_type)
+
+
+class ResultExporter(QObject):
+    progress = pyqtSignal(int, float)  # Rows written so far and rows per second
+
+    formats = {".csv": "CSV", ".jsonl": "JSON Lines", ".parquet": "Parquet"}
+
+    def __init__(self, pool, query, file_path, fetch_rows=export_fetch_rows):
+        super().__init__()
+        self.pool = pool
+        self.query = query
+        self.file_path = file_path
+        self.fetch_rows = fetch_rows
+        self.rows_written = 0
+        self.stopped = False
+
+    def stop(self):
+        self.stopped = True
+
+    def run(self):
+        # Runs on a worker thread, re-runs the query on an unbuffered cursor so only one fetch_rows
+        # batch is ever held in memory, returns the number of rows written
+        extension = os.path.splitext(self.file_path)[1].lower()
+        if extension not in ResultExporter.formats:
+            raise ValueError(f"Unsupported export format '{extension}'")
+        if extension == ".parquet" and pyarrow is None:
+            raise ValueError("Parquet export needs the pyarrow package")
+
+        connection = self.pool.acquire()
+        task = running_task()
+        if task is not None:
+            task.track(connection)  # Cancel and the timeout can stop the query mid fetch
+        try:
+            cursor = connection.cursor(buffered=False)
+            cursor.execute(self.query)
+            if not cursor.description:
+                raise ValueError("The query doesn't return any rows")
+            headers = [column[0] for column in cursor.description]
+            batches = self.batches(cursor)
+            if extension == ".csv":
+                self.write_csv(headers, batches)
+            elif extension == ".jsonl":
+                self.write_jsonl(headers, batches)
+            else:
+                self.write_parquet(headers, [column[1] for column in cursor.description], batches)
+        except Exception:
+            # An unbuffered result that was only partly read can't be handed back to the pool
+            if task is not None:
+                task.untrack(connection)
+            self.pool.discard(connection)
+            raise
+        if task is not None:
+            task.untrack(connection)
+        if self.stopped:
+            self.pool.discard(connection)
+        else:
+            cursor.close()
+            self.pool.release(connection)
+        return self.rows_written
+
+    def batches(self, cursor):
+        # Each fetch becomes a column chunk, the same storage the result grids use
+        started = time.monotonic()
+        while not self.stopped:
+            rows = cursor.fetchmany(self.fetch_rows)
+            if not rows:
+                break
+            yield ColumnChunk.from_rows(rows)
+            self.rows_written += len(rows)
+            elapsed = time.monotonic() - started
+            self.progress.emit(self.rows_written, self.rows_written / elapsed if elapsed else 0.0)
+
+    def write_csv(self, headers, batches):
+        with open(self.file_path, "w", newline="", encoding="utf-8") as export_file:
+            writer = csv.writer(export_file)
+            writer.writerow(headers)
+            for chunk in batches:
+                writer.writerows([export_value(value) for value in row] for row in chunk.rows())
+
+    def write_jsonl(self, headers, batches):
+        with open(self.file_path, "w", encoding="utf-8") as export_file:
+            for chunk in batches:
+                export_file.writelines(json.dumps(dict(zip(headers, map(export_value, row)))) + "\n"
+                                       for row in chunk.rows())
+
+    def write_parquet(self, headers, type_codes, batches):
+        schema = pyarrow.schema([(header, arrow_type(type_code)) for header, type_code in zip(headers, type_codes)])
+        with pyarrow.parquet.ParquetWriter(self.file_path, schema) as writer:
+            for chunk in batches:
+                # Each fetch becomes one row group
+                columns = [arrow_array(column, field.type) for column, field in zip(chunk.columns, schema)]
+                writer.write_batch(pyarrow.RecordBatch.from_arrays(columns, schema=schema))
+
+
+def requalify(sql, old_name, new_name):
+    # Points schema qualified names in a view, trigger or routine definition at the new database
+    sql = sql.replace(quote_identifier(old_name) + ".", quote_identifier(new_name) + ".")
+    return re.sub(rf"(?<![\w$`.]){re.escape(old_name)}\.(?=[\w$`])", quote_identifier(new_name) + ".", sql)
+
+class DatabaseRenamer(QObject):
+    # Moves every table into the new database with one metadata only RENAME TABLE, so nothing is copied.
+    # Triggers, views and routines can't be moved across databases and are recreated from their definitions,
+    # events are moved with ALTER EVENT ... RENAME. Only if the RENAME fails (e.g. missing privileges or a table
+    # the server refuses to move) are tables copied, several at a time
+    progress = pyqtSignal(int, int, str)  # Steps done, total steps and the current step
+
+    def __init__(self, pool, old_name, new_name, copy_workers=rename_copy_workers):
+        super().__init__()
+        self.pool = pool  # Server level, without a default database
+        self.old_name = old_name
+        self.new_name = new_name
+        self.copy_workers = copy_workers
+        self.method = None
+        self.failed = []  # (kind, name, error) of objects that couldn't be carried over
+        self.steps_done = 0
+        self.total_steps = 0
+        self.lock = threading.Lock()
+
+    def step(self, text):
+        with self.lock:
+            self.steps_done += 1
+            done = self.steps_done
+        self.progress.emit(done, self.total_steps, text)
+
+    def run(self):
+        # Runs on a worker thread, returns the number of tables moved
+        old = quote_identifier(self.old_name)
+        new = quote_identifier(self.new_name)
+        with self.pool.connection() as connection:
+            cursor = connection.cursor()
+            tables, views, triggers, routines, events, charset = self.read_schema(cursor)
+            self.total_steps = 4 + len(triggers) + len(views) + len(routines) + len(events)
+
+            create = f"CREATE DATABASE {new}"
+            if charset[0]:
+                create += f" CHARACTER SET {charset[0]} COLLATE {charset[1]}"
+            cursor.execute(create)
+            self.step(f"Created {self.new_name}")
+
+            # A table with triggers can't be renamed into another database, they are recreated afterwards
+            for name, _ in triggers:
+                cursor.execute(f"DROP TRIGGER {old}.{quote_identifier(name)}")
+            self.step(f"Dropped {len(triggers)} triggers from {self.old_name}")
+
+            moved = False
+            if tables:
+                renames = ", ".join(f"{old}.{quote_identifier(table)} TO {new}.{quote_identifier(table)}"
+                                    for table in tables)
+                try:
+                    cursor.execute(f"RENAME TABLE {renames}")
+                    moved = True
+                    self.method = "RENAME TABLE"
+                except mysql.connector.Error as err:
+                    print(f"RENAME TABLE failed, falling back to copying tables: {err}")
+                    self.restore_triggers(cursor, triggers)
+            self.step(f"Moved {len(tables)} tables" if moved or not tables else "RENAME TABLE failed, copying tables")
+            cursor.close()
+
+        if tables and not moved:
+            self.method = "table copy"
+            self.total_steps += len(tables)
+            try:
+                self.copy_tables(tables)
+            except Exception:
+                self.drop_new_database()  # The old database is untouched, start from a clean slate next time
+                raise
+
+        with self.pool.connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute(f"USE {new}")  # Unqualified names in the definitions resolve to the new database
+            for name, sql in triggers:
+                if not self.recreate(cursor, "trigger", name, sql) and moved:
+                    self.undo_move(cursor, tables, triggers)
+            self.recreate_views(cursor, views)
+            for (name, routine_type), sql in routines:
+                if self.recreate(cursor, routine_type.lower(), name, sql):
+                    cursor.execute(f"DROP {routine_type} {old}.{quote_identifier(name)}")
+            for name in events:
+                self.move_event(cursor, name)
+
+            if self.failed:
+                # Views, routines and events are only dropped from the old database once they exist in the new
+                # one, and copied tables keep their triggers there, so the old database still has them all
+                self.step(f"Kept {self.old_name}, {len(self.failed)} objects weren't carried over")
+            else:
+                cursor.execute(f"DROP DATABASE {old}")
+                self.step(f"Dropped {self.old_name}")
+            cursor.close()
+        return len(tables)
+
+    def read_schema(self, cursor):
+        old = quote_identifier(self.old_name)
+        cursor.execute("SELECT DEFAULT_CHARACTER_SET_NAME, DEFAULT_COLLATION_NAME FROM information_schema.SCHEMATA "
+                       "WHERE SCHEMA_NAME = %s", (self.old_name,))
+        row = cursor.fetchone()
+        if row is None:
+            raise mysql.connector.errors.ProgrammingError(msg=f"Unknown database '{self.old_name}'", errno=1049)
+        charset = (as_text(row[0]), as_text(row[1]))
+
+        cursor.execute("SELECT TABLE_NAME, TABLE_TYPE FROM information_schema.TABLES WHERE TABLE_SCHEMA = %s "
+                       "ORDER BY TABLE_NAME", (self.old_name,))
+        table_rows = [(as_text(name), as_text(table_type)) for name, table_type in cursor.fetchall()]
+        tables = [name for name, table_type in table_rows if table_type != "VIEW"]
+
+        views = []
+        for name in [name for name, table_type in table_rows if table_type == "VIEW"]:
+            cursor.execute(f"SHOW CREATE VIEW {old}.{quote_identifier(name)}")
+            views.append((name, as_text(cursor.fetchone()[1])))
+
+        cursor.execute("SELECT TRIGGER_NAME FROM information_schema.TRIGGERS WHERE TRIGGER_SCHEMA = %s "
+                       "ORDER BY EVENT_OBJECT_TABLE, ACTION_TIMING, EVENT_MANIPULATION, ACTION_ORDER",
+                       (self.old_name,))
+        triggers = []
+        for (name,) in cursor.fetchall():
+            cursor.execute(f"SHOW CREATE TRIGGER {old}.{quote_identifier(as_text(name))}")
+            triggers.append((as_text(name), as_text(cursor.fetchone()[2])))
+
+        cursor.execute("SELECT ROUTINE_NAME, ROUTINE_TYPE FROM information_schema.ROUTINES WHERE ROUTINE_SCHEMA = %s",
+                       (self.old_name,))
+        routines = []
+        for name, routine_type in cursor.fetchall():
+            name, routine_type = as_text(name), as_text(routine_type)
+            cursor.execute(f"SHOW CREATE {routine_type} {old}.{quote_identifier(name)}")
+            row = cursor.fetchone()
+            if row[2] is None:
+                raise mysql.connector.errors.ProgrammingError(
+                    msg=f"No permission to read the definition of {routine_type.lower()} {name}", errno=1227)
+            routines.append(((name, routine_type), as_text(row[2])))
+
+        # DROP DATABASE would take the events with it
+        cursor.execute("SELECT EVENT_NAME FROM information_schema.EVENTS WHERE EVENT_SCHEMA = %s ORDER BY EVENT_NAME",
+                       (self.old_name,))
+        events = [as_text(name) for (name,) in cursor.fetchall()]
+        return tables, views, triggers, routines, events, charset
+
+    def restore_triggers(self, cursor, triggers):
+        cursor.execute(f"USE {quote_identifier(self.old_name)}")
+        for name, sql in triggers:
+            cursor.execute(sql)
+
+    def undo_move(self, cursor, tables, triggers):
+        # A trigger that can't be recreated would exist nowhere once its table has moved, so the tables go back
+        # to the old database with their triggers and the rename fails
+        old = quote_identifier(self.old_name)
+        new = quote_identifier(self.new_name)
+        _, name, error = self.failed[-1]
+        try:
+            for trigger_name, _ in triggers:
+                # A table with triggers can't be renamed into another database
+                cursor.execute(f"DROP TRIGGER IF EXISTS {new}.{quote_identifier(trigger_name)}")
+            renames = ", ".join(f"{new}.{quote_identifier(table)} TO {old}.{quote_identifier(table)}" for table in tables)
+            cursor.execute(f"RENAME TABLE {renames}")
+            self.restore_triggers(cursor, triggers)
+            cursor.execute(f"DROP DATABASE {new}")
+        except mysql.connector.Error as err:
+            definitions = "\n\n".join(sql for _, sql in triggers)
+            raise mysql.connector.errors.DatabaseError(
+                msg=f"Couldn't recreate trigger {name} ({error}) and undoing the rename failed: {err}\n\n"
+                    f"The trigger definitions to recreate by hand:\n\n{definitions}")
+        raise mysql.connector.errors.DatabaseError(
+            msg=f"Couldn't recreate trigger {name} in {self.new_name}, the tables were moved back to "
+                f"{self.old_name}: {error}\n\n{dict(triggers)[name]}")
+
+    def move_event(self, cursor, name):
+        old = quote_identifier(self.old_name)
+        try:
+            cursor.execute(f"ALTER EVENT {old}.{quote_identifier(name)} RENAME TO "
+                           f"{quote_identifier(self.new_name)}.{quote_identifier(name)}")
+        except mysql.connector.Error as err:
+            self.failed.append(("event", name, str(err)))
+        finally:
+            self.step(f"Moved event {name}")
+
+    def recreate(self, cursor, kind, name, sql):
+        try:
+            cursor.execute(requalify(sql, self.old_name, self.new_name))
+        except mysql.connector.Error as err:
+            print(f"Error recreating {kind} {name}: {err}\n{sql}")
+            self.failed.append((kind, name, str(err)))
+            return False
+        finally:
+            self.step(f"Recreated {kind} {name}")
+        return True
+
+    def recreate_views(self, cursor, views):
+        # Views can select from other views, keep retrying until a pass makes no progress
+        old = quote_identifier(self.old_name)
+        pending = list(views)
+        errors = {}
+        while pending:
+            remaining = []
+            for name, sql in pending:
+                try:
+                    cursor.execute(requalify(sql, self.old_name, self.new_name))
+                except mysql.connector.Error as err:
+                    errors[name] = str(err)
+                    remaining.append((name, sql))
+                    continue
+                cursor.execute(f"DROP VIEW {old}.{quote_identifier(name)}")
+                self.step(f"Recreated view {name}")
+            if len(remaining) == len(pending):
+                break
+            pending = remaining
+        for name, sql in pending:
+            print(f"Error recreating view {name}: {errors[name]}\n{sql}")
+            self.failed.append(("view", name, errors[name]))
+            self.step(f"Couldn't recreate view {name}")
+
+    def copy_tables(self, tables):
+        # Each worker copies whole tables server side on its own pooled connection
+        workers = max(1, min(self.copy_workers, self.pool.max_size, len(tables)))
+        with ThreadPoolExecutor(max_workers=workers) as copy_pool:
+            for future in [copy_pool.submit(self.copy_table, table, running_task()) for table in tables]:
+                future.result()
+
+    def copy_table(self, table, task=None):
+        task_context.task = task  # Cancelling the rename reaches the copies too
+        try:
+            self.copy_table_data(table)
+        finally:
+            task_context.task = None
+
+    def copy_table_data(self, table):
+        source = f"{quote_identifier(self.old_name)}.{quote_identifier(table)}"
+        target = f"{quote_identifier(self.new_name)}.{quote_identifier(table)}"
+        with self.pool.connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute(f"SHOW CREATE TABLE {source}")
+            create = as_text(cursor.fetchone()[1])
+            cursor.execute("SELECT COLUMN_NAME FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = %s "
+                           "AND TABLE_NAME = %s AND EXTRA NOT LIKE %s ORDER BY ORDINAL_POSITION",
+                           (self.old_name, table, "%GENERATED%"))
+            columns = ", ".join(quote_identifier(as_text(row[0])) for row in cursor.fetchall())
+
+            # Foreign keys point at tables that may not have been copied yet
+            cursor.execute("SET SESSION foreign_key_checks = 0")
+            try:
+                cursor.execute(f"USE {quote_identifier(self.new_name)}")
+                cursor.execute(create)  # Unlike CREATE TABLE ... LIKE this keeps the foreign keys
+                cursor.execute(f"INSERT INTO {target} ({columns}) SELECT {columns} FROM {source}")
+                connection.commit()
+            finally:
+                cursor.execute("SET SESSION foreign_key_checks = 1")
+            cursor.close()
+        self.step(f"Copied {table}")
+
+    def drop_new_database(self):
+        try:
+            with self.pool.connection() as connection:
+                cursor = connection.cursor()
+                cursor.execute(f"DROP DATABASE IF EXISTS {quote_identifier(self.new_name)}")
+                cursor.close()
+        except mysql.connector.Error as err:
+            print(f"Error dropping {self.new_name} after a failed rename: {err}")
+
+
+literal_pattern = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.|\"\")*\"|\b0x[0-9a-f]+\b|\b\d+(?:\.\d+)?(?:e[+-]?\d+)?\b",
+                             re.IGNORECASE)
+value_list_pattern = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+
+def statement_fingerprint(statement):
+    # Groups statements that only differ in their literal values, e.g. "select * from t where id = ?"
+    text = strip_leading_comments(statement).rstrip(";")
+    text = literal_pattern.sub("?", text)
+    text = value_list_pattern.sub("(?)", text)
+    return " ".join(text.split()).lower()
+
+class QueryHistoryStore:
+    # Every statement run from the console or query dialog, kept in a local SQLite file with a full text index
+    def __init__(self, path=history_path):
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self.connection = sqlite3.connect(path)
+        except (OSError, sqlite3.Error) as err:
+            print(f"Error opening query history, keeping it in memory: {err}")
+            self.connection = sqlite3.connect(":memory:")
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")  # A lost history entry on power loss is fine
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS history (
+                id INTEGER PRIMARY KEY,
+                executed_at REAL NOT NULL,
+                database TEXT,
+                statement TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                duration REAL,
+                rows INTEGER,
+                error TEXT
+            );
+            CREATE INDEX IF NOT EXISTS history_fingerprint ON history (fingerprint, duration);
+        """)
+        self.full_text = self.create_full_text_index()
+
+    def create_full_text_index(self):
+        # External content FTS5 table kept in step by triggers, older SQLite builds without FTS5 fall back to LIKE
+        try:
+            self.connection.executescript("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS history_fts USING fts5(statement, content='history',
+                                                                          content_rowid='id');
+                CREATE TRIGGER IF NOT EXISTS history_fts_insert AFTER INSERT ON history BEGIN
+                    INSERT INTO history_fts (rowid, statement) VALUES (new.id, new.statement);
+                END;
+                CREATE TRIGGER IF NOT EXISTS history_fts_delete AFTER DELETE ON history BEGIN
+                    INSERT INTO history_fts (history_fts, rowid, statement) VALUES ('delete', old.id, old.statement);
+                END;
+            """)
+            return True
+        except sqlite3.OperationalError:
+            return False
+
+    def record(self, statement, database, duration, rows=None, error=None):
+        with self.connection:
+            self.connection.execute(
+                "INSERT INTO history (executed_at, database, statement, fingerprint, duration, rows, error) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (time.time(), database, statement, statement_fingerprint(statement), duration, rows, error))
+
+    def search(self, text="", database=None, limit=500):
+        # Newest first, (executed_at, database, statement, duration, rows, error) per entry
+        columns = "h.executed_at, h.database, h.statement, h.duration, h.rows, h.error"
+        conditions = []
+        params = []
+        words = text.split()
+        if words and self.full_text:
+            # Every word must appear, the last one may still be being typed
+            terms = ['"' + word.replace('"', '""') + '"' for word in words]
+            terms[-1] += "*"
+            query = f"SELECT {columns} FROM history_fts JOIN history h ON h.id = history_fts.rowid " \
+                    "WHERE history_fts MATCH ?"
+            params.append(" ".join(terms))
+        else:
+            query = f"SELECT {columns} FROM history h WHERE 1"
+            for word in words:
+                conditions.append("h.statement LIKE ? ESCAPE '\\'")
+                params.append(like_pattern(word))
+        if database is not None:
+            conditions.append("h.database = ?")
+            params.append(database)
+        for condition in conditions:
+            query += " AND " + condition
+        query += " ORDER BY h.id DESC LIMIT ?"
+        params.append(limit)
+        return self.connection.execute(query, params).fetchall()
+
+    def latency_stats(self, database=None, limit=200):
+        # Nearest rank p50/p95 of successful runs per fingerprint, (fingerprint, runs, p50, p95, max) per row
+        query = """
+            WITH ranked AS (
+                SELECT fingerprint, duration,
+                       ROW_NUMBER() OVER (PARTITION BY fingerprint ORDER BY duration) AS position,
+                       COUNT(*) OVER (PARTITION BY fingerprint) AS runs
+                FROM history
+                WHERE error IS NULL AND duration IS NOT NULL AND (? IS NULL OR database = ?)
+            )
+            SELECT fingerprint, MAX(runs),
+                   MIN(CASE WHEN position >= 0.50 * runs THEN duration END),
+                   MIN(CASE WHEN position >= 0.95 * runs THEN duration END),
+                   MAX(duration)
+            FROM ranked
+            GROUP BY fingerprint
+            ORDER BY MAX(runs) * MIN(CASE WHEN position >= 0.50 * runs THEN duration END) DESC
+            LIMIT ?
+        """
+        return self.connection.execute(query, (database, database, limit)).fetchall()
+
+    def clear(self, database=None):
+        with self.connection:
+            if database is None:
+                self.connection.execute("DELETE FROM history")
+            else:
+                self.connection.execute("DELETE FROM history WHERE database = ?", (database,))
+
+    def close(self):
+        self.connection.close()
+
+
+# Models
+class ResultTableModel(QAbstractTableModel):
+    def __init__(self, headers=None, rows=None, parent=None):
+        super().__init__(parent)
+        self.headers = list(headers or [])
+        self.rows = rows if rows is not None else []  # Row tuples as the cursor returned them, or ColumnarRows
+        # Sorting and filtering only reorder row indexes, view holds the row in self.rows for each row shown and is
+        # None while the rows are shown as they came
+        self.view = None
+        self.sort_column = -1
+        self.sort_descending = False
+        self.filters = []  # (column, operation, text)
+        self.search = ""
+
+    def set_result(self, headers, rows):
+        self.beginResetModel()
+        self.headers = list(headers)
+        self.rows = rows
+        self.view = self.current_view()
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.rows) if self.view is None else len(self.view)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.headers)
+
+    def data(self, index, role=Qt.DisplayRole):
+        # Cells are only formatted when the view asks for them, so cost follows the viewport
+        if not index.isValid() or role not in (Qt.DisplayRole, Qt.ToolTipRole):
+            return None
+        return self.format_value(self.cell(index.row(), index.column()))
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return self.headers[section] if section < len(self.headers) else None
+        return str((section if self.view is None else int(self.view[section])) + 1)
+
+    def source_row(self, row):
+        return row if self.view is None else int(self.view[row])
+
+    def cell(self, row, column):
+        row = self.source_row(row)
+        if isinstance(self.rows, ColumnarRows):
+            return self.rows.cell(row, column)  # Without building the whole row
+        return self.rows[row][column]
+
+    def format_value(self, value):
+        return str(value)
+
+    def source_column(self, index, start=0):
+        if isinstance(self.rows, ColumnarRows):
+            return self.rows.column(index, start)
+        return Column.from_values([row[index] for row in self.rows[start:]])
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        # Called by the view when a header is clicked, column -1 goes back to the order the rows came in
+        self.set_view(column, order == Qt.DescendingOrder, self.filters, self.search)
+
+    def set_filters(self, filters, search=""):
+        self.set_view(self.sort_column, self.sort_descending, list(filters), search)
+
+    def set_view(self, sort_column, descending, filters, search):
+        if (sort_column, descending, filters, search) == (self.sort_column, self.sort_descending, self.filters,
+                                                           self.search):
+            return
+        view = self.row_order(sort_column, descending, filters, search)  # Raises before anything has changed
+        self.beginResetModel()
+        self.sort_column, self.sort_descending, self.filters, self.search = sort_column, descending, filters, search
+        self.view = view
+        self.endResetModel()
+
+    def row_order(self, sort_column, descending, filters, search, start=0):
+        # Indexes of the rows from start on that pass the filters and search, in sort order. Each step works on a
+        # whole column at once. Raises ValueError for a filter value that doesn't fit its column
+        if sort_column < 0 and not filters and not search:
+            return None
+        keep = np.ones(len(self.rows) - start, bool)
+        for column, operation, text in filters:
+            keep &= self.source_column(column, start).compare(operation, text)
+        if search:
+            found = np.zeros(len(keep), bool)
+            for column in range(len(self.headers)):
+                found |= self.source_column(column, start).contains(search)
+            keep &= found
+        rows = np.flatnonzero(keep)
+        if sort_column >= 0:
+            rows = self.source_column(sort_column, start).sort_rows(rows, descending)
+        return rows + start
+
+    def current_view(self, start=0):
+        # The sort and filters applied again after the rows changed, ones that no longer fit the columns are dropped
+        width = len(self.headers)
+        if self.sort_column >= width:
+            self.sort_column = -1
+        self.filters = [item for item in self.filters if item[0] < width]
+        try:
+            return self.row_order(self.sort_column, self.sort_descending, self.filters, self.search, start)
+        except ValueError as err:
+            print(f"Error applying filters: {err}")
+            self.filters = []
+            return self.row_order(self.sort_column, self.sort_descending, self.filters, self.search, start)
+
+    def view_summary(self):
+        # Shown by the filter bar while a sort or filter is applied
+        if self.view is None:
+            return ""
+        return f"{self.rowCount():,} of {len(self.rows):,} loaded rows"
+
+    def find_rows(self, key_indexes, keys):
+        if isinstance(self.rows, ColumnarRows):
+            return self.rows.find_rows(key_indexes, keys)
+        wanted = set(keys)
+        return [row_index for row_index, row in enumerate(self.rows)
+                if tuple(row[i] for i in key_indexes) in wanted]
+
+    def replace_row(self, row_index, row):
+        # Row indexes here and in remove_rows are positions in self.rows, not in the sorted or filtered view
+        self.rows[row_index] = row
+        if self.view is None:
+            self.dataChanged.emit(self.index(row_index, 0), self.index(row_index, len(self.headers) - 1))
+        elif len(self.view):
+            self.dataChanged.emit(self.index(0, 0), self.index(len(self.view) - 1, len(self.headers) - 1))
+
+    def remove_rows(self, row_indexes):
+        if self.view is not None:
+            self.beginResetModel()
+            for row_index in sorted(row_indexes, reverse=True):
+                del self.rows[row_index]
+            self.view = self.current_view()
+            self.endResetModel()
+            return
+        # Remove from the bottom up so earlier indexes stay valid
+        for row_index in sorted(row_indexes, reverse=True):
+            self.beginRemoveRows(QModelIndex(), row_index, row_index)
+            del self.rows[row_index]
+            self.endRemoveRows()
+
+class PagedTableModel(ResultTableModel):
+    load_failed = pyqtSignal(str)
+    loaded = pyqtSignal()
+    edits_changed = pyqtSignal()
+
+    def __init__(self, executor=None, parent=None):
+        super().__init__(parent=parent)
+        self.executor = executor  # Pages are fetched synchronously when there is no executor
+        self.pager = None
+        self.header_format = None
+        self.loading = False
+        self.generation = 0  # Bumped on every load so late pages from an old load are ignored
+        self.column_names = []  # Headers as the server named them, sort and filter columns are pushed by name
+        self.sort_check = None  # Optional callable(column name), returns False to refuse a sort before it is run
+        # Cells edited in the grid and not saved yet, primary key -> {column name: new value, None for NULL}. Kept by
+        # key so they survive scrolling, sorting and reloads
+        self.edits = OrderedDict()
+
+    def load(self, pager, header_format=None):
+        self.generation += 1
+        self.pager = pager
+        self.header_format = header_format
+        self.loading = False
+        self.push_view(pager)
+        self.request_page(self.first_page_loaded)
+
+    def push_view(self, pager):
+        # The sort, filters and search become the pager's ORDER BY and WHERE
+        names = self.column_names
+        pager.order = None
+        if 0 <= self.sort_column < len(names):
+            pager.order = (names[self.sort_column], self.sort_descending)
+        pager.filters = [(names[column], operation, text) for column, operation, text in self.filters
+                         if column < len(names)]
+        pager.search = self.search
+        pager.search_columns = list(names)
+
+    def server_side(self):
+        # Only a table whose rows are all loaded is sorted and filtered here, anything else goes to the server
+        return self.pager is not None and (self.pager.conditioned or not self.pager.exhausted)
+
+    def set_view(self, sort_column, descending, filters, search):
+        if not self.server_side():
+            super().set_view(sort_column, descending, filters, search)
+            return
+        if (sort_column, descending, filters, search) == (self.sort_column, self.sort_descending, self.filters,
+                                                           self.search):
+            return
+        if (sort_column >= 0 and sort_column != self.sort_column and self.sort_check is not None
+                and not self.sort_check(self.column_names[sort_column])):
+            return
+        self.sort_column, self.sort_descending, self.filters, self.search = sort_column, descending, filters, search
+        call_recorder.start_action(f"sort and filter {self.pager.tablename}")
+        # A new pager, a page still on its way for the old one can't move this one's position
+        self.load(self.pager.copy(), self.header_format)
+
+    def current_view(self, start=0):
+        if self.pager is not None and self.pager.conditioned:
+            return None  # The server already sorted and filtered these rows
+        return super().current_view(start)
+
+    def editable(self):
+        # Rows can only be written back when they can be found again by primary key
+        return (self.pager is not None and bool(self.pager.primary_keys)
+                and all(key in self.column_names for key in self.pager.primary_keys))
+
+    def row_key(self, row):
+        return tuple(self.cell(row, self.column_names.index(key)) for key in self.pager.primary_keys)
+
+    def flags(self, index):
+        flags = super().flags(index)
+        if index.isValid() and self.editable():
+            flags |= Qt.ItemIsEditable
+        return flags
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if self.edits and self.pager is not None and role in (Qt.DisplayRole, Qt.ToolTipRole, Qt.EditRole,
+                                                               Qt.BackgroundRole):
+            edit = self.edits.get(self.row_key(index.row()))
+            name = self.column_names[index.column()]
+            if edit is not None and name in edit:
+                if role == Qt.BackgroundRole:
+                    return QBrush(Qt.yellow)
+                return self.edit_text(edit[name]) if role == Qt.EditRole else self.format_value(edit[name])
+        if role == Qt.EditRole:
+            return self.edit_text(self.cell(index.row(), index.column()))
+        return super().data(index, role)
+
+    def edit_text(self, value):
+        # What the cell editor starts with, typing NULL sets the value to NULL
+        return "NULL" if value is None else self.format_value(value)
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if role != Qt.EditRole or not index.isValid() or not self.editable():
+            return False
+        text = str(value)
+        new_value = None if text.upper() == "NULL" else text
+        key = self.row_key(index.row())
+        name = self.column_names[index.column()]
+        edit = self.edits.setdefault(key, {})
+        if self.edit_text(self.cell(index.row(), index.column())) == self.edit_text(new_value):
+            edit.pop(name, None)  # Back to what the server has
+            if not edit:
+                del self.edits[key]
+        else:
+            edit[name] = new_value
+        self.dataChanged.emit(index, index)
+        self.edits_changed.emit()
+        return True
+
+    def edited_cells(self):
+        return sum(len(edit) for edit in self.edits.values())
+
+    def edit_updates(self):
+        # The pending edits as (UPDATE statement, parameter rows) pairs. Each row's edits make one UPDATE, rows
+        # that change the same columns share a statement so they go to the server as one executemany
+        table = quote_identifier(self.pager.tablename)
+        where = " AND ".join(f"{quote_identifier(key)} = %s" for key in self.pager.primary_keys)
+        groups = OrderedDict()
+        for key, edit in self.edits.items():
+            columns = tuple(name for name in self.column_names if name in edit)
+            groups.setdefault(columns, []).append([edit[name] for name in columns] + list(key))
+        return [(f"UPDATE {table} SET {', '.join(f'{quote_identifier(name)} = %s' for name in columns)} "
+                 f"WHERE {where}", rows) for columns, rows in groups.items()]
+
+    def clear_edits(self, edits=None):
+        # Drops the given edits, or all of them. An edit changed again since it was taken is kept
+        if edits is None:
+            self.edits.clear()
+        else:
+            for key, edit in edits.items():
+                if self.edits.get(key) == edit:
+                    del self.edits[key]
+        if self.rowCount():
+            self.dataChanged.emit(self.index(0, 0), self.index(self.rowCount() - 1, len(self.headers) - 1))
+        self.edits_changed.emit()
+
+    def view_summary(self):
+        if self.pager is None or not self.pager.conditioned:
+            return super().view_summary()
+        done = "filtered" if self.pager.filters or self.pager.search else "sorted"
+        more = "" if self.pager.exhausted else ", scroll for more"
+        return f"{len(self.rows):,} rows {done} by the server{more}"
+
+    def request_page(self, on_rows):
+        generation = self.generation
+        pager = self.pager
+
+        def deliver(rows):
+            self.loading = False
+            if generation == self.generation:
+                on_rows(rows)
+
+        def fail(message):
+            self.loading = False
+            if generation == self.generation:
+                pager.exhausted = True  # Stop the view from retrying on every scroll
+                self.load_failed.emit(message)
+
+        self.loading = True
+        if self.executor is None:
+            try:
+                rows = pager.fetch_page()
+            except mysql.connector.Error as err:
+                fail(str(err))
+                return
+            deliver(rows)
+        else:
+            self.executor.submit(f"SELECT * FROM {pager.tablename}", work=pager.fetch_page,
+                                 on_finished=deliver, on_failed=fail, owner=self)
+
+    def release(self):
+        self.generation += 1  # Pages still on their way are dropped
+        self.pager = None
+        self.loading = False
+        self.set_result(self.headers, [])
+
+    def first_page_loaded(self, rows):
+        headers = self.pager.headers
+        self.column_names = list(headers)
+        if self.header_format is not None:
+            headers = self.header_format(headers)
+        self.set_result(headers, rows)
+        self.loaded.emit()
+
+    def append_rows(self, rows):
+        if not rows:
+            return
+        if self.view is None:
+            self.beginInsertRows(QModelIndex(), len(self.rows), len(self.rows) + len(rows) - 1)
+            self.rows.extend(rows)
+            self.endInsertRows()
+            return
+        start = len(self.rows)
+        filters = self.filters
+        self.rows.extend(rows)
+        # When only filtered, the new rows that pass go on the end
+        added = self.current_view(start) if self.sort_column < 0 else None
+        if added is None or self.filters != filters:
+            # Sorted, new rows can go anywhere among the loaded ones
+            self.beginResetModel()
+            self.view = self.current_view()
+            self.endResetModel()
+        elif len(added):
+            self.beginInsertRows(QModelIndex(), len(self.view), len(self.view) + len(added) - 1)
+            self.view = np.concatenate([self.view, added])
+            self.endInsertRows()
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return (not parent.isValid() and self.pager is not None and not self.loading
+                and not self.pager.exhausted)
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self.pager is None or self.loading:
+            return
+        call_recorder.start_action(f"scroll {self.pager.tablename}")
+        self.request_page(self.append_rows)
+
+def create_result_view(model, sortable=False):
+    view = QTableView()
+    view.setModel(model)
+    if sortable:
+        # Header clicks sort through the model, starting from the order the rows came in
+        view.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        view.setSortingEnabled(True)
+    # Fixed row heights stop the view from measuring every row up front
+    view.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+    view.verticalHeader().setDefaultSectionSize(view.fontMetrics().height() + 8)
+    view.setWordWrap(False)
+    return view
 
 # Widgets
 class CustomListWidget(QListWidget):
@@ -26,74 +3573,179 @@ class CustomListWidget(QListWidget):
             event.ignore()
         else:
             super().mouseDoubleClickEvent(event)
+
+class FilterBar(QWidget):
+    # Search box and per column filters for a ResultTableModel. They work on the rows already loaded, without
+    # going back to the server
+    def __init__(self, model, view, parent=None):
+        super().__init__(parent)
+        self.model = model
+        self.view = view
+        layout = QHBoxLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+        self.setLayout(layout)
+
+        self.search_edit = QLineEdit()
+        self.search_edit.setPlaceholderText("Search loaded rows")
+        self.search_edit.setClearButtonEnabled(True)
+        # Searching waits for a pause in typing, a large result isn't searched again on every key
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(300)
+        self.search_timer.timeout.connect(self.apply_search)
+        self.search_edit.textChanged.connect(self.search_timer.start)
+        layout.addWidget(self.search_edit)
+
+        self.column_combo = QComboBox()
+        layout.addWidget(self.column_combo)
+        self.operation_combo = QComboBox()
+        self.operation_combo.addItems(list(filter_operators))
+        layout.addWidget(self.operation_combo)
+        self.value_edit = QLineEdit()
+        self.value_edit.setPlaceholderText("Value")
+        self.value_edit.returnPressed.connect(self.add_filter)
+        layout.addWidget(self.value_edit)
+        add_button = QPushButton("Add Filter")
+        add_button.clicked.connect(self.add_filter)
+        layout.addWidget(add_button)
+        clear_button = QPushButton("Clear")
+        clear_button.clicked.connect(self.clear)
+        layout.addWidget(clear_button)
+        self.status_label = QLabel()
+        layout.addWidget(self.status_label)
+
+        model.modelReset.connect(self.update_state)
+        model.rowsInserted.connect(lambda *_: self.update_state())
+        model.rowsRemoved.connect(lambda *_: self.update_state())
+        self.update_state()
+
+    def update_state(self):
+        headers = self.model.headers
+        if [self.column_combo.itemText(i) for i in range(self.column_combo.count())] != headers:
+            self.column_combo.clear()
+            self.column_combo.addItems(headers)
+        shown = self.model.view_summary()
+        if not shown:
+            self.status_label.clear()
+            return
+        filters = [f"{headers[column]} {operation} {text}".rstrip() for column, operation, text in self.model.filters]
+        if self.model.search:
+            filters.append(f"\"{self.model.search}\"")
+        self.status_label.setText(f"{', '.join(filters)}: {shown}" if filters else shown)
+
+    def add_filter(self):
+        column = self.column_combo.currentIndex()
+        if column < 0:
+            return
+        operation = self.operation_combo.currentText()
+        text = "" if operation in ("is null", "is not null") else self.value_edit.text()
+        if self.apply(self.model.filters + [(column, operation, text)], self.model.search):
+            self.value_edit.clear()
+
+    def apply_search(self):
+        self.apply(self.model.filters, self.search_edit.text())
+
+    def apply(self, filters, search):
+        try:
+            self.model.set_filters(filters, search)
+        except ValueError as err:
+            QMessageBox.warning(self, "Error", f"Invalid filter: {err}")
+            return False
+        return True
+
+    def clear(self):
+        self.search_timer.stop()
+        self.search_edit.blockSignals(True)
+        self.search_edit.clear()
+        self.search_edit.blockSignals(False)
+        self.model.set_filters([], "")
+        self.view.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        self.model.sort(-1)
+
 class TableWidget(QWidget):
-    def __init__(self, tablename, info):
+    def __init__(self, tablename, pool, page_size=default_page_size, executor=None, schema_cache=None,
+                 result_cache=None):
         super().__init__()
         self.tablename = tablename
-        self.info = info
+        self.pool = pool
+        self.schema_cache = schema_cache if schema_cache is not None else SchemaCache(pool)
+        self.result_cache = result_cache
+        self.page_size = page_size
         self.layout = QVBoxLayout()
         self.setLayout(self.layout)
 
-        self.table_view = QTableWidget()
+        # Shown while the rows on screen came from the result cache
+        self.cache_label = QLabel()
+        self.cache_label.setStyleSheet("color: orange")
+        self.cache_label.setVisible(False)
+        self.layout.addWidget(self.cache_label)
+
+        # Shown while the server sorts on a column no index can serve
+        self.sort_label = QLabel()
+        self.sort_label.setStyleSheet("color: orange")
+        self.sort_label.setVisible(False)
+        self.layout.addWidget(self.sort_label)
+
+        self.model = PagedTableModel(executor, self)
+        self.model.load_failed.connect(lambda err: QMessageBox.warning(self, "Error", f"Failed to execute query: {err}"))
+        self.model.loaded.connect(self.show_cache_state)
+        self.model.loaded.connect(self.show_sort_state)
+        self.model.sort_check = self.confirm_sort
+        self.table_view = create_result_view(self.model, sortable=True)
+        self.filter_bar = FilterBar(self.model, self.table_view)
+        self.layout.addWidget(self.filter_bar)
         self.layout.addWidget(self.table_view)
+
+        # Cells edited in the grid are written back together when saved
+        self.edit_bar = QWidget()
+        edit_layout = QHBoxLayout()
+        edit_layout.setContentsMargins(0, 0, 0, 0)
+        self.edit_bar.setLayout(edit_layout)
+        self.edit_label = QLabel()
+        edit_layout.addWidget(self.edit_label)
+        edit_layout.addStretch()
+        self.save_button = QPushButton("Save Changes")
+        self.save_button.clicked.connect(self.save_edits)
+        edit_layout.addWidget(self.save_button)
+        self.discard_button = QPushButton("Discard Changes")
+        self.discard_button.clicked.connect(self.discard_edits)
+        edit_layout.addWidget(self.discard_button)
+        self.edit_bar.setVisible(False)
+        self.layout.addWidget(self.edit_bar)
+        self.model.edits_changed.connect(self.show_edit_state)
+        self.saving = False
+
+        self.columns = []
+        self.data_loaded = False  # Rows are only read once the tab is shown
         self.load_table_structure()
-        self.load_table_data()
+
+    @property
+    def pager(self):
+        return self.model.pager  # Replaced by the model when a sort or filter goes to the server
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        if not self.data_loaded:
+            self.load_table_data()
 
     def load_table_structure(self):
+        # Column details, including whether each column is auto-incremented, come from the schema cache
         try:
-            connection = mysql.connector.connect(
-                host=self.info[0],
-                user=self.info[1],
-                password=self.info[2],
-                database=self.info[3]
-            )
-            cursor = connection.cursor(dictionary=True)
-            cursor.execute(f"SHOW COLUMNS FROM {self.tablename}")
-            self.columns = cursor.fetchall()
-            connection.close()
+            self.columns = self.schema_cache.columns(self.tablename)
         except mysql.connector.Error as err:
             QMessageBox.warning(self, "Error", f"Failed to load table structure: {err}")
 
-        # Fetch additional information about each column, including whether it's auto-incremented
-        try:
-            connection = mysql.connector.connect(
-                host=self.info[0],
-                user=self.info[1],
-                password=self.info[2],
-                database=self.info[3]
-            )
-            cursor = connection.cursor(dictionary=True)
-            cursor.execute(f"SHOW KEYS FROM {self.tablename} WHERE Key_name = 'PRIMARY'")
-            primary_keys = cursor.fetchall()
-            primary_key_names = [key["Column_name"] for key in primary_keys]
-
-
-            for column in self.columns:
-                column_name = column["Field"]
-                column["auto_increment"] = column_name in primary_key_names and column["Extra"] == "auto_increment"
-                column["key_type"] = "P" if column_name in primary_key_names else "F" if column["Key"] == "MUL" else ""
-
-            connection.close()
-        except mysql.connector.Error as err:
-            QMessageBox.warning(self, "Error", f"Failed to fetch column information: {err}")
-
     def load_table_data(self):
-        try:
-            connection = mysql.connector.connect(
-                host=self.info[0],
-                user=self.info[1],
-                password=self.info[2],
-                database=self.info[3]
-            )
+        if not self.isVisible():
+            self.release_rows()  # Read again when the tab is next shown
+            return
+        self.data_loaded = True
 
-            cursor = connection.cursor()
-            cursor.execute(f"SELECT * FROM {self.tablename}")
-            rows = cursor.fetchall()
-            column_names = [desc[0] for desc in cursor.description]
-            # Get primary and foreign keys
-            primary_keys = self.get_primary_keys()
-            foreign_keys = self.get_foreign_keys()
+        # Get primary and foreign keys
+        primary_keys = self.get_primary_keys()
+        foreign_keys = self.get_foreign_keys()
 
+        def format_headers(column_names):
             # Modify column names to include symbols for primary and foreign keys
             modified_column_names = []
             for column_name in column_names:
@@ -103,82 +3755,279 @@ class TableWidget(QWidget):
                     modified_column_names.append(column_name + " (F)")
                 else:
                     modified_column_names.append(column_name)
+            return modified_column_names
 
-            self.table_view.setColumnCount(len(modified_column_names))
-            self.table_view.setHorizontalHeaderLabels(modified_column_names)
-
-            self.table_view.setRowCount(len(rows))
-            for i, row in enumerate(rows):
-                for j, val in enumerate(row):
-                    item = QTableWidgetItem(str(val))
-                    self.table_view.setItem(i, j, item)
-
-        except mysql.connector.Error as e:
-            QMessageBox.warning(self, "Error", f"Failed to execute query: {e}")
+        # Only the first page is loaded here, the view pulls the rest through fetchMore as it scrolls
+        tiebreakers = [] if primary_keys else self.get_tiebreak_columns()
+        self.model.load(TablePager(self.pool, self.tablename, primary_keys, self.page_size, self.result_cache,
+                                   tiebreakers), format_headers)
 
     def get_primary_keys(self):
         primary_keys = []
         try:
-            connection = mysql.connector.connect(
-                host=self.info[0],
-                user=self.info[1],
-                password=self.info[2],
-                database=self.info[3]
-            )
-            cursor = connection.cursor(dictionary=True)
-            cursor.execute(f"SHOW KEYS FROM {self.tablename} WHERE Key_name = 'PRIMARY'")
-            primary_keys_info = cursor.fetchall()
-            primary_keys = [key_info["Column_name"] for key_info in primary_keys_info]
-            connection.close()
+            primary_keys = self.schema_cache.primary_keys(self.tablename)
         except mysql.connector.Error as err:
             QMessageBox.warning(self, "Error", f"Failed to fetch primary keys: {err}")
         return primary_keys
 
+    def get_tiebreak_columns(self):
+        tiebreakers = []
+        try:
+            tiebreakers = self.schema_cache.tiebreak_columns(self.tablename)
+        except mysql.connector.Error as err:
+            QMessageBox.warning(self, "Error", f"Failed to fetch table indexes: {err}")
+        return tiebreakers
+
     def get_foreign_keys(self):
         foreign_keys = []
         try:
-            connection = mysql.connector.connect(
-                host=self.info[0],
-                user=self.info[1],
-                password=self.info[2],
-                database=self.info[3]
-            )
-            cursor = connection.cursor(dictionary=True)
-            cursor.execute(f"SHOW CREATE TABLE {self.tablename}")
-            create_table_statement = cursor.fetchone()["Create Table"]
-
-            lines = create_table_statement.split("\n")
-            for line in lines:
-                line = line.strip()
-                if line.startswith("FOREIGN KEY"):
-                    parts = line.split("REFERENCES")
-                    constraint_info = parts[0].strip().split("(")
-                    column_name = constraint_info[1][1:-1]  # Extract column name
-                    foreign_keys.append(column_name)
-            connection.close()
+            foreign_keys = self.schema_cache.foreign_keys(self.tablename)
         except mysql.connector.Error as err:
             QMessageBox.warning(self, "Error", f"Failed to fetch foreign keys: {err}")
         return foreign_keys
 
     def get_column_names_and_types(self):
         try:
-            connection = mysql.connector.connect(
-                host=self.info[0],
-                user=self.info[1],
-                password=self.info[2],
-                database=self.info[3]
-            )
-            cursor = connection.cursor()
-            cursor.execute(f"SHOW COLUMNS FROM {self.tablename}")
-            columns = cursor.fetchall()
-            connection.close()
+            columns = self.schema_cache.columns(self.tablename)
             # Extract column names and data types from the result set
-            names_and_types = [(column[0], column[1]) for column in columns]
+            names_and_types = [(column["Field"], column["Type"]) for column in columns]
             return names_and_types
         except mysql.connector.Error as err:
             print(f"Error retrieving column names and types: {err}")
             return []
 
+    def get_auto_increment_columns(self):
+        try:
+            return [column["Field"] for column in self.schema_cache.columns(self.tablename) if column["auto_increment"]]
+        except mysql.connector.Error as err:
+            print(f"Error retrieving auto increment columns: {err}")
+            return []
+
+    def set_page_size(self, page_size):
+        self.page_size = page_size
+        if self.pager is not None:
+            self.pager.page_size = page_size
+
+    def release_rows(self):
+        # Frees the rows, the headers stay so the tab still looks like the table until it is shown again
+        self.data_loaded = False
+        self.model.release()
+        self.show_cache_state()
+
+    def data_size(self):
+        return estimate_size(self.model.rows) if self.data_loaded else 0
+
+    def show_cache_state(self):
+        cached_at = self.pager.cached_at if self.pager is not None else None
+        if cached_at is None:
+            self.cache_label.setVisible(False)
+        else:
+            self.cache_label.setText(f"Showing cached rows from {format_age(time.time() - cached_at)} ago, "
+                                     "refresh to read them again")
+            self.cache_label.setVisible(True)
+
+    def unindexed(self, column):
+        # True when no index starts with the column, so ORDER BY on it sorts the whole table
+        indexes = self.schema_cache.indexes(self.tablename)
+        return not any(index["columns"] and index["columns"][0] == column for index in indexes.values())
+
+    def confirm_sort(self, column):
+        try:
+            if not self.unindexed(column):
+                return True
+            row_estimate = self.schema_cache.table(self.tablename)["row_estimate"] or 0
+        except mysql.connector.Error as err:
+            print(f"Error reading indexes: {err}")
+            return True
+        if row_estimate < unindexed_sort_confirm_rows:
+            return True
+        answer = QMessageBox.question(
+            self, "Sort Without Index",
+            f"{column} has no index, so the server has to read and sort all ~{row_estimate:,} rows of "
+            f"{self.tablename} for every page. Sort anyway?", QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+        if answer != QMessageBox.Yes:
+            # Put the header's sort arrow back once the click that moved it has been handled
+            header = self.table_view.horizontalHeader()
+            section = self.model.sort_column
+            order = Qt.DescendingOrder if self.model.sort_descending else Qt.AscendingOrder
+            QTimer.singleShot(0, lambda: header.setSortIndicator(section, order))
+            return False
+        return True
+
+    def show_sort_state(self):
+        order = self.pager.order if self.pager is not None else None
+        try:
+            unindexed = order is not None and self.unindexed(order[0])
+        except mysql.connector.Error:
+            unindexed = False
+        if unindexed:
+            self.sort_label.setText(f"{order[0]} has no index, the server sorts the whole table for every page")
+        self.sort_label.setVisible(unindexed)
+
+    def show_edit_state(self):
+        cells = self.model.edited_cells()
+        self.edit_bar.setVisible(cells > 0 or self.saving)
+        rows = len(self.model.edits)
+        self.edit_label.setText(f"{cells} {'cell' if cells == 1 else 'cells'} changed in {rows} "
+                                f"{'row' if rows == 1 else 'rows'}, NULL sets a cell to NULL")
+        self.save_button.setEnabled(cells > 0 and not self.saving)
+        self.discard_button.setEnabled(cells > 0 and not self.saving)
+
+    def save_edits(self):
+        # Every edited row becomes one parameterized UPDATE by primary key, all of them in one transaction
+        if not self.model.edits or self.saving:
+            return
+        call_recorder.start_action(f"save edits {self.tablename}")
+        edits = OrderedDict((key, dict(edit)) for key, edit in self.model.edits.items())
+        updates = self.model.edit_updates()
+        # Rows whose key was edited are looked for under the new key as well
+        keys = list(edits)
+        for key, edit in edits.items():
+            if any(name in edit for name in self.pager.primary_keys):
+                keys.append(tuple(edit.get(name, value) for name, value in zip(self.pager.primary_keys, key)))
+
+        def done(changed):
+            self.saving = False
+            self.model.clear_edits(edits)
+            self.refresh_rows(keys)
+
+        def failed(message):
+            self.saving = False
+            self.show_edit_state()
+            QMessageBox.warning(self, "Error", f"Failed to save changes, nothing was written: {message}")
+
+        self.saving = True
+        self.show_edit_state()
+        if self.model.executor is None:
+            try:
+                changed = write_updates(self.pool, updates)
+            except mysql.connector.Error as err:
+                failed(str(err))
+                return
+            done(changed)
+        else:
+            self.model.executor.submit(updates[0][0], work=lambda: write_updates(self.pool, updates),
+                                       on_finished=done, on_failed=failed, owner=self)
+
+    def discard_edits(self):
+        self.model.clear_edits()
+
+    def refresh_rows(self, keys):
+        # Re-read only the rows with the given primary keys and patch them into the model
+        if self.pager is None or not self.pager.primary_keys or not self.model.headers or self.pager.conditioned:
+            # Changed rows may now sort or filter somewhere else, the server works out where
+            self.load_table_data()
+            return
+        keys = list(keys)
+        if not keys:
+            return
+        if len(keys) > row_refresh_limit:
+            self.load_table_data()
+            return
+
+        key_list = ", ".join(quote_identifier(key) for key in self.pager.primary_keys)
+        row_placeholder = "(" + ", ".join(["%s"] * len(self.pager.primary_keys)) + ")"
+        query = (f"SELECT * FROM {quote_identifier(self.tablename)} "
+                 f"WHERE ({key_list}) IN ({', '.join([row_placeholder] * len(keys))})")
+        try:
+            with self.pool.connection() as connection:
+                cursor = connection.cursor()
+                cursor.execute(query, [value for key in keys for value in key])
+                rows = cursor.fetchall()
+                cursor.close()
+        except mysql.connector.Error as err:
+            QMessageBox.warning(self, "Error", f"Failed to refresh rows: {err}")
+            return
+
+        key_indexes = [self.pager.headers.index(key) for key in self.pager.primary_keys]
+        fresh = {tuple(row[i] for i in key_indexes): row for row in rows}
+        stale = []
+        for row_index in self.model.find_rows(key_indexes, list(keys) + list(fresh)):
+            row_key = tuple(self.model.rows[row_index][i] for i in key_indexes)
+            if row_key in fresh:
+                self.model.replace_row(row_index, fresh.pop(row_key))
+            else:
+                stale.append(row_index)  # Deleted, or no longer matches its old key
+        self.model.remove_rows(stale)
+
+        # New rows are shown now if paging has already gone past them, otherwise they arrive with a later page
+        new_rows = []
+        for row_key, row in fresh.items():
+            try:
+                if self.pager.exhausted or self.pager.last_key is None or row_key <= self.pager.last_key:
+                    new_rows.append(row)
+            except TypeError:
+                new_rows.append(row)
+        self.model.append_rows(new_rows)
+
+class PerformancePanel(QWidget):
+    # Recent database calls and per action totals from call_recorder, refreshed while the panel is shown
+    def __init__(self, recorder=None, parent=None):
+        super().__init__(parent)
+        self.recorder = recorder if recorder is not None else call_recorder
+        self.shown_state = None
+        self.layout = QVBoxLayout(self)
+
+        self.tabs = QTabWidget()
+        self.actions_model = ResultTableModel()
+        self.tabs.addTab(create_result_view(self.actions_model), "Actions")
+        self.calls_model = ResultTableModel()
+        self.tabs.addTab(create_result_view(self.calls_model), "Recent Calls")
+        self.layout.addWidget(self.tabs)
+
+        buttons = QHBoxLayout()
+        export_button = QPushButton("Export JSON")
+        export_button.clicked.connect(self.export_json)
+        buttons.addWidget(export_button)
+        clear_button = QPushButton("Clear")
+        clear_button.clicked.connect(self.clear)
+        buttons.addWidget(clear_button)
+        buttons.addStretch()
+        self.layout.addLayout(buttons)
+
+        self.timer = QTimer(self)
+        self.timer.setInterval(1000)
+        self.timer.timeout.connect(self.update_view)
+        self.timer.start()
+
+    def update_view(self):
+        if not self.isVisible():
+            return
+        calls, actions = self.recorder.snapshot()
+        state = (len(calls), calls[-1]["time"] if calls else None, len(actions))
+        if state == self.shown_state:
+            return  # Nothing new, keep the scroll position
+        self.shown_state = state
+
+        self.actions_model.set_result(
+            ["Action", "Started", "Connects", "Queries", "Fetches", "Commits", "Rows", "Bytes", "DB ms", "Span ms"],
+            [(action["action"], time.strftime("%H:%M:%S", time.localtime(action["started"])), action["connects"],
+              action["queries"], action["fetches"], action["commits"], action["rows"], action["bytes"],
+              f"{action['db_ms']:.1f}", f"{(action['last_call'] - action['started']) * 1000:.0f}")
+             for action in reversed(actions)])
+        self.calls_model.set_result(
+            ["Time", "Kind", "ms", "Rows", "Bytes", "Action", "Call site", "Statement"],
+            [(time.strftime("%H:%M:%S", time.localtime(call["time"])), call["kind"], f"{call['ms']:.2f}",
+              call["rows"], call["bytes"], call["action"] or "", call["site"] or "", call["statement"] or "")
+             for call in reversed(calls)])
+
+    def export_json(self):
+        file_path, _ = QFileDialog.getSaveFileName(self, "Export Performance Data", "performance.json",
+                                                   "JSON Files (*.json)")
+        if file_path:
+            calls, actions = self.recorder.snapshot()
+            try:
+                with open(file_path, "w") as export_file:
+                    json.dump({"actions": actions, "calls": calls}, export_file, indent=2)
+            except OSError as err:
+                QMessageBox.warning(self, "Error", f"Failed to export performance data: {err}")
+
+    def clear(self):
+        self.recorder.clear()
+        self.shown_state = None
+        self.update_view()
+
+
 # Main classes
 class DatabaseManager(QMainWindow):
     def __init__(self):
@@ -186,6 +4035,9 @@ class DatabaseManager(QMainWindow):
 
         self.setWindowTitle("Database Manager")
         self.databasewindow = None
+        self.pool = None  # Server level connection pool, created on connect
+        self.executor = None  # Runs long operations such as renames on the pool
+        self.renamers = []  # Database renames in progress
         self.setFixedSize(320, 500)  # Set fixed size for the window
 
         self.central_widget = QWidget()
@@ -280,9 +4132,9 @@ class DatabaseManager(QMainWindow):
                 except mysql.connector.Error as err:
                     print(f"Error: {err}")
                 finally:
-                    # Close cursor and connection
+                    # Close cursor and return connection to the pool
                     cursor.close()
-                    connection.close()
+                    self.pool.release(connection)
 
     def confirm_delete_database(self):
         selected_database = self.database_combo_box.currentText()
@@ -389,40 +4241,53 @@ class DatabaseManager(QMainWindow):
         old_name = self.database_combo_box.currentText()
         if old_name:
             new_name, ok = QInputDialog.getText(self, "Rename Database", f"Enter new name for database '{old_name}':")
-            if ok:
-                # Establish connection
+            new_name = new_name.strip()
+            if ok and new_name and new_name != old_name:
+                # Make sure the pool is connected with the current credentials
                 connection = self.connect_to_server()
+                if connection is None:
+                    return
+                self.pool.release(connection)
+                call_recorder.start_action(f"rename database {old_name}")
 
-                if connection is not None:
-                    # Create cursor
-                    cursor = connection.cursor()
-
-                    try:
-                        cursor.execute(f"CREATE DATABASE {new_name}")
+                renamer = DatabaseRenamer(self.pool, old_name, new_name)
+                progress = QProgressDialog(f"Renaming {old_name} to {new_name}...", None, 0, 0, self)
+                progress.setWindowTitle("Rename Database")
+                progress.setMinimumDuration(0)
 
-                        # Get list of tables from the old database
-                        cursor.execute(f"USE {old_name}")
-                        cursor.execute("SHOW TABLES")
-                        tables = cursor.fetchall()
+                def update_progress(done, total, text):
+                    progress.setMaximum(total)
+                    progress.setValue(min(done, total))
+                    progress.setLabelText(f"Renaming {old_name} to {new_name}...\n{text}")
 
-                        # Copy tables and data from old database to new database
-                        for table in tables:
-                            table_name = table[0]
-                            cursor.execute(f"USE {old_name}")
-                            cursor.execute(f"CREATE TABLE {new_name}.{table_name} LIKE {old_name}.{table_name}")
-                            cursor.execute(f"INSERT INTO {new_name}.{table_name} SELECT * FROM {old_name}.{table_name}")
+                renamer.progress.connect(update_progress)
+                started = time.monotonic()
 
-                        # Drop the old database
-                        cursor.execute(f"DROP DATABASE {old_name}")
+                def done(tables):
+                    self.renamers.remove(renamer)
+                    progress.close()
+                    self.populate_database_combo_box()
+                    self.database_combo_box.setCurrentText(new_name)  # Select the renamed database
+                    if renamer.failed:
+                        details = "\n".join(f"{kind} {name}: {error}" for kind, name, error in renamer.failed)
+                        QMessageBox.warning(self, "Rename Database",
+                                            f"Moved {tables} tables to {new_name}, but these couldn't be carried "
+                                            f"over and were left in {old_name}, which was kept:\n\n{details}")
+                    else:
+                        QMessageBox.information(self, "Success", f"Renamed {old_name} to {new_name} in "
+                                                                 f"{time.monotonic() - started:.1f} s "
+                                                                 f"({renamer.method or 'no tables'}).")
+
+                def failed(message):
+                    self.renamers.remove(renamer)
+                    progress.close()
+                    self.populate_database_combo_box()
+                    QMessageBox.warning(self, "Error", f"Failed to rename database: {message}")
 
-                        self.populate_database_combo_box()
-                        self.database_combo_box.setCurrentText(new_name)  # Select the renamed database
-                    except mysql.connector.Error as err:
-                        print(f"Error: {err}")
-                    finally:
-                        # Close cursor and connection
-                        cursor.close()
-                        connection.close()
+                # Keep the renamer alive until the worker is done with it
+                self.renamers.append(renamer)
+                self.executor.submit(f"RENAME DATABASE {old_name} TO {new_name}", work=renamer.run,
+                                     on_finished=done, on_failed=failed, owner=self)
 
     def load_database(self):
         selected_database = self.database_combo_box.currentText()
@@ -435,12 +4300,18 @@ class DatabaseManager(QMainWindow):
 
     def connect_to_server(self):
         try:
-            # Establish connection
-            connection = mysql.connector.connect(
-                host=self.hostname_input.text() if self.hostname_input.text() else None,
-                user=self.username_input.text() if self.username_input.text() else None,
-                password=self.password_input.text() if self.password_input.text() else None
-            )
+            # Borrow a connection from the pool, rebuilding it if the credentials changed
+            credentials = {
+                "host": self.hostname_input.text() if self.hostname_input.text() else None,
+                "user": self.username_input.text() if self.username_input.text() else None,
+                "password": self.password_input.text() if self.password_input.text() else None
+            }
+            if self.pool is None or self.pool.config != credentials:
+                if self.pool is not None:
+                    self.pool.close()
+                self.pool = ConnectionPool(**credentials)
+                self.executor = QueryExecutor(self.pool, self)
+            connection = self.pool.acquire()
 
             # Enable database controls
             self.set_database_controls_enabled(True)
@@ -448,6 +4319,9 @@ class DatabaseManager(QMainWindow):
             return connection
         except mysql.connector.Error as err:
             print(f"Error: {err}")
+            if self.pool is not None:
+                self.pool.close()
+                self.pool = None
             self.hostname_input.setText("")
             self.username_input.setText("")
             self.password_input.setText("")
@@ -488,15 +4362,16 @@ class DatabaseManager(QMainWindow):
             except mysql.connector.Error as err:
                 print(f"Error: {err}")
             finally:
-                # Close cursor and connection
+                # Close cursor and return connection to the pool
                 cursor.close()
-                connection.close()
+                self.pool.release(connection)
 
     def connect_to_server_and_refresh(self):
         # Connect to the database and refresh controls
         if self.hostname_input.text():
             connection = self.connect_to_server()
             if connection:
+                self.pool.release(connection)
                 self.connection_status_label.setText("Connected")
                 self.connection_status_label.setStyleSheet("color: green")
                 self.populate_database_combo_box()
@@ -511,9 +4386,39 @@ class DatabaseWindow(QMainWindow):
         super().__init__()
 
         self.info = info
+        self.pool = ConnectionPool.from_info(info)  # Shared by every tab and dialog in this window
+        self.executor = QueryExecutor(self.pool, self)  # Runs statements off the GUI thread
+        self.schema_cache = SchemaCache(self.pool)  # Table metadata shared by tabs and dialogs
+        self.session = TransactionSession(self.pool, self)  # Holds a connection while a transaction is open
+        self.session.changed.connect(self.update_transaction_state)
+        self.executor.session = self.session
+        self.result_cache = ResultCache(info[3], self.schema_cache)  # Opt-in, see the Queries menu
+        self.executor.result_cache = self.result_cache
+        self.session.result_cache = self.result_cache
+        self.prompt_position = 0  # Document position where the current console prompt starts
+        self.console_lines = {}  # Task id -> document position of its status line in the console
+        self.console_tasks = set()  # Statements the user started and can cancel
+        self.console_pending = deque()  # Output lines waiting to be rendered
+        self.console_render_timer = QTimer(self)
+        self.console_render_timer.setInterval(0)
+        self.console_render_timer.timeout.connect(self.render_console_output)
+        self.last_truncated_result = None  # Last console result that had rows left out, for Open in Grid
+        self.executor.progress.connect(self.query_progress)
+        self.executor.finished.connect(self.query_done)
+        self.executor.failed.connect(self.query_failed)
         self.setWindowTitle("Database: " + info[3])
         self.setMinimumSize(800, 600)
-        self.query_history = []  # Initialize an empty list to store the query history
+        self.history = QueryHistoryStore()  # Statements run from the console and query dialog, kept across sessions
+        self.page_size = default_page_size
+        self.tab_memory_budget = tab_memory_budget
+        self.tab_usage = OrderedDict()  # Open table tabs, least recently viewed first
+        self.bulk_batch_rows = bulk_batch_rows
+        self.bulk_commit_rows = bulk_commit_rows
+        self.bulk_loaders = []  # Loads in progress
+        self.exporters = []  # Exports in progress
+        self.script_runners = {}  # Task id -> ScriptRunner of scripts in progress
+        self.script_stop_on_error = True
+        self.server_version = None  # Read on first use, (0,) for MariaDB
 
 
         central_widget = QWidget(self)
@@ -542,6 +4447,8 @@ class DatabaseWindow(QMainWindow):
 
         self.console = QTextEdit()
         self.console.setReadOnly(True)
+        self.console.document().setMaximumBlockCount(console_max_blocks)
+        self.console.document().contentsChange.connect(self.console_contents_changed)
         self.toggle_console()  # Initialize console with prompt
 
         splitter.addWidget(horizontal_splitter)
@@ -564,12 +4471,20 @@ class DatabaseWindow(QMainWindow):
         vertical_splitter = splitter.widget(0)
         vertical_splitter.setSizes([100, 240])
 
+        # Database call timings, hidden until opened from the View menu
+        self.performance_dock = QDockWidget("Performance", self)
+        self.performance_dock.setWidget(PerformancePanel(parent=self.performance_dock))
+        self.addDockWidget(Qt.BottomDockWidgetArea, self.performance_dock)
+        self.performance_dock.hide()
+
         self.load_tables()
         self.create_menu()
+        self.create_transaction_toolbar()
 
         self.table_tab_widget.tabCloseRequested.connect(self.close_table_tab)
         self.hierarchy_widget.itemDoubleClicked.connect(self.open_table_tab)
         self.table_tab_widget.currentChanged.connect(self.update_hierarchy_selection)
+        self.table_tab_widget.currentChanged.connect(self.tab_viewed)
 
         self.console.installEventFilter(self)
 
@@ -591,30 +4506,126 @@ class DatabaseWindow(QMainWindow):
             self.console.setReadOnly(False)
 
             # Clear console and add prompt
+            self.console_pending.clear()
             self.console.clear()
-            self.console.insertPlainText("MySQL > ")
-
-            # Set cursor to end of prompt
-            cursor = self.console.textCursor()
-            cursor.movePosition(QTextCursor.End)
-            self.console.setTextCursor(cursor)
+            self.console_lines.clear()
+            self.show_prompt()
         else:
             # Set console back to read-only mode
             self.console.setReadOnly(True)
 
+    def show_prompt(self):
+        # Start a fresh prompt at the end of the console
+        if self.console.document().isEmpty():
+            self.console.insertPlainText(console_prompt)
+        else:
+            self.console.append(console_prompt)
+        self.prompt_position = self.console.document().lastBlock().position()
+
+        # Set cursor to end of prompt
+        cursor = self.console.textCursor()
+        cursor.movePosition(QTextCursor.End)
+        self.console.setTextCursor(cursor)
+
+    def current_command(self):
+        cursor = QTextCursor(self.console.document())
+        cursor.setPosition(min(self.prompt_position + len(console_prompt), self.console.document().characterCount() - 1))
+        cursor.movePosition(QTextCursor.End, QTextCursor.KeepAnchor)
+        return cursor.selectedText().replace("\u2029", "\n").strip()
+
+    def console_contents_changed(self, position, removed, added):
+        # Keep tracked positions in step with text inserted or removed before them
+        if removed == added:
+            return  # Formatting change or same length rewrite, nothing moved
+
+        def shift(marker):
+            if marker < position + removed:
+                return position
+            return marker + added - removed
+
+        if self.prompt_position >= position:
+            self.prompt_position = shift(self.prompt_position)
+        for task_id, line_position in list(self.console_lines.items()):
+            if line_position > position:
+                if line_position < position + removed:
+                    del self.console_lines[task_id]  # The line itself was removed
+                else:
+                    self.console_lines[task_id] = shift(line_position)
+
+    def console_write(self, text):
+        # Output goes above the prompt so a command that is being typed is never split up
+        cursor = QTextCursor(self.console.document())
+        cursor.setPosition(self.prompt_position)
+        start = cursor.position()
+        cursor.insertText(text + "\n")
+        self.console.ensureCursorVisible()
+        return start
+
+    def console_output(self, lines):
+        # Queued lines are rendered a chunk per event loop turn so a long result never freezes the window
+        self.console_pending.extend(lines)
+        if not self.console_render_timer.isActive():
+            self.console_render_timer.start()
+
+    def render_console_output(self):
+        count = min(console_render_chunk, len(self.console_pending))
+        if count:
+            self.console_write("\n".join(self.console_pending.popleft() for _ in range(count)))
+        if not self.console_pending:
+            self.console_render_timer.stop()
+
+    def console_output_result(self, result, shown=None):
+        # Only the first console_max_rows rows go inline, the whole result can still be opened in the grid. shown
+        # is the number of rows already written from the first fetch while the rest of the result was read
+        lines = []
+        if shown is None:
+            if result.cached_at is not None:
+                lines.append(f"(from cache, {format_age(time.time() - result.cached_at)} old)")
+            lines.append("\t".join(map(str, result.headers)))
+            shown = 0
+        rows = result.rows[shown:console_max_rows]
+        lines.extend("\t".join(map(str, row)) for row in rows)
+        hidden = len(result.rows) - shown - len(rows)
+        if hidden:
+            self.last_truncated_result = result
+            lines.append(f"... {hidden:,} more rows \u2014 open in grid with Ctrl+G")
+        self.console_output(lines)
+
+    def open_last_result_in_grid(self):
+        result = self.last_truncated_result
+        if result is None:
+            self.statusBar().showMessage("No truncated console result to open", 3000)
+            return
+        export = None
+        if statement_keyword(result.statement) in read_only_keywords:
+            export = lambda: self.export_query(result.statement)
+        self.display_query_results(result.rows, result.headers, result.elapsed, export, result.cached_at)
+
+    def set_console_line(self, task_id, text):
+        if task_id not in self.console_lines:
+            return
+        block = self.console.document().findBlock(self.console_lines[task_id])
+        if block.position() != self.console_lines[task_id] or not block.text().startswith(f"[#{task_id}]"):
+            del self.console_lines[task_id]  # Scrolled out of the console by newer output
+            return
+        cursor = QTextCursor(self.console.document())
+        cursor.setPosition(self.console_lines[task_id])
+        cursor.movePosition(QTextCursor.EndOfBlock, QTextCursor.KeepAnchor)
+        cursor.insertText(text)
+
     def eventFilter(self, obj, event):
         if obj == self.console and event.type() == QEvent.KeyPress:
             cursor = self.console.textCursor()
-            cursor.movePosition(QTextCursor.End)
+            at_prompt = cursor.position() <= self.prompt_position + len(console_prompt) and not cursor.hasSelection()
 
             if event.key() == Qt.Key_Return and event.modifiers() == Qt.NoModifier:
                 self.execute_sql_command()
                 return True  # Event handled
 
-            elif event.key() == Qt.Key_Backspace and cursor.position() <= len("MySQL > "):
+            elif event.key() == Qt.Key_Backspace and at_prompt:
                 return True  # Prevent deletion of MySQL prompt with Backspace key
 
-            elif event.key() == Qt.Key_Delete and cursor.position() <= len("MySQL > "):
+            elif event.key() == Qt.Key_Delete and cursor.position() < self.prompt_position + len(console_prompt):
                 return True  # Prevent deletion of MySQL prompt with Delete key
 
             elif event.key() == Qt.Key_Escape:
@@ -623,51 +4634,187 @@ class DatabaseWindow(QMainWindow):
         return super().eventFilter(obj, event)
 
     def execute_sql_command(self):
-        command = self.console.toPlainText().split(">")[-1].strip()  # Extract SQL command entered by the user
+        command = self.current_command()  # Extract SQL command entered by the user
         if command:
-            try:
-                connection = mysql.connector.connect(
-                    host=self.info[0],
-                    user=self.info[1],
-                    password=self.info[2],
-                    database=self.info[3]
-                )
+            call_recorder.start_action(f"console: {' '.join(command.split())[:60]}")
+            # Add a new prompt straight away, the command runs in the background
+            self.show_prompt()
+
+            # Pasted scripts run statement by statement on one connection. A single statement runs on its own so its
+            # rows are shown, without the delimiter, DELIMITER lines or a trailing comment
+            statements = split_statements(command)
+            if len(statements) > 1:
+                self.run_script(statements, "pasted script")
+                return
+            if not statements:
+                return  # Only comments
+            command = statements[0]
+
+            # Transaction control goes through the session so the toolbar and later statements know about it
+            control = transaction_control_pattern.match(command)
+            if control:
+                keyword = control.group(1).upper()
+                if keyword == "COMMIT":
+                    self.commit_transaction()
+                elif keyword == "ROLLBACK":
+                    self.rollback_transaction()
+                else:
+                    self.begin_transaction()
+                return
 
-                cursor = connection.cursor()
-                cursor.execute(command)
-                connection.commit()
+            shown = {}
+
+            def show_first_rows(result):
+                # A long result starts showing as soon as its first rows arrive
+                rows = result.rows[:console_max_rows]
+                self.console_output(["\t".join(map(str, result.headers))] +
+                                    ["\t".join(map(str, row)) for row in rows])
+                shown["rows"] = len(rows)
+
+            def show_result(result):
+                self.schema_cache.invalidate_statement(command)
 
                 # Fetch and display results if any
-                if cursor.description:
-                    column_names = [column[0] for column in cursor.description]
-                    rows = cursor.fetchall()
-                    result_text = "\n".join(["\t".join(map(str, row)) for row in [column_names] + list(rows)])
-                    self.console.append(result_text)
+                if result.headers:
+                    self.console_output_result(result, shown.get("rows"))
                 else:
-                    self.console.append("Query executed successfully.")
+                    self.console_output(["Query executed successfully."])
+                self.refresh_after_statement(command)
 
-            except mysql.connector.Error as err:
-                self.console.append(f"Error: {err}")
+            def show_error(message):
+                self.schema_cache.invalidate_statement(command)  # A failed DDL may still have changed something
+                self.console_output([f"Error: {message}"])
 
-            # Add a new prompt for the next command
-            self.console.append("MySQL > ")
-            cursor = self.console.textCursor()
-            cursor.movePosition(QTextCursor.End)
-            self.console.setTextCursor(cursor)
-            self.hierarchy_widget.clear()
-            self.refresh()
+            self.run_in_console(command, show_result, show_error, show_first_rows)
 
-    def refresh(self):
-        self.hierarchy_widget.clear()
+    def run_in_console(self, statement, on_finished, on_failed, on_first_rows=None):
+        started = time.monotonic()
 
-        table_selection_item = QListWidgetItem("Table Selection Window")
-        table_selection_item.setFlags(table_selection_item.flags() & ~Qt.ItemIsSelectable)
-        font = QFont()
-        font.setBold(True)
-        table_selection_item.setFont(font)  # Set font to bold
-        self.hierarchy_widget.addItem(table_selection_item)
+        def finished(result):
+            rows = len(result.rows) if result.headers else max(result.rowcount, 0)
+            self.record_history(statement, result.elapsed, rows)
+            on_finished(result)
 
-        self.load_tables()
+        def failed(message):
+            self.record_history(statement, time.monotonic() - started, error=message)
+            on_failed(message)
+
+        task_id = self.executor.submit(statement, on_finished=finished, on_failed=failed, owner=self,
+                                       on_first_rows=on_first_rows)
+        self.console_tasks.add(task_id)
+        self.console_lines[task_id] = self.console_write(self.console_status(task_id, "running", statement))
+        return task_id
+
+    def record_history(self, statement, duration, rows=None, error=None):
+        try:
+            self.history.record(statement, self.info[3], duration, rows, error)
+        except sqlite3.Error as err:
+            print(f"Error recording query history: {err}")
+
+    def cancel_queries(self):
+        # Table page loads are left alone, they are short and the tab needs them
+        running = [task_id for task_id in self.console_tasks if task_id in self.executor.running]
+        if not running:
+            self.statusBar().showMessage("No running queries to cancel", 3000)
+        for task_id in running:
+            if task_id in self.script_runners:
+                self.script_runners[task_id].stop()
+            self.executor.cancel(task_id)
+
+    def run_script_file(self):
+        file_path, _ = QFileDialog.getOpenFileName(self, "Run Script", "", "SQL Files (*.sql);;All Files (*)")
+        if file_path:
+            try:
+                with open(file_path, encoding="utf-8-sig") as script_file:
+                    statements = split_statements(script_file.read())
+            except (OSError, UnicodeDecodeError) as err:
+                QMessageBox.warning(self, "Error", f"Failed to read script: {err}")
+                return
+            self.run_script(statements, os.path.basename(file_path))
+
+    def run_script(self, statements, label):
+        call_recorder.start_action(f"script {label}")
+        if not statements:
+            return
+        total = len(statements)
+        runner = ScriptRunner(self.session, statements, self.script_stop_on_error)
+        self.console_output([f"Running {label}: {total} statements"])
+
+        def statement_done(index, result):
+            statement, rows, elapsed, error = result
+            self.schema_cache.invalidate_statement(statement)
+            self.record_history(statement, elapsed, rows, error)
+            summary = " ".join(statement.split())
+            if len(summary) > 60:
+                summary = summary[:57] + "..."
+            if error is None:
+                self.console_output([f"  [{index + 1}/{total}] {rows} rows, {elapsed * 1000:.1f} ms: {summary}"])
+            else:
+                self.console_output([f"  [{index + 1}/{total}] failed after {elapsed * 1000:.1f} ms: {summary}",
+                                     f"    Error: {error}"])
+
+        def done(results):
+            self.script_runners.pop(task_id, None)
+            errors = sum(1 for result in results if result[3] is not None)
+            elapsed = sum(result[2] for result in results)
+            ending = "stopped" if len(results) < total else "finished"
+            self.console_output([f"Script {ending}: {len(results)} of {total} statements run, {errors} errors, "
+                                 f"{elapsed:.2f} s"])
+            self.refresh_after_statements([result[0] for result in results])
+
+        def failed(message):
+            self.script_runners.pop(task_id, None)
+            self.console_output([f"Error: {message}"])
+            self.refresh_after_statements([result[0] for result in runner.results])
+
+        runner.statement_done.connect(statement_done)
+        task_id = self.executor.submit(f"SCRIPT {label}", work=runner.run, on_finished=done, on_failed=failed,
+                                       owner=self, stop=runner.stop)
+        self.script_runners[task_id] = runner
+        self.console_tasks.add(task_id)
+
+    def set_script_stop_on_error(self, checked):
+        self.script_stop_on_error = checked
+
+    def set_statement_timeout(self):
+        timeout, ok = QInputDialog.getInt(self, "Statement Timeout",
+                                          "Stop statements after this many seconds (0 for no limit):",
+                                          self.executor.statement_timeout, 0, 86400, 1)
+        if ok:
+            self.executor.statement_timeout = timeout
+
+    def console_status(self, task_id, state, statement, elapsed=None):
+        summary = " ".join(statement.split())
+        if len(summary) > 60:
+            summary = summary[:57] + "..."
+        timing = f" ({elapsed:.1f} s)" if elapsed is not None else ""
+        return f"[#{task_id}] {state}{timing}: {summary}"
+
+    def query_progress(self, task_id, elapsed):
+        task = self.executor.running.get(task_id)
+        if task is not None:
+            self.set_console_line(task_id, self.console_status(task_id, "running", task[0].statement, elapsed))
+
+    def query_done(self, task_id, result):
+        if isinstance(result, QueryResult):
+            rows = f"{len(result.rows)} rows" if result.headers else f"{max(result.rowcount, 0)} rows affected"
+            if result.cached_at is not None:
+                rows += f" from cache, {format_age(time.time() - result.cached_at)} old"
+            self.set_console_line(task_id, self.console_status(task_id, f"done, {rows}", result.statement,
+                                                               result.elapsed))
+        self.console_lines.pop(task_id, None)
+        self.console_tasks.discard(task_id)
+
+    def query_failed(self, task_id, message, elapsed):
+        if task_id in self.console_lines:
+            self.set_console_line(task_id, f"[#{task_id}] failed after {elapsed:.1f} s")
+        self.console_lines.pop(task_id, None)
+        self.console_tasks.discard(task_id)
+
+    def refresh(self):
+        call_recorder.start_action("refresh")
+        self.result_cache.invalidate()  # An explicit refresh always reads from the server
+        self.sync_hierarchy()
 
         # Refresh the data in the current selected table
         current_tab_index = self.table_tab_widget.currentIndex()
@@ -676,6 +4823,147 @@ class DatabaseWindow(QMainWindow):
             if isinstance(current_tab_widget, TableWidget):
                 current_tab_widget.load_table_data()
 
+    def refresh_after_statement(self, statement):
+        self.refresh_after_statements([statement])
+
+    def refresh_after_statements(self, statements):
+        # Only touch what the statements could have changed, each affected tab is reloaded once
+        schema_changed = False
+        reload_all = False
+        changed_tables = set()
+        for statement in statements:
+            keyword = statement_keyword(statement)
+            if keyword in read_only_keywords:
+                continue
+            if keyword in ddl_keywords:
+                schema_changed = True
+                tables = ddl_tables(statement, self.info[3])
+            else:
+                tables = dml_tables(statement, self.info[3])
+                if tables is None:
+                    schema_changed = True  # CALL and friends could have changed anything
+            if tables is None:
+                reload_all = True
+            else:
+                changed_tables.update(tables)
+
+        if schema_changed:
+            self.sync_hierarchy()
+        if reload_all:
+            self.reload_table_tabs()
+        else:
+            for tablename in changed_tables:
+                self.reload_table_tabs(tablename)
+
+    def refresh_table_rows(self, tablename, keys):
+        # Patch just the changed rows into open tabs when their keys are known, otherwise reload those tabs
+        for tab in self.table_tabs(tablename):
+            if keys is None:
+                tab.load_table_data()
+            else:
+                tab.refresh_rows(keys)
+
+    def table_tabs(self, tablename=None):
+        tabs = []
+        for index in range(self.table_tab_widget.count()):
+            tab = self.table_tab_widget.widget(index)
+            if isinstance(tab, TableWidget) and (tablename is None or tab.tablename == tablename):
+                tabs.append(tab)
+        return tabs
+
+    def reload_table_tabs(self, tablename=None):
+        for tab in self.table_tabs(tablename):
+            tab.load_table_structure()
+            tab.load_table_data()
+
+    def sync_hierarchy(self):
+        call_recorder.start_action("sync hierarchy")
+        # Diff SHOW TABLES against the list instead of rebuilding it
+        try:
+            with self.pool.connection() as connection:
+                cursor = connection.cursor()
+                cursor.execute("SHOW TABLES")
+                tables = [table[0] for table in cursor.fetchall()]
+                cursor.close()
+        except mysql.connector.Error as err:
+            QMessageBox.warning(self, "Error", f"Failed to load tables: {err}")
+            return
+
+        current = set(tables)
+        for row in range(self.hierarchy_widget.count() - 1, 0, -1):  # Row 0 is the title item
+            item = self.hierarchy_widget.item(row)
+            if item.text() not in current:
+                self.hierarchy_widget.takeItem(row)
+                for tab in self.table_tabs(item.text()):
+                    self.close_table_tab(self.table_tab_widget.indexOf(tab))
+
+        row = 1
+        for table_name in tables:
+            if row < self.hierarchy_widget.count() and self.hierarchy_widget.item(row).text() == table_name:
+                row += 1
+                continue
+            self.hierarchy_widget.insertItem(row, table_name)
+            row += 1
+
+    def create_transaction_toolbar(self):
+        toolbar = self.addToolBar("Transaction")
+
+        self.begin_action = QAction('Begin', self)
+        self.begin_action.setToolTip("Start a transaction, changes are held until Commit")
+        self.begin_action.triggered.connect(self.begin_transaction)
+        toolbar.addAction(self.begin_action)
+
+        self.commit_action = QAction('Commit', self)
+        self.commit_action.triggered.connect(self.commit_transaction)
+        toolbar.addAction(self.commit_action)
+
+        self.rollback_action = QAction('Rollback', self)
+        self.rollback_action.triggered.connect(self.rollback_transaction)
+        toolbar.addAction(self.rollback_action)
+
+        self.transaction_label = QLabel()
+        self.transaction_label.setContentsMargins(8, 0, 8, 0)
+        toolbar.addWidget(self.transaction_label)
+        self.update_transaction_state()
+
+    def update_transaction_state(self):
+        in_transaction = self.session.in_transaction()
+        self.begin_action.setEnabled(not in_transaction)
+        self.commit_action.setEnabled(in_transaction)
+        self.rollback_action.setEnabled(in_transaction)
+        if not in_transaction:
+            self.transaction_label.setText("Auto-commit")
+            self.transaction_label.setStyleSheet("")
+        elif self.session.pending:
+            self.transaction_label.setText(f"Transaction open, {self.session.pending} pending changes")
+            self.transaction_label.setStyleSheet("color: orange")
+        else:
+            self.transaction_label.setText("Transaction open, no changes yet")
+            self.transaction_label.setStyleSheet("color: green")
+
+    def begin_transaction(self):
+        try:
+            self.session.begin()
+            self.console_output(["Transaction started, changes are held until COMMIT."])
+        except mysql.connector.Error as err:
+            QMessageBox.warning(self, "Error", f"Failed to start transaction: {err}")
+
+    def commit_transaction(self):
+        # Runs on the executor, the session waits for any statement still using the connection
+        self.executor.submit("COMMIT", work=self.session.commit_transaction, owner=self,
+                             on_finished=lambda pending: self.console_output([f"Committed {pending} changes."]),
+                             on_failed=lambda message: QMessageBox.warning(self, "Error",
+                                                                           f"Failed to commit: {message}"))
+
+    def rollback_transaction(self):
+        def done(pending):
+            self.console_output([f"Rolled back {pending} changes."])
+            self.reload_table_tabs()  # Tabs were showing the uncommitted rows
+
+        self.executor.submit("ROLLBACK", work=self.session.rollback_transaction, owner=self, on_finished=done,
+                             on_failed=lambda message: QMessageBox.warning(self, "Error",
+                                                                           f"Failed to roll back: {message}"))
+
     def create_menu(self):
         menu_bar = self.menuBar()
 
@@ -699,6 +4987,26 @@ class DatabaseWindow(QMainWindow):
         refresh_action.triggered.connect(self.refresh)
         file_menu.addAction(refresh_action)
 
+        page_size_action = QAction('Set Page Size', self)
+        page_size_action.triggered.connect(self.set_page_size)
+        file_menu.addAction(page_size_action)
+
+        tab_budget_action = QAction('Set Tab Memory Budget', self)
+        tab_budget_action.triggered.connect(self.set_tab_memory_budget)
+        file_menu.addAction(tab_budget_action)
+
+        pool_stats_action = QAction('Connection Pool Stats', self)
+        pool_stats_action.triggered.connect(self.show_pool_stats)
+        file_menu.addAction(pool_stats_action)
+
+        schema_cache_stats_action = QAction('Schema Cache Stats', self)
+        schema_cache_stats_action.triggered.connect(self.show_schema_cache_stats)
+        file_menu.addAction(schema_cache_stats_action)
+
+        result_cache_stats_action = QAction('Result Cache Stats', self)
+        result_cache_stats_action.triggered.connect(self.show_result_cache_stats)
+        file_menu.addAction(result_cache_stats_action)
+
         view_menu = menu_bar.addMenu("View")
 
         toggle_hierarchy_action = QAction("Toggle Hierarchy", self)
@@ -713,6 +5021,10 @@ class DatabaseWindow(QMainWindow):
         toggle_console_action.triggered.connect(self.toggle_console)
         view_menu.addAction(toggle_console_action)
 
+        performance_action = self.performance_dock.toggleViewAction()
+        performance_action.setText("Performance Panel")
+        view_menu.addAction(performance_action)
+
         create_menu = menu_bar.addMenu('&Tables')
 
         create_table_action = QAction('Create Table', self)
@@ -741,12 +5053,62 @@ class DatabaseWindow(QMainWindow):
         insert_row_action.triggered.connect(self.insert_data)
         data_menu.addAction(insert_row_action)
 
+        export_table_action = QAction('Export Table', self)
+        export_table_action.triggered.connect(self.export_table)
+        data_menu.addAction(export_table_action)
+
         query_menu = menu_bar.addMenu('&Queries')
 
         query_action = QAction('Execute Query', self)
         query_action.triggered.connect(self.execute_query)
         query_menu.addAction(query_action)
 
+        explain_action = QAction('Explain Query', self)
+        explain_action.setShortcut('Ctrl+E')
+        explain_action.triggered.connect(lambda: self.explain_query(False))
+        query_menu.addAction(explain_action)
+
+        explain_analyze_action = QAction('Explain Analyze Query', self)
+        explain_analyze_action.setShortcut('Ctrl+Shift+E')
+        explain_analyze_action.triggered.connect(lambda: self.explain_query(True))
+        query_menu.addAction(explain_analyze_action)
+
+        run_script_action = QAction('Run Script', self)
+        run_script_action.triggered.connect(self.run_script_file)
+        query_menu.addAction(run_script_action)
+
+        stop_on_error_action = QAction('Stop Script on Error', self)
+        stop_on_error_action.setCheckable(True)
+        stop_on_error_action.setChecked(self.script_stop_on_error)
+        stop_on_error_action.triggered.connect(self.set_script_stop_on_error)
+        query_menu.addAction(stop_on_error_action)
+
+        cancel_query_action = QAction('Cancel Running Queries', self)
+        cancel_query_action.setShortcut('Ctrl+Shift+X')
+        cancel_query_action.triggered.connect(self.cancel_queries)
+        query_menu.addAction(cancel_query_action)
+
+        open_in_grid_action = QAction('Open Last Result in Grid', self)
+        open_in_grid_action.setShortcut('Ctrl+G')
+        open_in_grid_action.triggered.connect(self.open_last_result_in_grid)
+        query_menu.addAction(open_in_grid_action)
+
+        cache_results_action = QAction('Cache Query Results', self)
+        cache_results_action.setCheckable(True)
+        cache_results_action.setChecked(self.result_cache.enabled)
+        cache_results_action.triggered.connect(self.set_result_cache_enabled)
+        query_menu.addAction(cache_results_action)
+
+        check_update_time_action = QAction('Check Cached Results Against Update Time', self)
+        check_update_time_action.setCheckable(True)
+        check_update_time_action.setChecked(self.result_cache.check_update_time)
+        check_update_time_action.triggered.connect(self.set_result_cache_check_update_time)
+        query_menu.addAction(check_update_time_action)
+
+        statement_timeout_action = QAction('Statement Timeout', self)
+        statement_timeout_action.triggered.connect(self.set_statement_timeout)
+        query_menu.addAction(statement_timeout_action)
+
         query_history_action = QAction('Query History', self)
         query_history_action.triggered.connect(self.show_query_history)
         query_menu.addAction(query_history_action)
@@ -761,99 +5123,181 @@ class DatabaseWindow(QMainWindow):
         upload_table_action.triggered.connect(self.upload_table)
         upload_menu.addAction(upload_table_action)
 
+        upload_settings_action = QAction('Upload Settings', self)
+        upload_settings_action.triggered.connect(self.set_upload_settings)
+        upload_menu.addAction(upload_settings_action)
+
+    def set_page_size(self):
+        page_size, ok = QInputDialog.getInt(self, "Page Size", "Rows fetched per page when scrolling a table:",
+                                            self.page_size, 50, 1000000, 100)
+        if ok:
+            self.page_size = page_size
+            for index in range(self.table_tab_widget.count()):
+                tab = self.table_tab_widget.widget(index)
+                if isinstance(tab, TableWidget):
+                    tab.set_page_size(page_size)
+
+    def show_pool_stats(self):
+        QMessageBox.information(self, "Connection Pool", self.pool.stats_text())
+
+    def show_schema_cache_stats(self):
+        QMessageBox.information(self, "Schema Cache", self.schema_cache.stats_text())
+
+    def show_result_cache_stats(self):
+        QMessageBox.information(self, "Result Cache", self.result_cache.stats_text())
+
+    def set_result_cache_enabled(self, checked):
+        self.result_cache.enabled = checked
+        if not checked:
+            self.result_cache.invalidate()  # Free the memory held by cached results
+
+    def set_result_cache_check_update_time(self, checked):
+        self.result_cache.check_update_time = checked
+        self.result_cache.invalidate()  # Older entries have no update times to compare against
+
+    def closeEvent(self, event):
+        if self.session.in_transaction():
+            answer = QMessageBox.question(self, "Open Transaction",
+                                          f"Commit {self.session.pending} pending changes before closing?",
+                                          QMessageBox.Yes | QMessageBox.No | QMessageBox.Cancel)
+            if answer == QMessageBox.Cancel:
+                event.ignore()
+                return
+            try:
+                self.session.end(answer == QMessageBox.Yes)
+            except mysql.connector.Error as err:
+                print(f"Error: {err}")
+        self.executor.thread_pool.clear()  # Drop queued statements, running ones finish on their own
+        self.pool.close()
+        self.history.close()
+        super().closeEvent(event)
+
     def open_database(self):
         event = QKeyEvent(QEvent.KeyPress, Qt.Key_Escape, Qt.NoModifier)
         QCoreApplication.sendEvent(self, event)
 
 
     def execute_query_command(self, query):
+        self.run_query(query.strip())
+
+    def explain_query_command(self, query, analyze=False):
+        call_recorder.start_action("explain")
+        # Runs EXPLAIN FORMAT=JSON, then EXPLAIN ANALYZE when asked for and the server has it, through the
+        # console so both can be timed out and cancelled like any other statement
+        query = query.strip().rstrip(";").strip()
+        if statement_keyword(query) in ("EXPLAIN", "DESCRIBE", "DESC"):
+            query = re.sub(r"^\s*(EXPLAIN|DESCRIBE|DESC)(\s+(ANALYZE|FORMAT\s*=\s*\w+))*\s+", "",
+                           strip_leading_comments(query), flags=re.IGNORECASE)
+        if not query:
+            return
+        if analyze and not self.server_supports_explain_analyze():
+            QMessageBox.information(self, "Explain", "EXPLAIN ANALYZE needs MySQL 8.0.18 or later, "
+                                                     "showing the estimated plan only.")
+            analyze = False
+        if analyze and statement_keyword(query) not in ("SELECT", "TABLE"):
+            QMessageBox.information(self, "Explain", "EXPLAIN ANALYZE runs the statement, so it is only used for "
+                                                     "SELECT queries. Showing the estimated plan only.")
+            analyze = False
+
+        def show_error(message):
+            QMessageBox.warning(self, "Error", f"Failed to explain query: {message}")
+
+        def show_plan(plan_result):
+            plan_json = str(as_text(plan_result.rows[0][0])) if plan_result.rows else ""
+            if not analyze:
+                ExplainWindow(query, plan_json, None, self).exec_()
+                return
+
+            def show_analyzed_plan(analyze_result):
+                analyze_text = str(as_text(analyze_result.rows[0][0])) if analyze_result.rows else ""
+                ExplainWindow(query, plan_json, analyze_text, self).exec_()
+
+            self.run_in_console(f"EXPLAIN ANALYZE {query}", show_analyzed_plan, show_error)
+
+        self.run_in_console(f"EXPLAIN FORMAT=JSON {query}", show_plan, show_error)
+
+    def server_supports_explain_analyze(self):
+        if self.server_version is None:
+            try:
+                with self.pool.connection() as connection:
+                    mariadb = "mariadb" in connection.get_server_info().lower()
+                    self.server_version = (0,) if mariadb else tuple(connection.get_server_version())
+            except mysql.connector.Error as err:
+                print(f"Error: {err}")
+                return False
+        return self.server_version >= (8, 0, 18)
+
+    def explain_query(self, analyze=False):
+        # Explains what is typed at the console prompt, or asks for a query when the prompt is empty
+        query = self.current_command() if self.console.isVisible() else ""
+        query, ok = QInputDialog.getMultiLineText(self, "Explain Analyze" if analyze else "Explain",
+                                                  "Query to explain:", query)
+        if ok and query.strip():
+            self.explain_query_command(query, analyze)
 
-        try:
-            connection = mysql.connector.connect(
-                host=self.info[0],
-                user=self.info[1],
-                password=self.info[2],
-                database=self.info[3]
-            )
-
-            cursor = connection.cursor()
-            cursor.execute(query)
-            self.query_history.append(query.strip())
-
-            # Fetch all results before executing another query
-            rows = cursor.fetchall()
-            description = cursor.description
-
-            connection.commit()
-            cursor.close()
-
-            # Fetch query results and display them in a new window
-            self.display_query_results(rows, description)
-
-            # Refresh the data after a successful query execution
-            self.refresh()
-
-        except mysql.connector.Error as err:
-            QMessageBox.warning(self, "Error", f"Failed to execute query: {err}")
     def execute_query(self):
         query, ok = QInputDialog.getText(self, "Execute Query", "Enter your SQL query:")
         if ok and query.strip():
-            try:
-                connection = mysql.connector.connect(
-                    host=self.info[0],
-                    user=self.info[1],
-                    password=self.info[2],
-                    database=self.info[3]
-                )
-
-                cursor = connection.cursor()
-                cursor.execute(query)
-                self.query_history.append(query)
-
-                # Fetch all results before executing another query
-                rows = cursor.fetchall()
-                description = cursor.description
-
-                connection.commit()
-                cursor.close()
+            self.run_query(query)
+
+    def run_query(self, query):
+        call_recorder.start_action(f"query: {' '.join(query.split())[:60]}")
+        def show_result(result):
+            self.schema_cache.invalidate_statement(query)
+
+            # Display query results in a new window
+            if result.headers:
+                # Only statements without side effects are safe to run again for an export
+                export = None
+                if statement_keyword(query) in read_only_keywords:
+                    export = lambda: self.export_query(query)
+                self.display_query_results(result.rows, result.headers, result.elapsed, export, result.cached_at)
+            else:
+                QMessageBox.information(self, "Success", f"Query executed successfully, "
+                                                         f"{max(result.rowcount, 0)} rows affected.")
 
-                # Fetch query results and display them in a new window
-                self.display_query_results(rows, description)
+            # Refresh whatever the query could have changed
+            self.refresh_after_statement(query)
 
-                # Refresh the data after a successful query execution
-                self.refresh()
+        def show_error(message):
+            self.schema_cache.invalidate_statement(query)  # A failed DDL may still have changed something
+            QMessageBox.warning(self, "Error", f"Failed to execute query: {message}")
 
-            except mysql.connector.Error as err:
-                QMessageBox.warning(self, "Error", f"Failed to execute query: {err}")
+        # The query runs on a worker thread, progress is shown in the console
+        self.run_in_console(query, show_result, show_error)
 
-    def display_query_results(self, rows, description):
-        query_window = QueryWindow(self)
-        headers = [column[0] for column in description]
+    def display_query_results(self, rows, headers, elapsed=None, export=None, cached_at=None):
+        query_window = QueryWindow(self, export)
         query_window.set_data(rows, headers)
+        if cached_at is not None:
+            query_window.setWindowTitle(f"Query Results ({len(rows)} rows from cache, "
+                                        f"{format_age(time.time() - cached_at)} old)")
+        elif elapsed is not None:
+            query_window.setWindowTitle(f"Query Results ({len(rows)} rows in {elapsed:.2f} s)")
         query_window.exec_()
     def clear_console(self):
+        self.console_pending.clear()
         self.console.clear()
+        self.console_lines.clear()
+        self.show_prompt()
 
     def clear_query_history(self):
-        self.query_history.clear()  # Clear the query history list
+        confirm = QMessageBox.question(self, "Clear Query History",
+                                       f"Delete the query history of '{self.info[3]}'?", QMessageBox.Yes | QMessageBox.No)
+        if confirm == QMessageBox.Yes:
+            self.history.clear(self.info[3])
 
     def show_query_history(self):
-        dialog = QueryHistoryDialog(self)
-        dialog.load_query_history(self.query_history)  # Pass the query history list to the dialog
+        dialog = QueryHistoryDialog(self.history, self.info[3], self)
         dialog.exec_()
 
     def load_tables(self):
+        call_recorder.start_action("load tables")
         try:
-            connection = mysql.connector.connect(
-                host=self.info[0],
-                user=self.info[1],
-                password=self.info[2],
-                database=self.info[3]
-            )
-
-            cursor = connection.cursor()
-            cursor.execute("SHOW TABLES")
-            tables = cursor.fetchall()
+            with self.pool.connection() as connection:
+                cursor = connection.cursor()
+                cursor.execute("SHOW TABLES")
+                tables = cursor.fetchall()
 
             for table in tables:
                 table_name = table[0]
@@ -873,38 +5317,39 @@ class DatabaseWindow(QMainWindow):
                 # Open the InsertDataDialog with column information
                 dialog = InsertDataDialog(current_tab_widget.tablename, self.info, column_info)
                 if dialog.exec_():
+                    call_recorder.start_action(f"insert row {current_tab_widget.tablename}")
                     data = dialog.get_data()
+
+                    # If a primary key is auto-incremented and left empty, do not include it in the insert statement
+                    auto_increment_columns = current_tab_widget.get_auto_increment_columns()
+                    data = {column: value for column, value in data.items()
+                            if not (column in auto_increment_columns and value == "")}
+
                     # Prepare column names and values for the INSERT statement
                     columns = ', '.join(data.keys())
                     values = ', '.join(f"'{value}'" if value is not None else "NULL" for value in data.values())
 
-                    # Check for primary keys and foreign keys
-                    primary_keys = current_tab_widget.get_primary_keys()
-                    foreign_keys = current_tab_widget.get_foreign_keys()
-
-                    # If a primary key is auto-incremented, do not include it in the insert statement
-                    for key in primary_keys:
-                        if key["auto_increment"]:
-                            columns = columns.replace(key["column_name"], "")
-                            values = values.replace("NULL", "")
-
                     # Construct the INSERT statement
                     insert_query = f"INSERT INTO {current_tab_widget.tablename} ({columns}) VALUES ({values})"
 
                     try:
                         # Execute the INSERT statement
-                        connection = mysql.connector.connect(
-                            host=self.info[0],
-                            user=self.info[1],
-                            password=self.info[2],
-                            database=self.info[3]
-                        )
-                        cursor = connection.cursor()
-                        cursor.execute(insert_query)
-                        connection.commit()
-                        connection.close()
+                        with self.session.connection() as connection:
+                            cursor = connection.cursor()
+                            cursor.execute(insert_query)
+                            last_row_id = cursor.lastrowid
+                            self.session.commit(connection, insert_query)
                         QMessageBox.information(self, "Success", "Data inserted successfully.")
-                        self.refresh()
+
+                        # Work out the new row's key so only that row is fetched back
+                        primary_keys = current_tab_widget.get_primary_keys()
+                        if primary_keys and all(key in data for key in primary_keys):
+                            key = tuple(data[key] for key in primary_keys)
+                        elif len(primary_keys) == 1 and primary_keys[0] in auto_increment_columns and last_row_id:
+                            key = (last_row_id,)
+                        else:
+                            key = None
+                        self.refresh_table_rows(current_tab_widget.tablename, None if key is None else [key])
                     except mysql.connector.Error as err:
                         QMessageBox.warning(self, "Error", f"Failed to insert data: {err}")
             else:
@@ -917,10 +5362,12 @@ class DatabaseWindow(QMainWindow):
         if current_tab_index != -1:
             current_tab_widget = self.table_tab_widget.currentWidget()
             if isinstance(current_tab_widget, TableWidget):
-                dialog = DeleteRowDialog(current_tab_widget.tablename, self.info, self)
+                dialog = DeleteRowDialog(current_tab_widget.tablename, self.session, self,
+                                         current_tab_widget.get_primary_keys())
                 dialog.exec_()
-                self.refresh()
-                QMessageBox.information(self, "Title", "DELETE successful", QMessageBox.Ok)
+                if dialog.executed:
+                    self.refresh_table_rows(current_tab_widget.tablename, dialog.affected_keys)
+                    QMessageBox.information(self, "Title", "DELETE successful", QMessageBox.Ok)
 
 
             else:
@@ -933,28 +5380,77 @@ class DatabaseWindow(QMainWindow):
         if current_tab_index != -1:
             current_tab_widget = self.table_tab_widget.currentWidget()
             if isinstance(current_tab_widget, TableWidget):
-                dialog = ModifyRowDialog(current_tab_widget.tablename, self.info, self)
+                dialog = ModifyRowDialog(current_tab_widget.tablename, self.session, self,
+                                         current_tab_widget.get_primary_keys())
                 dialog.exec_()
-                self.refresh()
+                if dialog.executed:
+                    self.refresh_table_rows(current_tab_widget.tablename, dialog.affected_keys)
 
             else:
                 QMessageBox.warning(self, "Error", "Please select a table tab.")
         else:
             QMessageBox.warning(self, "Error", "Please select a table tab.")
     def close_table_tab(self, index):
+        tab = self.table_tab_widget.widget(index)
+        if isinstance(tab, TableWidget) and tab.model.edits:
+            answer = QMessageBox.question(self, "Unsaved Changes",
+                                          f"Discard {tab.model.edited_cells()} unsaved cell changes in "
+                                          f"{tab.tablename}?", QMessageBox.Yes | QMessageBox.No)
+            if answer != QMessageBox.Yes:
+                return
         self.table_tab_widget.removeTab(index)
+        if isinstance(tab, TableWidget):
+            self.tab_usage.pop(tab, None)
+            tab.deleteLater()  # removeTab only hides the widget, its rows would stay in memory
+
+    def tab_viewed(self, index):
+        tab = self.table_tab_widget.widget(index)
+        if isinstance(tab, TableWidget):
+            self.tab_usage[tab] = None
+            self.tab_usage.move_to_end(tab)
+            self.enforce_tab_budget()
+
+    def enforce_tab_budget(self):
+        # Least recently viewed tabs give up their rows until the open tabs fit the budget, the tab on screen
+        # is never emptied
+        current = self.table_tab_widget.currentWidget()
+        sizes = [(tab, tab.data_size()) for tab in self.tab_usage if tab.data_loaded]
+        total = sum(size for _, size in sizes)
+        released = []
+        for tab, size in sizes:
+            if total <= self.tab_memory_budget:
+                break
+            if tab is not current:
+                tab.release_rows()
+                total -= size
+                released.append(tab.tablename)
+        if released:
+            self.statusBar().showMessage(f"Released the rows of {', '.join(released)} to stay under the tab "
+                                         f"memory budget, they are read again when shown", 5000)
+
+    def set_tab_memory_budget(self):
+        budget, ok = QInputDialog.getInt(self, "Tab Memory Budget", "Memory the rows of open table tabs may use (MB):",
+                                         self.tab_memory_budget // (1024 * 1024), 16, 1024 * 1024, 64)
+        if ok:
+            self.tab_memory_budget = budget * 1024 * 1024
+            self.enforce_tab_budget()
 
     def open_table_tab(self, item):
         table_name = item.text()
+        call_recorder.start_action(f"open tab {table_name}")
         for index in range(self.table_tab_widget.count()):
             if self.table_tab_widget.tabText(index) == table_name:
                 # If the tab already exists, set the current widget to the existing one
                 self.table_tab_widget.setCurrentIndex(index)
-                self.refresh()
                 return  # Exit the method once the tab is set
 
         # If the tab doesn't exist, create a new one and set it as the current widget
-        table_widget = TableWidget(table_name, self.info)
+        # Tabs read through the session so they show changes that are still pending in a transaction
+        table_widget = TableWidget(table_name, self.session, self.page_size, self.executor, self.schema_cache,
+                                   self.result_cache)
+        # Rows are read when the tab is first shown, growing tabs are checked against the memory budget
+        table_widget.model.loaded.connect(self.enforce_tab_budget)
+        table_widget.model.rowsInserted.connect(lambda *_: self.enforce_tab_budget())
         self.table_tab_widget.addTab(table_widget, table_name)
         self.table_tab_widget.setCurrentWidget(table_widget)
 
@@ -964,42 +5460,43 @@ class DatabaseWindow(QMainWindow):
             table_name, columns = create_table_window.get_table_data()
             if table_name and columns:
                 self.create_table_in_database(table_name, columns)
-                self.refresh()
+                self.sync_hierarchy()
 
     def create_table_in_database(self, table_name, columns):
+        call_recorder.start_action(f"create table {table_name}")
         try:
-            connection = mysql.connector.connect(
-                host=self.info[0],
-                user=self.info[1],
-                password=self.info[2],
-                database=self.info[3]
-            )
-            cursor = connection.cursor()
             column_definitions = []
             for column in columns:
                 key_type, data_type, column_name, not_null = column
-                column_definition = f"{column_name} {data_type}"
+                column_definition = f"{quote_identifier(column_name)} {data_type}"
                 if key_type:
                     column_definition += f" {key_type}"
                 if not_null:
                     column_definition += " NOT NULL"
                 column_definitions.append(column_definition)
             query = f"CREATE TABLE {table_name} ({', '.join(column_definitions)})"
-            cursor.execute(query)
-            connection.commit()
+            with self.session.connection() as connection:
+                cursor = connection.cursor()
+                cursor.execute(query)
+                self.session.commit(connection, query)
+            self.schema_cache.invalidate(table_name)
             QMessageBox.information(self, "Success", "Table created successfully.")
-            connection.close()
+            return True
         except mysql.connector.Error as err:
             QMessageBox.warning(self, "Error", f"Failed to create table: {err}")
+            return False
 
     def alter_table(self):
         current_item = self.hierarchy_widget.currentItem()
         if current_item:
             table_name = current_item.text()
-            alter_table_window = AlterTableWindow(table_name, self.info, self)
-            if alter_table_window.exec_() == QDialog.Accepted:
-                # Perform any necessary actions after alteration
-                self.refresh()
+            alter_table_window = AlterTableWindow(table_name, self.session, self)
+            accepted = alter_table_window.exec_() == QDialog.Accepted
+            # DDL isn't transactional, a failed alter may still have applied some columns
+            self.schema_cache.invalidate(table_name)
+            if accepted:
+                # Only the altered table's tabs need reloading
+                self.reload_table_tabs(table_name)
         else:
             QMessageBox.warning(self, "Error", "Please select a table to alter.")
     def delete_table(self):
@@ -1008,18 +5505,15 @@ class DatabaseWindow(QMainWindow):
             table_name = current_item.text()
             confirm = QMessageBox.question(self, "Confirm Deletion", f"Are you sure you want to delete the table '{table_name}'?", QMessageBox.Yes | QMessageBox.No)
             if confirm == QMessageBox.Yes:
+                call_recorder.start_action(f"delete table {table_name}")
                 try:
-                    connection = mysql.connector.connect(
-                        host=self.info[0],
-                        user=self.info[1],
-                        password=self.info[2],
-                        database=self.info[3]
-                    )
-
-                    cursor = connection.cursor()
-                    cursor.execute(f"DROP TABLE {table_name}")
-                    connection.commit()
-                    self.refresh()
+                    with self.session.connection() as connection:
+                        cursor = connection.cursor()
+                        query = f"DROP TABLE {table_name}"
+                        cursor.execute(query)
+                        self.session.commit(connection, query)
+                    self.schema_cache.invalidate(table_name)
+                    self.sync_hierarchy()  # Also closes the dropped table's tab
                     QMessageBox.information(self, "Success", "Table deleted successfully.")
 
                 except mysql.connector.Error as err:
@@ -1030,69 +5524,183 @@ class DatabaseWindow(QMainWindow):
     def upload_table(self):
         file_path, _ = QFileDialog.getOpenFileName(self, "Select File", "", "CSV Files (*.csv);;Excel Files (*.xlsx)")
         if file_path:
+            if not file_path.endswith(('.csv', '.xlsx')):
+                QMessageBox.warning(self, "Error", "Unsupported file format")
+                return
+
+            default_name = os.path.splitext(os.path.basename(file_path))[0]
+            table_name, ok = QInputDialog.getText(self, "Upload Table", "Load rows into table:", text=default_name)
+            table_name = table_name.strip()
+            if not ok or not table_name:
+                return
             try:
-                # Read data from file
-                if file_path.endswith('.csv'):
-                    data = pd.read_csv(file_path)
-                elif file_path.endswith('.xlsx'):
-                    data = pd.read_excel(file_path)
-                else:
-                    QMessageBox.warning(self, "Error", "Unsupported file format")
+                self.schema_cache.columns(table_name)
+            except mysql.connector.Error:
+                table_name = self.create_table_from_file(file_path, table_name)
+                if not table_name:
                     return
 
-                # Process and upload data to the database
-                self.upload_data_to_database(data)
-                self.refresh()
-
-                QMessageBox.information(self, "Success", "Table uploaded successfully")
-
-            except Exception as e:
-                QMessageBox.warning(self, "Error", f"Failed to upload table: {str(e)}")
-
-    def upload_data_to_database(self, data):
+            # Offer to carry on from the last committed chunk of an earlier failed or stopped load
+            resume = False
+            rows_committed = BulkLoader.pending_checkpoint(file_path, table_name)
+            if rows_committed:
+                answer = QMessageBox.question(self, "Resume Upload",
+                                              f"{rows_committed:,} rows of this file were already loaded into "
+                                              f"'{table_name}'. Resume from there?",
+                                              QMessageBox.Yes | QMessageBox.No)
+                resume = answer == QMessageBox.Yes
+
+            self.upload_data_to_database(file_path, table_name, resume)
+
+    def create_table_from_file(self, file_path, table_name):
+        # Offers a CREATE TABLE form prefilled with column types inferred from a sample of the file
+        answer = QMessageBox.question(self, "Upload Table", f"Table '{table_name}' doesn't exist. "
+                                                            "Create it from the file's columns?",
+                                      QMessageBox.Yes | QMessageBox.No)
+        if answer != QMessageBox.Yes:
+            return None
         try:
-            # Establish connection to the database
-            connection = mysql.connector.connect(
-                host=self.info[0],
-                user=self.info[1],
-                password=self.info[2],
-                database=self.info[3]
-            )
-
-            # Create a cursor object
-            cursor = connection.cursor()
+            QApplication.setOverrideCursor(Qt.WaitCursor)
+            try:
+                sample = read_sample(file_path)
+                columns = infer_table_columns(sample)
+            finally:
+                QApplication.restoreOverrideCursor()
+        except Exception as err:
+            QMessageBox.warning(self, "Error", f"Failed to read file: {err}")
+            return None
 
-            # UPLOAD FUNCTION ISNT IMPLEMENTED YET, BUT WHEN IT IS IT WILL GO HERE
+        create_table_window = CreateTableWindow(self)
+        create_table_window.setWindowTitle(f"Create Table from {os.path.basename(file_path)} "
+                                           f"({len(sample):,} rows sampled)")
+        create_table_window.prefill(table_name, columns)
+        if create_table_window.exec_() != QDialog.Accepted:
+            return None
+        table_name, columns = create_table_window.get_table_data()
+        if not self.create_table_in_database(table_name, columns):
+            return None
+        self.sync_hierarchy()
+        return table_name
+
+    def upload_data_to_database(self, file_path, table_name, resume=False):
+        call_recorder.start_action(f"upload {table_name}")
+        loader = BulkLoader(self.pool, file_path, table_name, self.bulk_batch_rows, self.bulk_commit_rows, resume)
+        if not resume:
+            loader.clear_checkpoint()
+
+        progress = QProgressDialog(f"Loading {os.path.basename(file_path)} into {table_name}...", "Stop", 0, 0, self)
+        progress.setWindowTitle("Upload Table")
+        progress.setMinimumDuration(0)
+        loader.progress.connect(lambda rows, rate: progress.setLabelText(
+            f"Loading {os.path.basename(file_path)} into {table_name}...\n{rows:,} rows loaded ({rate:,.0f} rows/s)"))
+        progress.canceled.connect(loader.stop)
+        loader.fell_back.connect(lambda error: self.statusBar().showMessage(
+            f"LOAD DATA LOCAL INFILE failed, loading with batched INSERTs instead: {error}"))
+        loader.skipped.connect(lambda rows, warning: self.statusBar().showMessage(
+            f"{rows:,} rows skipped by the server so far: {warning}"))
+        started = time.monotonic()
+
+        def done(rows):
+            self.bulk_loaders.remove(loader)
+            progress.close()
+            self.result_cache.invalidate({table_name})
+            self.reload_table_tabs(table_name)
+            if loader.stopped:
+                QMessageBox.information(self, "Upload Stopped", f"Stopped after {rows:,} rows. "
+                                                                "Upload the file again to resume.")
+            else:
+                message = (f"Loaded {rows:,} rows into {table_name} in {time.monotonic() - started:.1f} s "
+                           f"({loader.method}).")
+                if loader.fallback_error is not None:
+                    message += f"\n\nLOAD DATA LOCAL INFILE failed, so the rest was loaded with batched INSERTs: " \
+                               f"{loader.fallback_error}"
+                if loader.rows_skipped:
+                    message += f"\n\n{loader.rows_skipped:,} rows of the file were skipped by the server:\n" + \
+                               "\n".join(loader.warnings)
+                QMessageBox.information(self, "Success", message)
+
+        def failed(message):
+            self.bulk_loaders.remove(loader)
+            progress.close()
+            self.result_cache.invalidate({table_name})
+            self.reload_table_tabs(table_name)
+            QMessageBox.warning(self, "Error", f"Failed to upload table: {message}\n\n"
+                                               f"{loader.rows_committed:,} rows were committed, upload the file "
+                                               "again to resume from there.")
+
+        # Keep the loader alive until the worker is done with it
+        self.bulk_loaders.append(loader)
+        self.executor.submit(f"LOAD {table_name} FROM {os.path.basename(file_path)}", work=loader.run,
+                             on_finished=done, on_failed=failed, owner=self, stop=loader.stop)
+
+    def set_upload_settings(self):
+        batch_rows, ok = QInputDialog.getInt(self, "Upload Settings", "Rows per multi-row INSERT:",
+                                             self.bulk_batch_rows, 1, 100000, 100)
+        if not ok:
+            return
+        commit_rows, ok = QInputDialog.getInt(self, "Upload Settings", "Rows per transaction:",
+                                              self.bulk_commit_rows, batch_rows, 10000000, 1000)
+        if ok:
+            self.bulk_batch_rows = batch_rows
+            self.bulk_commit_rows = commit_rows
+
+    def export_table(self):
+        current_tab_widget = self.table_tab_widget.currentWidget()
+        if isinstance(current_tab_widget, TableWidget):
+            tablename = current_tab_widget.tablename
+            self.export_query(f"SELECT * FROM {quote_identifier(tablename)}", tablename)
+        else:
+            QMessageBox.warning(self, "Error", "Please select a table tab.")
 
-            connection.commit()
+    def export_query(self, query, default_name="results"):
+        call_recorder.start_action(f"export {default_name}")
+        file_filters = ["CSV Files (*.csv)", "JSON Lines Files (*.jsonl)"]
+        if pyarrow is not None:
+            file_filters.append("Parquet Files (*.parquet)")
+        file_path, file_filter = QFileDialog.getSaveFileName(self, "Export", default_name + ".csv",
+                                                             ";;".join(file_filters))
+        if not file_path:
+            return
+        if os.path.splitext(file_path)[1].lower() not in ResultExporter.formats:
+            file_path += file_filter[file_filter.index("*") + 1:-1]  # Extension of the chosen filter
+
+        exporter = ResultExporter(self.pool, query, file_path)
+        progress = QProgressDialog(f"Exporting to {os.path.basename(file_path)}...", "Stop", 0, 0, self)
+        progress.setWindowTitle("Export")
+        progress.setMinimumDuration(0)
+        exporter.progress.connect(lambda rows, rate: progress.setLabelText(
+            f"Exporting to {os.path.basename(file_path)}...\n{rows:,} rows written ({rate:,.0f} rows/s)"))
+        progress.canceled.connect(exporter.stop)
+        started = time.monotonic()
+
+        def done(rows):
+            self.exporters.remove(exporter)
+            progress.close()
+            if exporter.stopped:
+                QMessageBox.information(self, "Export Stopped", f"Stopped after {rows:,} rows, "
+                                                                f"{os.path.basename(file_path)} is incomplete.")
+            else:
+                QMessageBox.information(self, "Success", f"Exported {rows:,} rows to {os.path.basename(file_path)} "
+                                                         f"in {time.monotonic() - started:.1f} s.")
 
-            # Close the cursor and connection
-            cursor.close()
-            connection.close()
+        def failed(message):
+            self.exporters.remove(exporter)
+            progress.close()
+            QMessageBox.warning(self, "Error", f"Failed to export: {message}")
 
-        except mysql.connector.Error as e:
-            raise e
+        # Keep the exporter alive until the worker is done with it
+        self.exporters.append(exporter)
+        self.executor.submit(f"EXPORT {os.path.basename(file_path)}", work=exporter.run,
+                             on_finished=done, on_failed=failed, owner=self, stop=exporter.stop)
 
     def show_table_info(self):
         current_item = self.hierarchy_widget.currentItem()
         if current_item is not None:
             try:
-                connection = mysql.connector.connect(
-                    host=self.info[0],
-                    user=self.info[1],
-                    password=self.info[2],
-                    database=self.info[3]
-                )
-                tablename = current_item.text()
-                cursor = connection.cursor()
-                cursor.execute(f"SHOW CREATE TABLE {current_item.text()}")
-                result = cursor.fetchone()
-                create_table_statement = result[1]
-
-                connection.close()
+                table_description = self.schema_cache.describe(current_item.text())
 
                 # Display the table information in a new window
-                table_info_window = TableInfoWindow(current_item.text(), create_table_statement)
+                table_info_window = TableInfoWindow(current_item.text(), table_description)
                 table_info_window.exec_()
 
             except mysql.connector.Error as e:
@@ -1112,22 +5720,70 @@ class EventFilter(QObject):
 
 # Dialogs
 class QueryHistoryDialog(QDialog):
-    def __init__(self, parent=None):
+    def __init__(self, history, database, parent=None):
         super().__init__(parent)
-        self.setWindowTitle("Query History")
+        self.history = history
+        self.database = database
+        self.setWindowTitle(f"Query History ({database})")
+        self.setMinimumSize(700, 400)
         self.layout = QVBoxLayout(self)
-        self.list_widget = QListWidget()
-        self.layout.addWidget(self.list_widget)
 
+        self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText("Search statements...")
+        self.layout.addWidget(self.search_input)
+
+        self.tabs = QTabWidget()
+        self.layout.addWidget(self.tabs)
+
+        self.list_widget = QListWidget()
         self.list_widget.itemDoubleClicked.connect(self.run_selected_query)
+        self.tabs.addTab(self.list_widget, "History")
+
+        self.latency_model = ResultTableModel()
+        self.latency_view = create_result_view(self.latency_model)
+        self.tabs.addTab(self.latency_view, "Latency")
+
+        # Search once typing pauses rather than on every key press
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(200)
+        self.search_timer.timeout.connect(self.load_query_history)
+        self.search_input.textChanged.connect(self.search_timer.start)
 
-    def load_query_history(self, query_history):
+        self.load_query_history()
+        self.load_latency_stats()
+
+    def load_query_history(self):
         self.list_widget.clear()  # Clear the list widget
-        self.list_widget.addItems(query_history)  # Add items from query_history to the list widget
+        try:
+            entries = self.history.search(self.search_input.text(), self.database)
+        except sqlite3.Error as err:
+            QMessageBox.warning(self, "Error", f"Failed to search query history: {err}")
+            return
+        for executed_at, database, statement, duration, rows, error in entries:
+            item = QListWidgetItem(f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(executed_at))}  "
+                                   f"{(duration or 0) * 1000:8.1f} ms  {' '.join(statement.split())}")
+            item.setData(Qt.UserRole, statement)
+            if error is not None:
+                item.setForeground(Qt.red)
+                item.setToolTip(f"Error: {error}")
+            elif rows is not None:
+                item.setToolTip(f"{rows} rows")
+            self.list_widget.addItem(item)
+
+    def load_latency_stats(self):
+        try:
+            stats = self.history.latency_stats(self.database)
+        except sqlite3.Error as err:
+            QMessageBox.warning(self, "Error", f"Failed to load latency statistics: {err}")
+            return
+        rows = [(fingerprint, runs, f"{p50 * 1000:.1f}", f"{p95 * 1000:.1f}", f"{slowest * 1000:.1f}")
+                for fingerprint, runs, p50, p95, slowest in stats]
+        self.latency_model.set_result(["Query", "Runs", "p50 (ms)", "p95 (ms)", "Max (ms)"], rows)
 
     def run_selected_query(self, item):
         # Retrieve and execute the selected query
-        query = item.text()
+        query = item.data(Qt.UserRole)
         self.parent().execute_query_command(query)  # Execute the selected query
 class CreateTableWindow(QDialog):
     def __init__(self, parent=None):
@@ -1195,6 +5851,19 @@ class CreateTableWindow(QDialog):
             widget.deleteLater()
         self.rows = [row for row in self.rows if row[0] != row_layout.itemAt(0).widget()]
 
+    def prefill(self, table_name, columns):
+        # Fills the form with (key_type, data_type, column_name, not_null) rows, e.g. inferred from a file
+        self.table_name_input.setText(table_name)
+        while len(self.rows) < len(columns):
+            self.add_row()
+        for row, (key_type, data_type, column_name, not_null) in zip(self.rows, columns):
+            row[0].setCurrentText(key_type)
+            if row[1].findText(data_type) < 0:
+                row[1].addItem(data_type)
+            row[1].setCurrentText(data_type)
+            row[2].setText(column_name)
+            row[3].setChecked(not_null)
+
     def get_table_data(self):
         table_name = self.table_name_input.text().strip()
         columns = []
@@ -1222,13 +5891,13 @@ class CreateTableWindow(QDialog):
 
 
 class AlterTableWindow(QDialog):
-    def __init__(self, table_name, Info, parent=None):
+    def __init__(self, table_name, pool, parent=None):
         super().__init__(parent)
         self.setWindowTitle(f"Alter Table {table_name}")
         layout = QVBoxLayout()
 
         self.table_name = table_name
-        self.Info = Info
+        self.pool = pool
 
         self.column_name_edit = QLineEdit()
         self.column_name_edit.setPlaceholderText("Enter column name")
@@ -1326,36 +5995,31 @@ class AlterTableWindow(QDialog):
 
     def alter_table(self):
         if self.columns_to_drop or self.columns_to_add:
+            call_recorder.start_action(f"alter table {self.table_name}")
             try:
-                connection = mysql.connector.connect(
-                    host=self.Info[0],
-                    user=self.Info[1],
-                    password=self.Info[2],
-                    database=self.Info[3]
-                )
-                cursor = connection.cursor()
-
-                # Add columns
-                for column_data in self.columns_to_add:
-                    column_name, column_type, is_primary_key, is_auto_increment, is_not_null, is_foreign_key = column_data
-                    alter_query = f"ALTER TABLE {self.table_name} ADD COLUMN {column_name} {column_type}"
-                    if is_primary_key:
-                        alter_query += " PRIMARY KEY"
-                    if is_auto_increment:
-                        alter_query += " AUTO_INCREMENT"
-                    if is_not_null:
-                        alter_query += " NOT NULL"
-                    if is_foreign_key:
-                        alter_query += " FOREIGN KEY (ref_column) REFERENCES ref_table(ref_column)"
-                    cursor.execute(alter_query)
-
-                # Drop columns
-                for column_name in self.columns_to_drop:
-                    drop_query = f"ALTER TABLE {self.table_name} DROP COLUMN {column_name}"
-                    cursor.execute(drop_query)
+                with self.pool.connection() as connection:
+                    cursor = connection.cursor()
 
-                connection.commit()
-                connection.close()
+                    # Add columns
+                    for column_data in self.columns_to_add:
+                        column_name, column_type, is_primary_key, is_auto_increment, is_not_null, is_foreign_key = column_data
+                        alter_query = f"ALTER TABLE {self.table_name} ADD COLUMN {column_name} {column_type}"
+                        if is_primary_key:
+                            alter_query += " PRIMARY KEY"
+                        if is_auto_increment:
+                            alter_query += " AUTO_INCREMENT"
+                        if is_not_null:
+                            alter_query += " NOT NULL"
+                        if is_foreign_key:
+                            alter_query += " FOREIGN KEY (ref_column) REFERENCES ref_table(ref_column)"
+                        cursor.execute(alter_query)
+
+                    # Drop columns
+                    for column_name in self.columns_to_drop:
+                        drop_query = f"ALTER TABLE {self.table_name} DROP COLUMN {column_name}"
+                        cursor.execute(drop_query)
+
+                    self.pool.commit(connection, f"ALTER TABLE {self.table_name}")
                 self.accept()
             except mysql.connector.Error as e:
                 QMessageBox.warning(self, "Error", f"Failed to alter table: {e}")
@@ -1400,10 +6064,13 @@ class AlterTableWindow(QDialog):
         else:
             self.drop_column_label.clear()
 class DeleteRowDialog(QDialog):
-    def __init__(self, table_name, info, parent=None):
+    def __init__(self, table_name, pool, parent=None, primary_keys=None):
         super().__init__(parent)
         self.table_name = table_name
-        self.info = info
+        self.pool = pool
+        self.primary_keys = primary_keys or []
+        self.executed = False
+        self.affected_keys = None  # Primary keys of the changed rows, None when unknown
         self.setWindowTitle("Delete Row")
         self.layout = QVBoxLayout(self)
         self.setLayout(self.layout)
@@ -1421,17 +6088,15 @@ class DeleteRowDialog(QDialog):
     def delete_row(self):
         condition = self.condition_line_edit.text()
         if condition:
+            call_recorder.start_action(f"delete row {self.table_name}")
             try:
-                connection = mysql.connector.connect(
-                    host=self.info[0],
-                    user=self.info[1],
-                    password=self.info[2],
-                    database=self.info[3]
-                )
-                cursor = connection.cursor()
-                query = f"DELETE FROM {self.table_name} WHERE {condition}"
-                cursor.execute(query)
-                connection.commit()
+                with self.pool.connection() as connection:
+                    cursor = connection.cursor()
+                    self.affected_keys = select_affected_keys(cursor, self.table_name, self.primary_keys, condition)
+                    query = f"DELETE FROM {self.table_name} WHERE {condition}"
+                    cursor.execute(query)
+                    self.pool.commit(connection, query)
+                self.executed = True
                 QMessageBox.information(self, "Success", "Row deleted successfully.")
                 self.close()
             except mysql.connector.Error as err:
@@ -1439,10 +6104,13 @@ class DeleteRowDialog(QDialog):
         else:
             QMessageBox.warning(self, "Error", "Please enter a condition for deletion.")
 class ModifyRowDialog(QDialog):
-    def __init__(self, table_name, info, parent=None):
+    def __init__(self, table_name, pool, parent=None, primary_keys=None):
         super().__init__(parent)
         self.table_name = table_name
-        self.info = info
+        self.pool = pool
+        self.primary_keys = primary_keys or []
+        self.executed = False
+        self.affected_keys = None  # Primary keys of the changed rows, None when unknown
         self.setWindowTitle("Modify Row")
         self.layout = QVBoxLayout(self)
         self.setLayout(self.layout)
@@ -1464,17 +6132,15 @@ class ModifyRowDialog(QDialog):
         condition = self.condition_line_edit.text()
         new_values = self.new_values_text_edit.toPlainText().strip()
         if condition and new_values:
+            call_recorder.start_action(f"modify row {self.table_name}")
             try:
-                connection = mysql.connector.connect(
-                    host=self.info[0],
-                    user=self.info[1],
-                    password=self.info[2],
-                    database=self.info[3]
-                )
-                cursor = connection.cursor()
-                query = f"UPDATE {self.table_name} SET {new_values} WHERE {condition}"
-                cursor.execute(query)
-                connection.commit()
+                with self.pool.connection() as connection:
+                    cursor = connection.cursor()
+                    self.affected_keys = select_affected_keys(cursor, self.table_name, self.primary_keys, condition)
+                    query = f"UPDATE {self.table_name} SET {new_values} WHERE {condition}"
+                    cursor.execute(query)
+                    self.pool.commit(connection, query)
+                self.executed = True
                 QMessageBox.information(self, "Success", "Row modified successfully.")
                 self.close()
             except mysql.connector.Error as err:
@@ -1522,8 +6188,64 @@ class TableInfoWindow(QDialog):
 
         layout.addWidget(self.text_edit)
         self.setLayout(layout)
+class ExplainWindow(QDialog):
+    def __init__(self, statement, plan_json, analyze_text=None, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Query Plan")
+        self.resize(900, 500)
+        self.layout = QVBoxLayout(self)
+
+        summary = QLabel(" ".join(statement.split()))
+        summary.setWordWrap(True)
+        self.layout.addWidget(summary)
+
+        self.tabs = QTabWidget()
+        self.layout.addWidget(self.tabs)
+        try:
+            plan = json.loads(plan_json)
+            self.tabs.addTab(self.create_tree(explain_json_nodes("plan", [plan])), "Plan")
+            raw_text = json.dumps(plan, indent=2)
+        except ValueError:
+            raw_text = plan_json  # Not JSON, e.g. a server without FORMAT=JSON, show it as it came
+        if analyze_text:
+            self.tabs.addTab(self.create_tree(explain_analyze_nodes(analyze_text)), "Analyze")
+            self.tabs.setCurrentIndex(self.tabs.count() - 1)
+            raw_text += "\n\n" + analyze_text
+
+        raw_edit = QTextEdit()
+        raw_edit.setReadOnly(True)
+        raw_edit.setFont(QFont("Courier"))
+        raw_edit.setPlainText(raw_text)
+        self.tabs.addTab(raw_edit, "Raw")
+
+        self.close_button = QPushButton("Close")
+        self.close_button.clicked.connect(self.close)
+        self.layout.addWidget(self.close_button)
+
+    def create_tree(self, nodes):
+        tree = QTreeWidget()
+        tree.setHeaderLabels(["Operation", "Access type", "Key", "Est. rows", "Actual rows", "Cost", "Flags"])
+
+        def add_nodes(parent, nodes):
+            for node in nodes:
+                item = QTreeWidgetItem(parent, [node["label"], str(node["access"]), str(node["key"]),
+                                                str(node["estimated"]), str(node["actual"]), str(node["cost"]),
+                                                ", ".join(node["flags"])])
+                if node["detail"]:
+                    item.setToolTip(0, node["detail"])
+                if node["flags"]:
+                    # Full scans, filesorts and bad estimates are what to look at first
+                    for column in range(tree.columnCount()):
+                        item.setForeground(column, QBrush(Qt.red))
+                add_nodes(item, node["children"])
+
+        add_nodes(tree, nodes)
+        tree.expandAll()
+        tree.resizeColumnToContents(0)
+        return tree
+
 class QueryWindow(QDialog):
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, export=None):
         super().__init__(parent)
         self.setWindowTitle("Query Results")
         self.setModal(True)
@@ -1531,22 +6253,26 @@ class QueryWindow(QDialog):
         self.layout = QVBoxLayout()
         self.setLayout(self.layout)
 
-        self.table_widget = QTableWidget()
-        self.layout.addWidget(self.table_widget)
+        self.model = ResultTableModel()
+        self.table_view = create_result_view(self.model, sortable=True)
+        self.filter_bar = FilterBar(self.model, self.table_view)
+        self.layout.addWidget(self.filter_bar)
+        self.layout.addWidget(self.table_view)
+
+        # Optional callable that streams the full result of the query to a file
+        if export is not None:
+            self.export_button = QPushButton("Export...")
+            self.export_button.clicked.connect(export)
+            self.layout.addWidget(self.export_button)
 
         self.close_button = QPushButton("Close")
         self.close_button.clicked.connect(self.close)
         self.layout.addWidget(self.close_button)
 
     def set_data(self, data, headers):
-        self.table_widget.setColumnCount(len(headers))
-        self.table_widget.setRowCount(len(data))
-        self.table_widget.setHorizontalHeaderLabels(headers)
-
-        for row_idx, row_data in enumerate(data):
-            for col_idx, cell_data in enumerate(row_data):
-                item = QTableWidgetItem(str(cell_data))
-                self.table_widget.setItem(row_idx, col_idx, item)
+        if not isinstance(data, ColumnarRows):
+            data = ColumnarRows(data)
+        self.model.set_result(headers, data)
 class CreateTableDialog(QDialog):
     def __init__(self, parent=None):
         super(CreateTableDialog, self).__init__(parent)
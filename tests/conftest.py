@@ -0,0 +1,12 @@
+# The tests run headless against the stand-in mysql.connector the benchmarks use, so no MySQL server is needed
+
+import os
+import sys
+import tempfile
+
+tests_dir = os.path.dirname(os.path.abspath(__file__))
+repo_dir = os.path.dirname(tests_dir)
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+os.environ["HOME"] = tempfile.mkdtemp(prefix="sql_editor_tests_")  # Keeps the query history out of the real home
+sys.path[:0] = [os.path.join(repo_dir, "benchmarks", "fake_connector"), repo_dir]
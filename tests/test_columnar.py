@@ -0,0 +1,66 @@
+import datetime
+from decimal import Decimal
+
+import mysql.connector
+import numpy as np
+import pytest
+
+import main
+
+mixed_rows = [
+    (1, "alpha", Decimal("1.50"), datetime.date(2024, 1, 2), datetime.datetime(2024, 1, 2, 3, 4, 5), 0.5, b"\x00\xff",
+     datetime.timedelta(hours=1)),
+    (None, "über", Decimal("-20.25"), None, datetime.datetime(2024, 1, 2, 3, 4, 5, 6), None, None, None),
+    (3, None, None, datetime.date(1999, 12, 31), None, -1e300, b"", datetime.timedelta(seconds=-1)),
+]
+
+
+def test_rows_round_trip():
+    rows = main.ColumnarRows(mixed_rows, chunk_rows=2)
+    assert len(rows) == 3
+    assert list(rows) == mixed_rows
+    assert rows[1] == mixed_rows[1]
+    assert rows[-1] == mixed_rows[-1]
+    assert rows[1:] == mixed_rows[1:]
+
+
+def test_rows_edit():
+    rows = main.ColumnarRows(mixed_rows)
+    rows.append(mixed_rows[0])
+    rows[1] = mixed_rows[2]
+    del rows[0]
+    assert list(rows) == [mixed_rows[2], mixed_rows[2], mixed_rows[0]]
+
+
+def test_rows_from_cursor():
+    mysql.connector.server.configure(tables={"rows_25": 25})
+    connection = mysql.connector.connect(host="localhost", user="root", password="", database="bench")
+    cursor = connection.cursor()
+    cursor.execute("SELECT * FROM `rows_25`")
+    first = []
+    rows = main.ColumnarRows.from_cursor(cursor, chunk_rows=10, first_rows=first.extend)
+    connection.close()
+    expected = [mysql.connector.table_row(row_id) for row_id in range(1, 26)]
+    assert list(rows) == expected
+    assert first == expected[:10]
+
+
+@pytest.mark.parametrize("needle", ["a", "ÜB", "straße", "X", "12", "zzz"])
+def test_text_search_folds_case(needle):
+    values = ["alpha 12", "Über", "ÜBER STRASSE straße", None, "x" * 5000, "", b"raw".decode()]
+    expected = [value is not None and needle.lower() in value.lower() for value in values]
+    assert main.Column.from_values(values).contains(needle).tolist() == expected
+
+
+@pytest.mark.parametrize("operation, text", [("=", "Über"), ("=", ""), ("!=", "alpha 12")])
+def test_text_equality(operation, text):
+    values = ["alpha 12", "Über", "", None, "Übe"]
+    mask = main.Column.from_values(values).compare(operation, text)
+    expected = [value is not None and (value == text) == (operation == "=") for value in values]
+    assert mask.tolist() == expected
+
+
+def test_text_sort_keys():
+    values = ["b", "a", "ä", "ab"]
+    keys = main.Column.from_values(values).sort_keys()
+    assert [values[i] for i in np.argsort(keys, kind="stable")] == sorted(values)
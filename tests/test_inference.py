@@ -0,0 +1,36 @@
+import pandas as pd
+import pytest
+
+import main
+
+
+@pytest.mark.parametrize("values, data_type", [
+    (["1", "2", "300"], "INT"),
+    (["-5", "12"], "INT"),
+    (["0", "-0"], "INT"),
+    (["3000000000"], "BIGINT"),
+    (["12345678901234567890"], "DECIMAL(20,0)"),
+    (["1.5", "-0.25"], "DECIMAL(3,2)"),
+    (["1e5", "2.5"], "DOUBLE"),
+    (["2024-01-02", "2024-12-31"], "DATE"),
+    (["2024-01-02 03:04:05"], "DATETIME"),
+    (["abc"], "VARCHAR(16)"),
+    ([None, ""], "VARCHAR(255)"),
+    (["x" * 300], "TEXT"),
+])
+def test_infer_column_type(values, data_type):
+    assert main.infer_column_type(pd.Series(values, dtype=object)) == data_type
+
+
+@pytest.mark.parametrize("values", [
+    ["007", "012", "100"],
+    ["-05"],
+    ["+5"],
+    ["+44 20 7946 0000"],
+    ["inf"],
+    ["nan"],
+    ["Infinity"],
+    ["1e400"],
+])
+def test_codes_and_non_finite_numbers_stay_text(values):
+    assert main.infer_column_type(pd.Series(values, dtype=object)).startswith("VARCHAR")
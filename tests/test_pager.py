@@ -0,0 +1,20 @@
+import main
+
+
+def test_keyset_page_after_last_key():
+    pager = main.TablePager(None, "t", ["id"], 100)
+    pager.order = ("name", False)
+    pager.last_key = ("bob", 7)
+    query, params = pager.build_query()
+    assert query == ("SELECT * FROM `t` WHERE (`name` > %s OR `name` = %s AND (`id`) > (%s)) "
+                     "ORDER BY `name`, `id` LIMIT %s")
+    assert params == ["bob", "bob", 7, 100]
+
+
+def test_offset_page_breaks_ties_without_primary_key():
+    pager = main.TablePager(None, "t", [], 100, tiebreakers=["a", "b"])
+    assert pager.build_query() == ("SELECT * FROM `t` LIMIT %s OFFSET %s", [100, 0])
+    pager.order = ("b", True)
+    pager.offset = 200
+    assert pager.build_query() == ("SELECT * FROM `t` ORDER BY `b` DESC, `a` LIMIT %s OFFSET %s", [100, 200])
+    assert pager.copy().tiebreakers == ["a", "b"]
@@ -0,0 +1,73 @@
+import pytest
+
+import main
+
+
+@pytest.mark.parametrize("script, statements", [
+    ("SELECT 1", ["SELECT 1"]),
+    ("SELECT 1; -- note", ["SELECT 1"]),
+    ("SELECT 1;\nSELECT 2;", ["SELECT 1", "SELECT 2"]),
+    ("SELECT ';'; SELECT \"a;b\"; SELECT `c;d`", ["SELECT ';'", "SELECT \"a;b\"", "SELECT `c;d`"]),
+    ("SELECT 'it''s; here'; SELECT 'back\\'slash;'", ["SELECT 'it''s; here'", "SELECT 'back\\'slash;'"]),
+    ("SELECT 1 /* ; */; # ;\nSELECT 2", ["SELECT 1 /* ; */", "# ;\nSELECT 2"]),
+    ("-- only a comment", []),
+    ("DELIMITER //\nCREATE PROCEDURE p() BEGIN SELECT 1; END //\nDELIMITER ;\nCALL p();",
+     ["CREATE PROCEDURE p() BEGIN SELECT 1; END", "CALL p()"]),
+])
+def test_split_statements(script, statements):
+    assert main.split_statements(script) == statements
+
+
+@pytest.mark.parametrize("statement, keyword", [
+    ("select 1", "SELECT"),
+    ("  -- comment\n(SELECT 1)", "SELECT"),
+    ("WITH a AS (SELECT 1) SELECT * FROM a", "SELECT"),
+    ("WITH a AS (SELECT 1) DELETE FROM t WHERE id IN (SELECT * FROM a)", "DELETE"),
+    ("WITH RECURSIVE a (n) AS (SELECT 1 UNION SELECT n + 1 FROM a), b AS (SELECT 2) UPDATE t SET x = 1", "UPDATE"),
+])
+def test_statement_keyword(statement, keyword):
+    assert main.statement_keyword(statement) == keyword
+
+
+@pytest.mark.parametrize("statement, tables", [
+    ("SELECT * FROM t", set()),
+    ("CREATE TABLE t (id INT)", {"t"}),
+    ("CREATE TEMPORARY TABLE IF NOT EXISTS `t` (id INT)", {"t"}),
+    ("DROP TABLE IF EXISTS t, db.u, other.v", {"t", "u"}),
+    ("TRUNCATE t", {"t"}),
+    ("CREATE INDEX i ON t (a)", {"t"}),
+    ("ALTER TABLE t ADD c INT", {"t"}),
+    ("ALTER TABLE t RENAME TO u", {"t", "u"}),
+    ("ALTER TABLE t ADD c INT, RENAME AS db.u", {"t", "u"}),
+    ("ALTER TABLE t RENAME COLUMN a TO b", {"t"}),
+    ("ALTER TABLE t RENAME INDEX a TO b", {"t"}),
+    ("RENAME TABLE t TO u, x TO y", {"t", "u", "x", "y"}),
+    ("CREATE TRIGGER tr BEFORE INSERT ON t FOR EACH ROW SET NEW.a = 1", set()),
+    ("DROP DATABASE db", None),
+])
+def test_ddl_tables(statement, tables):
+    assert main.ddl_tables(statement, "db") == tables
+
+
+@pytest.mark.parametrize("statement, changed", [
+    ("SELECT * FROM t", False),
+    ("SELECT * FROM t WHERE email = 'someone@example.com'", False),
+    ("SELECT \"a@b\", `c@d` FROM t -- @x", False),
+    ("SELECT @@version", False),
+    ("GRANT SELECT ON db.* TO 'user'@'localhost'", False),
+    ("SELECT 'TEMPORARY'", False),
+    ("SELECT @x := 1", True),
+    ("SELECT a INTO @a FROM t", True),
+    ("USE db", True),
+    ("SET NAMES utf8mb4", True),
+    ("CALL p()", True),
+    ("CREATE TEMPORARY TABLE t (a INT)", True),
+    ("SELECT GET_LOCK('a', 1)", True),
+])
+def test_changes_session(statement, changed):
+    assert main.changes_session(statement) is changed
+
+
+def test_session_pattern_skips_quoted_text():
+    matches = [match.lastindex for match in main.session_pattern.finditer("SELECT 'a@b', /* @c */ @d")]
+    assert [index for index in matches if index] == [1]